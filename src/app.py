@@ -1188,16 +1188,12 @@ if page == "home":
     """, unsafe_allow_html=True)
 
     try:
+        home_metrics = db.get_home_metrics()
         cities = db.get_cities() or []
-        pois = db.get_pois() or []
-        audio_guides = db.get_audio_guides() or []
-        users = db.get_all_users() or []
     except Exception as e:
         st.error(f"Error al cargar datos: {str(e)}")
+        home_metrics = {}
         cities = []
-        pois = []
-        audio_guides = []
-        users = []
 
     metrics_html = f"""
     <div class="section-block fade-in" id="estadisticas">
@@ -1209,19 +1205,19 @@ if page == "home":
         <div class="metric-grid">
             <div class="metric-card">
                 <span>🌍 Ciudades activas</span>
-                <strong>{len(cities)}</strong>
+                <strong>{home_metrics.get("cities", 0)}</strong>
             </div>
             <div class="metric-card">
                 <span>📍 Puntos de interés</span>
-                <strong>{len(pois)}</strong>
+                <strong>{home_metrics.get("pois", 0)}</strong>
             </div>
             <div class="metric-card">
                 <span>🎧 Audio-guías disponibles</span>
-                <strong>{len(audio_guides)}</strong>
+                <strong>{home_metrics.get("audio_guides", 0)}</strong>
             </div>
             <div class="metric-card">
                 <span>👥 Viajeros conectados</span>
-                <strong>{len(users)}</strong>
+                <strong>{home_metrics.get("users", 0)}</strong>
             </div>
         </div>
     </div>
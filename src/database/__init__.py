@@ -2,6 +2,6 @@
 Módulo de base de datos
 """
 from .database import get_database, SupabaseDB
+from .async_database import AsyncSupabaseDB, fan_out
 
-__all__ = ['get_database', 'SupabaseDB']
-
+__all__ = ['get_database', 'SupabaseDB', 'AsyncSupabaseDB', 'fan_out']
@@ -0,0 +1,164 @@
+"""
+Evaluación incremental de logros por reglas con contadores en la sesión
+"""
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+import streamlit as st
+
+import config.config as config
+
+# Contadores que cuentan valores distintos (``record`` recibe la clave)
+DISTINCT_COUNTERS = {"cities"}
+
+# Campos de la regla que no forman parte del logro guardado
+RULE_FIELDS = {"counter", "threshold"}
+
+
+class AchievementTracker:
+    """
+    Contadores de actividad de un usuario y logros ya obtenidos, en memoria.
+
+    Se cargan una vez con ``load_progress`` (una sola fila con los contadores,
+    las ciudades visitadas y los nombres de los logros obtenidos). Después,
+    cada evento suma uno a su contador y solo se comprueban las reglas de ese
+    contador, ordenadas por umbral: registrar un evento no lee nada de la base
+    de datos y solo se escribe al cruzar un umbral cuyo logro no se tiene.
+
+    Un logro que ``award`` no devuelve (duplicado desde otra sesión o error)
+    se da por obtenido hasta la siguiente carga, que lo vuelve a evaluar.
+
+    Con ``event_loaded`` la carga inicial ya incluye el evento que se va a
+    registrar (el motor se creó después de guardarlo): hasta la siguiente
+    carga o ``settle_loaded_event``, el primer ``record`` de cada contador
+    comprueba las reglas sin volver a sumarlo.
+    """
+
+    def __init__(self, user_id: str,
+                 load_progress: Callable[[str], Optional[Dict]],
+                 award: Callable[[Dict], Optional[Dict]],
+                 rules: Optional[Iterable[Dict]] = None,
+                 reload_interval: float = 300.0,
+                 event_loaded: bool = False):
+        """Inicializa el motor con sus reglas y hace la carga inicial"""
+        self.user_id = user_id
+        self.load_progress = load_progress
+        self.award = award
+        self.reload_interval = reload_interval
+        self._rules: Dict[str, List[Dict]] = {}
+        for rule in (config.ACHIEVEMENT_RULES if rules is None else rules):
+            self._rules.setdefault(rule["counter"], []).append(rule)
+        for counter_rules in self._rules.values():
+            counter_rules.sort(key=lambda rule: rule["threshold"])
+        self._counts: Dict[str, int] = {}
+        self._distinct: Dict[str, Set[str]] = {}
+        self._earned: Set[str] = set()
+        self._loaded_at: Optional[float] = None
+        self._counted_on_load: Set[str] = set()
+        if self.load():
+            self._counted_on_load = set(self._rules) if event_loaded else set()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded_at is not None
+
+    def is_stale(self) -> bool:
+        """True si no hay contadores o tienen más de ``reload_interval`` segundos"""
+        return not self.loaded or time.monotonic() - self._loaded_at >= self.reload_interval
+
+    def count(self, counter: str) -> int:
+        """Valor actual de un contador"""
+        if counter in DISTINCT_COUNTERS:
+            return len(self._distinct.get(counter, ()))
+        return self._counts.get(counter, 0)
+
+    def has(self, achievement_name: str) -> bool:
+        """Indica si el logro ya está obtenido"""
+        return achievement_name in self._earned
+
+    def load(self) -> bool:
+        """Relee contadores y logros obtenidos; False si no se pudieron leer"""
+        progress = self.load_progress(self.user_id)
+        if progress is None:
+            return False
+        self._counts = {counter: int(progress.get(counter) or 0)
+                        for counter in self._rules if counter not in DISTINCT_COUNTERS}
+        self._distinct = {"cities": {str(city_id) for city_id in progress.get("city_ids") or ()}}
+        self._earned = set(progress.get("earned") or ())
+        self._counted_on_load = set()
+        self._loaded_at = time.monotonic()
+        return True
+
+    def settle_loaded_event(self):
+        """Da por registrado el evento incluido en la carga: los siguientes ``record`` suman"""
+        self._counted_on_load.clear()
+
+    def record(self, counter: str, key: Optional[str] = None) -> List[Dict]:
+        """
+        Registra un evento y devuelve los logros que se acaban de otorgar.
+
+        Para los contadores de ``DISTINCT_COUNTERS`` ``key`` es el valor
+        contado (p. ej. la ciudad del POI visitado) y una clave repetida no
+        cambia nada. Sin contadores cargados el evento se ignora: la próxima
+        carga ya lo incluye desde la base de datos.
+        """
+        if not self.loaded:
+            return []
+        if counter in self._counted_on_load:
+            self._counted_on_load.discard(counter)
+            return self._evaluate(counter)
+        if counter in DISTINCT_COUNTERS:
+            if key is None:
+                return []
+            seen = self._distinct.setdefault(counter, set())
+            if str(key) in seen:
+                return []
+            seen.add(str(key))
+        else:
+            self._counts[counter] = self._counts.get(counter, 0) + 1
+        return self._evaluate(counter)
+
+    def _evaluate(self, counter: str) -> List[Dict]:
+        """Otorga los logros de ``counter`` cuyo umbral se ha alcanzado y no se tienen"""
+        value = self.count(counter)
+        awarded = []
+        for rule in self._rules.get(counter, ()):
+            if rule["threshold"] > value:
+                break
+            name = rule["achievement_name"]
+            if name in self._earned:
+                continue
+            achievement = {field: rule[field] for field in rule if field not in RULE_FIELDS}
+            achievement["user_id"] = self.user_id
+            created = self.award(achievement)
+            self._earned.add(name)
+            if created:
+                awarded.append(created)
+        return awarded
+
+
+def get_session_achievements(db, user_id: str, refresh: bool = True) -> AchievementTracker:
+    """
+    Obtiene (o crea) el motor de logros del usuario en la sesión de Streamlit.
+
+    Conviene pedirlo al mostrar la página, antes de guardar el evento; al
+    registrar el evento se pide con ``refresh=False`` para no recargar unos
+    contadores caducados. Si con ``refresh=False`` aún no existía, la carga ya
+    incluye el evento recién guardado y los ``record`` que siguen a esta
+    llamada no lo vuelven a sumar.
+    """
+    tracker = st.session_state.get("achievement_tracker")
+    if tracker is None or tracker.user_id != user_id:
+        tracker = AchievementTracker(
+            user_id,
+            db.get_achievement_progress,
+            db.create_achievement,
+            reload_interval=config.ACHIEVEMENTS_RELOAD_INTERVAL,
+            event_loaded=not refresh,
+        )
+        st.session_state.achievement_tracker = tracker
+    else:
+        tracker.settle_loaded_event()
+        if refresh and tracker.is_stale():
+            tracker.load()
+    return tracker
@@ -0,0 +1,98 @@
+"""
+Variante asíncrona de SupabaseDB para lanzar lecturas independientes en paralelo
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+import config.config as config
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Obtiene el pool de hilos compartido para las consultas concurrentes"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=config.DB_FANOUT_WORKERS,
+                thread_name_prefix="supabase-fanout",
+            )
+        return _executor
+
+
+def _with_script_context(func: Callable, ctx) -> Callable:
+    """Asocia el contexto de Streamlit al hilo que ejecuta ``func``.
+
+    Sin él, los ``st.error`` que emite SupabaseDB ante un fallo se perderían
+    al ejecutarse fuera del hilo del script.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+    return wrapper
+
+
+class AsyncSupabaseDB:
+    """
+    Envuelve un SupabaseDB y expone sus métodos como corrutinas.
+
+    Cada llamada se ejecuta en un pool de hilos compartido, de modo que varias
+    consultas HTTP pueden estar en vuelo a la vez mientras el bucle de eventos
+    espera sus resultados.
+    """
+
+    def __init__(self, db, executor: Optional[ThreadPoolExecutor] = None):
+        """Inicializa el envoltorio sobre una instancia síncrona"""
+        self.db = db
+        self.executor = executor or _get_executor()
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Ejecuta cualquier función bloqueante en el pool y espera su resultado"""
+        loop = asyncio.get_running_loop()
+        call = _with_script_context(func, get_script_run_ctx(suppress_warning=True))
+        return await loop.run_in_executor(self.executor, functools.partial(call, *args, **kwargs))
+
+    def __getattr__(self, name: str):
+        """Devuelve la versión asíncrona del método ``name`` de SupabaseDB"""
+        attr = getattr(self.db, name)
+        if not callable(attr):
+            return attr
+
+        async def method(*args, **kwargs):
+            return await self.run(attr, *args, **kwargs)
+
+        method.__name__ = name
+        method.__doc__ = attr.__doc__
+        return method
+
+
+async def gather_calls(db, calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """Ejecuta concurrentemente llamadas sin argumentos y devuelve sus resultados por nombre"""
+    async_db = db if isinstance(db, AsyncSupabaseDB) else AsyncSupabaseDB(db)
+    results = await asyncio.gather(*(async_db.run(call) for call in calls.values()))
+    return dict(zip(calls.keys(), results))
+
+
+def fan_out(db, calls: Dict[str, Callable[[], Any]]) -> Dict[str, Any]:
+    """
+    Lanza en paralelo lecturas independientes desde código síncrono.
+
+    ``calls`` asocia un nombre a una función sin argumentos (normalmente una
+    lambda sobre ``db``). La latencia total queda acotada por la llamada más
+    lenta en lugar de por la suma de todas. Si ya hay un bucle de eventos en
+    ejecución en este hilo, las llamadas se hacen en serie.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(gather_calls(db, calls))
+    return {name: call() for name, call in calls.items()}
@@ -0,0 +1,194 @@
+"""
+Lectura y validación de ficheros CSV/JSON para la importación masiva del catálogo
+"""
+import io
+import json
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+
+import config.config as config
+
+# Columnas admitidas por tabla y su conversión
+CITY_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "name": str,
+    "country": str,
+    "country_code": str,
+    "description": str,
+    "image_url": str,
+    "price": float,
+    "currency": str,
+    "is_active": None,  # se convierte con _to_bool
+    "latitude": float,
+    "longitude": float,
+    "timezone": str,
+    "language": str,
+}
+POI_FIELDS: Dict[str, Callable[[Any], Any]] = {
+    "city_id": str,
+    "name": str,
+    "description": str,
+    "short_description": str,
+    "latitude": float,
+    "longitude": float,
+    "category": str,
+    "subcategory": str,
+    "audio_guide_url": str,
+    "ar_content_url": str,
+    "visit_duration": lambda value: int(float(value)),
+    "difficulty_level": str,
+    "accessibility_info": str,
+    "entry_price": float,
+    "is_active": None,
+}
+CITY_REQUIRED = ("name", "country")
+POI_REQUIRED = ("city_id", "name", "latitude", "longitude")
+
+# Valores booleanos admitidos (en minúsculas)
+TRUE_VALUES = ("1", "true", "t", "yes", "y", "si", "sí", "s", "x")
+FALSE_VALUES = ("0", "false", "f", "no", "n")
+
+
+def read_import_file(filename: str, content: bytes) -> List[Dict]:
+    """
+    Lee un fichero CSV o JSON y devuelve sus filas como diccionarios.
+
+    El JSON puede ser una lista de objetos o un objeto con la lista en
+    ``items``. Las celdas vacías del CSV se devuelven como None.
+    """
+    if filename.lower().endswith(".json"):
+        data = json.loads(content.decode("utf-8-sig"))
+        if isinstance(data, dict):
+            data = data.get("items", [])
+        if not isinstance(data, list):
+            raise ValueError("El JSON debe ser una lista de objetos o un objeto con 'items'")
+        return [row for row in data if isinstance(row, dict)]
+
+    df = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False, encoding="utf-8-sig")
+    return [{key: (value if value != "" else None) for key, value in row.items()}
+            for row in df.to_dict("records")]
+
+
+def _to_bool(value: Any) -> bool:
+    """Interpreta valores booleanos escritos a mano (sí/no, true/false, 1/0)"""
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"'{value}' no es un valor booleano (sí/no, true/false, 1/0)")
+
+
+def _to_uuid(value: Any) -> str:
+    """Normaliza un UUID escrito a mano; ValueError si no tiene forma de UUID"""
+    try:
+        return str(uuid.UUID(str(value)))
+    except ValueError:
+        raise ValueError(f"'{value}' no es un UUID") from None
+
+
+def _coerce(row: Dict, fields: Dict[str, Callable]) -> Dict:
+    """
+    Se queda con las columnas conocidas y convierte sus tipos.
+
+    Las celdas vacías se omiten: al importar, un registro existente conserva
+    el valor de esa columna y uno nuevo recibe el valor por defecto.
+    """
+    clean = {}
+    for field, cast in fields.items():
+        value = row.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == "":
+            continue
+        if cast is None:
+            clean[field] = _to_bool(value)
+        else:
+            clean[field] = cast(value)
+    return clean
+
+
+def validate_cities(rows: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """Valida filas de ciudades; devuelve (filas válidas, errores por fila)"""
+    valid, errors = [], []
+    seen = set()
+    for index, raw in enumerate(rows, start=1):
+        try:
+            row = _coerce(raw, CITY_FIELDS)
+        except (TypeError, ValueError) as e:
+            errors.append({"fila": index, "error": f"Valor no válido: {str(e)}"})
+            continue
+        missing = [field for field in CITY_REQUIRED if not row.get(field)]
+        if missing:
+            errors.append({"fila": index, "error": f"Faltan campos obligatorios: {', '.join(missing)}"})
+            continue
+        if row.get("country_code") and len(row["country_code"]) != 2:
+            errors.append({"fila": index, "error": "country_code debe tener 2 letras"})
+            continue
+        key = (row["name"].lower(), row["country"].lower())
+        if key in seen:
+            errors.append({"fila": index, "error": f"Ciudad duplicada en el fichero: {row['name']}"})
+            continue
+        seen.add(key)
+        valid.append(row)
+    return valid, errors
+
+
+def validate_pois(rows: List[Dict], city_ids_by_name: Optional[Dict[str, str]] = None,
+                  known_city_ids: Optional[Iterable[str]] = None) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Valida filas de POIs contra ``config.POI_CATEGORIES`` y ``config.DIFFICULTY_LEVELS``.
+
+    Si una fila no trae ``city_id`` pero sí ``city`` (nombre de la ciudad),
+    se resuelve con ``city_ids_by_name`` (nombre en minúsculas -> ID). El
+    ``city_id`` debe ser un UUID y, si se pasa ``known_city_ids``, una de
+    esas ciudades.
+    """
+    city_ids_by_name = city_ids_by_name or {}
+    if known_city_ids is not None:
+        known_city_ids = {_to_uuid(city_id) for city_id in known_city_ids}
+    valid, errors = [], []
+    seen = set()
+    for index, raw in enumerate(rows, start=1):
+        raw = dict(raw)
+        if not raw.get("city_id") and raw.get("city"):
+            raw["city_id"] = city_ids_by_name.get(str(raw["city"]).strip().lower())
+            if not raw["city_id"]:
+                errors.append({"fila": index, "error": f"Ciudad desconocida: {raw['city']}"})
+                continue
+        try:
+            row = _coerce(raw, POI_FIELDS)
+        except (TypeError, ValueError) as e:
+            errors.append({"fila": index, "error": f"Valor no válido: {str(e)}"})
+            continue
+        missing = [field for field in POI_REQUIRED if row.get(field) in (None, "")]
+        if missing:
+            errors.append({"fila": index, "error": f"Faltan campos obligatorios: {', '.join(missing)}"})
+            continue
+        try:
+            row["city_id"] = _to_uuid(row["city_id"])
+        except ValueError:
+            errors.append({"fila": index, "error": f"city_id no válido: {row['city_id']}"})
+            continue
+        if known_city_ids is not None and row["city_id"] not in known_city_ids:
+            errors.append({"fila": index, "error": f"Ciudad desconocida: {row['city_id']}"})
+            continue
+        if row.get("category") and row["category"] not in config.POI_CATEGORIES:
+            errors.append({"fila": index, "error": f"Categoría no válida: {row['category']}"})
+            continue
+        if row.get("difficulty_level") and row["difficulty_level"] not in config.DIFFICULTY_LEVELS:
+            errors.append({"fila": index, "error": f"Nivel de dificultad no válido: {row['difficulty_level']}"})
+            continue
+        if not (-90 <= row["latitude"] <= 90 and -180 <= row["longitude"] <= 180):
+            errors.append({"fila": index, "error": "Coordenadas fuera de rango"})
+            continue
+        key = (row["city_id"], row["name"].lower())
+        if key in seen:
+            errors.append({"fila": index, "error": f"POI duplicado en el fichero: {row['name']}"})
+            continue
+        seen.add(key)
+        valid.append(row)
+    return valid, errors
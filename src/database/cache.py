@@ -0,0 +1,104 @@
+"""
+Caché de lectura compartida por todo el proceso
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import config.config as config
+
+
+class TTLCache:
+    """Caché LRU con expiración por entrada y contadores de aciertos/fallos"""
+
+    def __init__(self, max_entries: int = 256, default_ttl: float = 60.0,
+                 ttls: Optional[Dict[str, float]] = None):
+        """Inicializa la caché con su tamaño máximo y los TTL por espacio de nombres"""
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls = dict(ttls or {})
+        self._entries: "OrderedDict[tuple[str, Hashable], tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _ttl_for(self, namespace: str) -> float:
+        """Obtiene el TTL (en segundos) de un espacio de nombres"""
+        return self.ttls.get(namespace, self.default_ttl)
+
+    def get_or_load(self, namespace: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        Devuelve el valor cacheado o lo carga con ``loader``.
+
+        Si ``loader`` lanza una excepción no se guarda nada, de modo que los
+        errores de red no quedan cacheados.
+        """
+        cache_key = (namespace, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[cache_key]
+            self.misses += 1
+
+        value = loader()
+        self.set(namespace, key, value)
+        return value
+
+    def set(self, namespace: str, key: Hashable, value: Any):
+        """Guarda un valor respetando el TTL del espacio de nombres"""
+        ttl = self._ttl_for(namespace)
+        if ttl <= 0:
+            return
+        cache_key = (namespace, key)
+        with self._lock:
+            self._entries[cache_key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, *namespaces: str):
+        """Elimina las entradas de los espacios indicados (o todas si no se indica ninguno)"""
+        with self._lock:
+            if not namespaces:
+                self._entries.clear()
+                return
+            for cache_key in [k for k in self._entries if k[0] in namespaces]:
+                del self._entries[cache_key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve métricas de uso de la caché"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+
+_query_cache: Optional[TTLCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> TTLCache:
+    """Obtiene la caché de consultas compartida por todas las sesiones"""
+    global _query_cache
+    with _query_cache_lock:
+        if _query_cache is None:
+            _query_cache = TTLCache(
+                max_entries=config.CACHE_MAX_ENTRIES,
+                default_ttl=config.CACHE_DEFAULT_TTL,
+                ttls=config.CACHE_TTLS,
+            )
+        return _query_cache
@@ -0,0 +1,226 @@
+"""
+Réplica local del catálogo de ciudades y POIs sincronizada por updated_at
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from geo import GridIndex, PointIndex
+
+# Tablas replicadas
+CATALOG_TABLES = ("cities", "points_of_interest")
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Convierte un updated_at de PostgREST en datetime"""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+
+
+class CatalogReplica:
+    """
+    Copia en memoria de ``cities`` y ``points_of_interest``.
+
+    Hace una carga completa la primera vez que se consulta y después un hilo
+    en segundo plano pide cada ``poll_interval`` segundos solo las filas con
+    ``updated_at`` posterior a la marca de agua de cada tabla (incluidas las
+    desactivadas con ``is_active = false``). La consulta retrocede
+    ``overlap_seconds`` sobre la marca de agua: ``NOW()`` es la hora de inicio
+    de la transacción, así que una fila puede confirmarse después de que otra
+    con un updated_at mayor ya se haya leído. Los borrados físicos no dejan
+    rastro en updated_at y se recogen en la recarga completa periódica.
+
+    Las lecturas nunca consultan la base de datos: devuelven copias de una
+    instantánea ya ordenada que se reemplaza de forma atómica en cada cambio.
+    """
+
+    def __init__(self, fetch_rows: Callable[[str, Optional[datetime]], List[Dict]],
+                 poll_interval: float = 15.0, overlap_seconds: float = 5.0,
+                 full_reload_interval: float = 3600.0, grid_cell_deg: float = 0.02):
+        """Inicializa la réplica con la función que lee filas cambiadas desde una fecha"""
+        self.fetch_rows = fetch_rows
+        self.poll_interval = poll_interval
+        self.overlap = timedelta(seconds=overlap_seconds)
+        self.full_reload_interval = full_reload_interval
+        self.grid_cell_deg = grid_cell_deg
+        self._rows: Dict[str, Dict[str, Dict]] = {table: {} for table in CATALOG_TABLES}
+        self._watermarks: Dict[str, Optional[datetime]] = dict.fromkeys(CATALOG_TABLES)
+        self._cities: Tuple[Dict, ...] = ()
+        self._pois: Tuple[Dict, ...] = ()
+        self._pois_with_city: Tuple[Dict, ...] = ()
+        self._pois_by_id: Dict[str, Dict] = {}
+        self._spatial_index: Optional[GridIndex] = None
+        self._sync_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._loaded = False
+        self._last_full_load = 0.0
+        self.last_sync: Optional[datetime] = None
+        self.full_loads = 0
+        self.delta_syncs = 0
+        self.rows_applied = 0
+        self.sync_errors = 0
+
+    # ---------- sincronización ----------
+
+    def ensure_loaded(self):
+        """Hace la carga completa si aún no se ha hecho y arranca el sondeo"""
+        if not self._loaded:
+            with self._sync_lock:
+                if not self._loaded:
+                    self._full_load()
+        self._ensure_worker()
+
+    def sync(self):
+        """Aplica los cambios pendientes (o recarga entera si toca)"""
+        with self._sync_lock:
+            if not self._loaded or time.monotonic() - self._last_full_load >= self.full_reload_interval:
+                self._full_load()
+            else:
+                self._delta_sync()
+
+    def reload(self):
+        """Fuerza una recarga completa del catálogo"""
+        with self._sync_lock:
+            self._full_load()
+
+    def discard(self, table: str, row_id: str):
+        """Quita de la réplica una fila borrada físicamente"""
+        with self._sync_lock:
+            if self._rows.get(table, {}).pop(row_id, None) is not None:
+                self._rebuild()
+
+    def _full_load(self):
+        """Lee las tablas completas y sustituye la réplica (requiere el lock)"""
+        rows = {table: {row["id"]: row for row in self.fetch_rows(table, None)} for table in CATALOG_TABLES}
+        self._rows = rows
+        self._watermarks = {table: self._max_updated_at(rows[table].values()) for table in CATALOG_TABLES}
+        self._rebuild()
+        self._loaded = True
+        self._last_full_load = time.monotonic()
+        self.full_loads += 1
+        self.last_sync = datetime.now()
+
+    def _delta_sync(self):
+        """Lee solo las filas modificadas desde la marca de agua (requiere el lock)"""
+        changed = False
+        for table in CATALOG_TABLES:
+            watermark = self._watermarks[table]
+            since = watermark - self.overlap if watermark else None
+            rows = self.fetch_rows(table, since)
+            current = self._rows[table]
+            for row in rows:
+                existing = current.get(row["id"])
+                if existing == row:
+                    continue
+                current[row["id"]] = row
+                self.rows_applied += 1
+                changed = True
+            newest = self._max_updated_at(rows)
+            if newest and (watermark is None or newest > watermark):
+                self._watermarks[table] = newest
+        if changed:
+            self._rebuild()
+        self.delta_syncs += 1
+        self.last_sync = datetime.now()
+
+    @staticmethod
+    def _max_updated_at(rows) -> Optional[datetime]:
+        """Marca de agua: el mayor updated_at de un conjunto de filas"""
+        stamps = [stamp for stamp in (_parse_timestamp(row.get("updated_at")) for row in rows) if stamp]
+        return max(stamps) if stamps else None
+
+    def _rebuild(self):
+        """Recalcula las instantáneas ordenadas que sirven las lecturas"""
+        cities = self._rows["cities"]
+        pois = sorted(self._rows["points_of_interest"].values(), key=lambda poi: poi.get("name") or "")
+        self._cities = tuple(cities.values())
+        self._pois = tuple(pois)
+        self._pois_with_city = tuple({**poi, "cities": cities.get(poi.get("city_id"))} for poi in pois)
+        self._pois_by_id = {poi["id"]: poi for poi in self._pois_with_city}
+        self._spatial_index = None
+
+    def _ensure_worker(self):
+        """Arranca el hilo de sondeo si no está en marcha"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="catalog-replica", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        """Bucle del hilo de sondeo"""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                self.sync_errors += 1
+                print(f"Error al sincronizar el catálogo: {str(e)}")
+
+    def close(self):
+        """Detiene el sondeo"""
+        self._stop.set()
+
+    # ---------- lectura ----------
+
+    def cities(self) -> List[Dict]:
+        """Devuelve todas las ciudades replicadas, activas o no"""
+        self.ensure_loaded()
+        return [dict(city) for city in self._cities]
+
+    def pois(self, city_id: Optional[str] = None, category: Optional[str] = None,
+             is_active: bool = True, limit: Optional[int] = None,
+             include_city: bool = True) -> List[Dict]:
+        """Filtra los POIs replicados con la misma semántica que la consulta a Supabase"""
+        self.ensure_loaded()
+        result = []
+        for poi in (self._pois_with_city if include_city else self._pois):
+            if is_active and not poi.get("is_active"):
+                continue
+            if city_id and poi.get("city_id") != city_id:
+                continue
+            if category and poi.get("category") != category:
+                continue
+            result.append(dict(poi))
+            if limit and len(result) >= limit:
+                break
+        return result
+
+    def pois_by_ids(self, poi_ids) -> Dict[str, Dict]:
+        """Devuelve los POIs replicados (con su ciudad) de ``poi_ids``, indexados por ID"""
+        self.ensure_loaded()
+        index = self._pois_by_id
+        return {poi_id: dict(index[poi_id]) for poi_id in poi_ids if poi_id in index}
+
+    def spatial_index(self) -> GridIndex:
+        """
+        Índice espacial (rejilla) de los POIs activos, agrupado por ciudad.
+
+        Se construye la primera vez que se pide tras cada cambio de la réplica
+        y se comparte entre búsquedas hasta el siguiente.
+        """
+        self.ensure_loaded()
+        index = self._spatial_index
+        if index is None:
+            points = PointIndex.from_pois(poi for poi in self._pois if poi.get("is_active"))
+            index = GridIndex(points, cell_deg=self.grid_cell_deg)
+            self._spatial_index = index
+        return index
+
+    def stats(self) -> Dict[str, object]:
+        """Devuelve métricas de la réplica"""
+        return {
+            "cities": len(self._cities),
+            "pois": len(self._pois),
+            "full_loads": self.full_loads,
+            "delta_syncs": self.delta_syncs,
+            "rows_applied": self.rows_applied,
+            "sync_errors": self.sync_errors,
+            "spatial_searches": self._spatial_index.searches if self._spatial_index else 0,
+            "last_sync": self.last_sync.isoformat(timespec="seconds") if self.last_sync else None,
+            "watermarks": {table: stamp.isoformat() if stamp else None
+                           for table, stamp in self._watermarks.items()},
+        }
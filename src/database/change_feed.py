@@ -0,0 +1,128 @@
+"""
+Escucha de cambios del catálogo publicados por Postgres con LISTEN/NOTIFY
+"""
+import json
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Importación opcional de psycopg (solo necesaria si DATABASE_URL está configurada)
+try:
+    import psycopg
+    PSYCOPG_AVAILABLE = True
+except ImportError:
+    PSYCOPG_AVAILABLE = False
+
+# Canal fijo en el que publica notify_catalog_change() (database.sql)
+CATALOG_CHANNEL = "catalog_changes"
+
+
+class ChangeFeedListener:
+    """
+    Hilo que recibe las notificaciones de ``notify_catalog_change()``.
+
+    Cada notificación llega como ``{"table", "op", "id"}``. Las recibidas en
+    el mismo ciclo de espera (``batch_window`` segundos) se entregan juntas a
+    ``on_change`` como una lista, de modo que una importación masiva que
+    cambia miles de filas no provoca miles de resincronizaciones.
+
+    Tras cada (re)conexión se llama a ``on_change(None)``: las notificaciones
+    emitidas mientras no se escuchaba se pierden, así que el receptor debe
+    resincronizar todo. ``on_status`` recibe True/False al conectar y
+    desconectar, para que el llamante ajuste su sondeo de respaldo.
+    """
+
+    def __init__(self, dsn: str,
+                 on_change: Callable[[Optional[List[Dict]]], None],
+                 on_status: Optional[Callable[[bool], None]] = None,
+                 batch_window: float = 1.0,
+                 reconnect_delay: float = 5.0, max_reconnect_delay: float = 60.0,
+                 channel: str = CATALOG_CHANNEL):
+        """Inicializa el oyente con la cadena de conexión directa a Postgres"""
+        self.dsn = dsn
+        self.channel = channel
+        self.on_change = on_change
+        self.on_status = on_status
+        self.batch_window = batch_window
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.connected = False
+        self.notifications = 0
+        self.reconnects = 0
+        self.errors = 0
+
+    def start(self) -> bool:
+        """Arranca el hilo de escucha; devuelve False si psycopg no está instalado"""
+        if not PSYCOPG_AVAILABLE:
+            print("psycopg no está instalado: la invalidación por LISTEN/NOTIFY queda desactivada")
+            return False
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="catalog-change-feed", daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self):
+        """Detiene la escucha (el hilo termina en el siguiente ciclo)"""
+        self._stop.set()
+
+    def _run(self):
+        """Bucle de conexión con reintentos y espera exponencial"""
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True) as conn:
+                    conn.execute(f'LISTEN "{self.channel}"')
+                    self._set_connected(True)
+                    delay = self.reconnect_delay
+                    self._dispatch(None)
+                    while not self._stop.is_set():
+                        changes = [self._decode(notify.payload)
+                                   for notify in conn.notifies(timeout=self.batch_window)]
+                        changes = [change for change in changes if change is not None]
+                        if changes:
+                            self._dispatch(changes)
+            except Exception as e:
+                self.errors += 1
+                print(f"Error en la escucha de cambios del catálogo: {str(e)}")
+            self._set_connected(False)
+            if self._stop.wait(delay):
+                return
+            self.reconnects += 1
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _decode(self, payload: str) -> Optional[Dict]:
+        """Decodifica una notificación"""
+        self.notifications += 1
+        try:
+            return json.loads(payload)
+        except ValueError:
+            print(f"Notificación de catálogo no válida: {payload}")
+            return None
+
+    def _dispatch(self, changes: Optional[List[Dict]]):
+        """Llama a ``on_change`` sin dejar que un error detenga la escucha"""
+        try:
+            self.on_change(changes)
+        except Exception as e:
+            self.errors += 1
+            print(f"Error al aplicar un cambio del catálogo: {str(e)}")
+
+    def _set_connected(self, connected: bool):
+        """Actualiza el estado y avisa a ``on_status`` si cambia"""
+        if connected == self.connected:
+            return
+        self.connected = connected
+        if self.on_status:
+            self.on_status(connected)
+
+    def stats(self) -> Dict[str, object]:
+        """Devuelve métricas de la escucha"""
+        return {
+            "enabled": self._thread is not None,
+            "connected": self.connected,
+            "channel": self.channel,
+            "notifications": self.notifications,
+            "reconnects": self.reconnects,
+            "errors": self.errors,
+        }
@@ -1,20 +1,108 @@
 """
 Módulo de conexión y operaciones con Supabase
 """
-from supabase import create_client, Client
-from typing import List, Dict, Optional, Any
+from supabase import Client
+from postgrest.types import ReturnMethod
+from typing import Callable, Iterator, List, Dict, Optional, Any, Set, Tuple
 import streamlit as st
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import config.config as config
 from functools import lru_cache
+from .cache import get_query_cache
+from .async_database import fan_out
+from .event_buffer import UsageStatsBuffer
+from .telemetry import get_telemetry, instrument_class
+from .pool import create_client_pool
+from .catalog import CATALOG_TABLES, CatalogReplica
+from .change_feed import ChangeFeedListener
+from .bulk_import import validate_cities, validate_pois
+
+# Espacios de la caché que dependen del catálogo de ciudades/POIs
+# (las ciudades y los POIs se sirven desde la réplica del catálogo)
+CATALOG_CACHE_NAMESPACES = ("poi_categories", "poi_difficulties", "metrics")
+
+# Columnas a leer por tabla y caso de uso. "default" conserva el select completo;
+# el resto solo trae lo que consume cada vista. Las proyecciones usadas con
+# paginación keyset deben incluir "id" y la columna de orden.
+_POI_LOCATION = "points_of_interest(id, name, category, city_id, cities(id, name, country))"
+PROJECTIONS: Dict[str, Dict[str, str]] = {
+    "user_visits": {
+        "default": "*, points_of_interest(*, cities(*)), users(*)",
+        "report": f"id, user_id, poi_id, visit_date, rating, {_POI_LOCATION}",
+        "trend": "id, visit_date",
+        "summary": "id, visit_date, rating",
+        "export": "*",
+    },
+    "bookings": {
+        "default": "*, points_of_interest(*, cities(*)), users(*)",
+        "report": f"id, user_id, poi_id, booking_date, status, total_price, number_of_people, {_POI_LOCATION}",
+        "trend": "id, booking_date",
+        "summary": "id, booking_date, status, total_price",
+        "export": "*",
+    },
+    "usage_stats": {
+        "default": "*",
+        "report": "id, user_id, action_type, timestamp",
+        "export": "*",
+    },
+    "users": {
+        "default": "*",
+        "trend": "id, created_at",
+        "summary": "id, created_at, subscription_tier",
+    },
+    "audio_guides": {
+        "default": "*",
+        "trend": "id, created_at",
+    },
+}
+
+# Orígenes de la exportación masiva: tabla y columna de fecha
+EXPORT_SOURCES: Dict[str, tuple] = {
+    "usage_stats": ("usage_stats", "timestamp"),
+    "visits": ("user_visits", "visit_date"),
+    "bookings": ("bookings", "booking_date"),
+}
 
 class SupabaseDB:
     """Clase para manejar todas las operaciones con Supabase"""
     
-    def __init__(self):
-        """Inicializa la conexión con Supabase"""
-        self.client: Client = create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+    def __init__(self, key: Optional[str] = None):
+        """Inicializa la conexión con Supabase (``key`` sustituye a SUPABASE_KEY, p. ej. en los jobs)"""
+        self.cache = get_query_cache()
+        self.telemetry = get_telemetry()
+        self.pool = create_client_pool(on_create=self.telemetry.attach, key=key)
+        self.stats_buffer = UsageStatsBuffer(
+            self._insert_usage_stats,
+            batch_size=config.USAGE_STATS_BATCH_SIZE,
+            flush_interval=config.USAGE_STATS_FLUSH_INTERVAL,
+            max_queue=config.USAGE_STATS_MAX_QUEUE,
+        )
+        self.catalog = CatalogReplica(
+            self._fetch_catalog_rows,
+            poll_interval=config.CATALOG_POLL_INTERVAL,
+            overlap_seconds=config.CATALOG_OVERLAP_SECONDS,
+            full_reload_interval=config.CATALOG_FULL_RELOAD_INTERVAL,
+            grid_cell_deg=config.GEO_GRID_CELL_DEG,
+        )
+        self.change_feed: Optional[ChangeFeedListener] = None
+        if config.DATABASE_URL:
+            self.change_feed = ChangeFeedListener(
+                config.DATABASE_URL,
+                on_change=self._on_catalog_change,
+                on_status=self._on_change_feed_status,
+            )
+            if not self.change_feed.start():
+                self.change_feed = None
     
+    @property
+    def client(self) -> Client:
+        """Cliente Supabase del pool asignado al hilo actual"""
+        return self.pool.client_for_thread()
+
+    def get_pool_stats(self) -> Dict[str, int]:
+        """Devuelve las métricas del pool de clientes"""
+        return self.pool.stats()
+
     # ==================== OPERACIONES DE CIUDADES ====================
     
     def _handle_response(self, response) -> List[Dict]:
@@ -28,16 +116,131 @@ class SupabaseDB:
         data = self._handle_response(response)
         return data[0] if data else None
 
+    def _cached(self, namespace: str, key: Any, loader) -> List:
+        """
+        Lee a través de la caché compartida; devuelve una copia de la lista cacheada.
+
+        Las filas (dicts) también se copian: el llamante puede añadirles campos
+        sin modificar la entrada que comparten todas las sesiones.
+        """
+        return [dict(row) if isinstance(row, dict) else row
+                for row in self.cache.get_or_load(namespace, key, loader)]
+
+    @staticmethod
+    def _projection(table: str, projection: str) -> str:
+        """Devuelve la cláusula select de una proyección con nombre"""
+        try:
+            return PROJECTIONS[table][projection]
+        except KeyError:
+            raise ValueError(f"Proyección desconocida '{projection}' para la tabla {table}") from None
+
+    def _iter_keyset(self, table: str, select_clause: str, order_field: str,
+                     apply_filters: Optional[Callable] = None,
+                     page_size: Optional[int] = None,
+                     error_label: str = "registros",
+                     raise_errors: bool = False,
+                     ascending: bool = False,
+                     id_field: str = "id") -> Iterator[Dict]:
+        """
+        Recorre una tabla en páginas de tamaño fijo usando paginación keyset.
+
+        Ordena por (order_field, id) descendente y pide cada página a partir de
+        la última clave vista, por lo que el coste de cada página no depende de
+        cuántas se hayan leído antes y nunca se supera el límite de filas de
+        PostgREST. Las filas con ``order_field`` nulo se devuelven al final.
+        Con ``ascending`` el orden es el inverso (ascendente, nulos primero).
+        Con ``raise_errors`` un fallo a mitad se propaga en lugar de terminar
+        la iteración en silencio. ``id_field`` es la columna única que desempata
+        (en vistas sin ``id`` propio).
+        """
+        page_size = page_size or config.DB_PAGE_SIZE
+        op = "gt" if ascending else "lt"
+        last_value: Any = None
+        last_id: Optional[str] = None
+        while True:
+            try:
+                query = self.client.table(table).select(select_clause)
+                if apply_filters:
+                    query = apply_filters(query)
+                if last_id is not None:
+                    if last_value is None and ascending:
+                        query = query.or_(
+                            f'and({order_field}.is.null,{id_field}.{op}.{last_id}),'
+                            f'{order_field}.not.is.null'
+                        )
+                    elif last_value is None:
+                        query = query.is_(order_field, "null").lt(id_field, last_id)
+                    else:
+                        query = query.or_(
+                            f'{order_field}.{op}."{last_value}",'
+                            f'and({order_field}.eq."{last_value}",{id_field}.{op}.{last_id})'
+                            + ('' if ascending else f',{order_field}.is.null')
+                        )
+                response = query.order(order_field, desc=not ascending, nullsfirst=ascending) \
+                    .order(id_field, desc=not ascending).limit(page_size).execute()
+                rows = self._handle_response(response)
+            except Exception as e:
+                if raise_errors:
+                    raise
+                st.error(f"Error al obtener {error_label}: {str(e)}")
+                return
+
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_value = rows[-1].get(order_field)
+            last_id = rows[-1].get(id_field)
+
+    def _select_in(self, table: str, select_clause: str, column: str,
+                   values, apply_filters: Optional[Callable] = None) -> List[Dict]:
+        """
+        Obtiene las filas cuyo ``column`` está en ``values`` con consultas ``in_()``.
+
+        Los valores se deduplican y se envían en bloques de ``DB_IN_CHUNK_SIZE``
+        para no superar la longitud máxima de URL de PostgREST.
+        """
+        unique_values = list(dict.fromkeys(value for value in values if value))
+        rows: List[Dict] = []
+        chunk_size = config.DB_IN_CHUNK_SIZE
+        for start in range(0, len(unique_values), chunk_size):
+            query = self.client.table(table).select(select_clause) \
+                .in_(column, unique_values[start:start + chunk_size])
+            if apply_filters:
+                query = apply_filters(query)
+            rows.extend(self._handle_response(query.execute()))
+        return rows
+
+    def _fetch_catalog_rows(self, table: str, since: Optional[datetime]) -> List[Dict]:
+        """
+        Lee las filas de ``table`` con updated_at >= ``since`` (todas si es None)
+        para la réplica del catálogo, sin filtrar por is_active.
+
+        Pagina con keyset en orden (updated_at, id) ascendente: una fila que se
+        modifica durante la carga pasa al final del orden y se vuelve a leer,
+        sin desplazar a las demás como haría un OFFSET. Los errores se propagan
+        a la réplica, que conserva su estado anterior.
+        """
+        apply_filters = (lambda query: query.gte("updated_at", since.isoformat())) if since is not None else None
+        return list(self._iter_keyset(table, "*", "updated_at", apply_filters,
+                                      error_label="catálogo", raise_errors=True, ascending=True))
+
+    @staticmethod
+    def _date_range_filter(field: str, start_date: Optional[datetime],
+                           end_date: Optional[datetime]) -> Callable:
+        """Construye un filtro de rango de fechas para ``_iter_keyset``"""
+        def apply(query):
+            if start_date:
+                query = query.gte(field, start_date.isoformat())
+            if end_date:
+                query = query.lte(field, end_date.isoformat())
+            return query
+        return apply
+
     def get_cities(self, is_active: bool = True, order_by: str = "name") -> List[Dict]:
-        """Obtiene todas las ciudades, opcionalmente filtradas por estado"""
+        """Obtiene todas las ciudades desde la réplica local del catálogo"""
         try:
-            query = self.client.table("cities").select("*")
-            # if is_active:
-            #     query = query.eq("is_active", True)
-            # if order_by:
-            #     query = query.order(order_by)
-            response = query.execute()
-            return self._handle_response(response)
+            # Como la consulta original (con los filtros comentados), devuelve todas las ciudades
+            return self.catalog.cities()
         except Exception as e:
             st.error(f"Error al obtener ciudades: {str(e)}")
             return []
@@ -54,6 +257,15 @@ class SupabaseDB:
     def get_city(self, city_id: str) -> Optional[Dict]:
         """Alias de get_city_by_id"""
         return self.get_city_by_id(city_id)
+
+    def get_cities_by_ids(self, city_ids) -> Dict[str, Dict]:
+        """Obtiene varias ciudades en una sola consulta, indexadas por ID"""
+        try:
+            rows = self._select_in("cities", "*", "id", city_ids)
+            return {city["id"]: city for city in rows}
+        except Exception as e:
+            st.error(f"Error al obtener ciudades: {str(e)}")
+            return {}
     
     def create_city(self, city_data: Dict) -> Optional[Dict]:
         """Crea una nueva ciudad"""
@@ -106,23 +318,10 @@ class SupabaseDB:
     def get_pois(self, city_id: Optional[str] = None, category: Optional[str] = None,
                  is_active: bool = True, limit: Optional[int] = None,
                  include_city: bool = True) -> List[Dict]:
-        """Obtiene puntos de interés con filtros opcionales"""
+        """Obtiene puntos de interés con filtros opcionales desde la réplica local del catálogo"""
         try:
-            select_clause = "*, cities(*)" if include_city else "*"
-            query = self.client.table("points_of_interest").select(select_clause)
-
-            if is_active:
-                query = query.eq("is_active", True)
-            if city_id:
-                query = query.eq("city_id", city_id)
-            if category:
-                query = query.eq("category", category)
-
-            if limit:
-                query = query.limit(limit)
-
-            response = query.order("name").execute()
-            return self._handle_response(response)
+            return self.catalog.pois(city_id=city_id, category=category, is_active=is_active,
+                                     limit=limit, include_city=include_city)
         except Exception as e:
             st.error(f"Error al obtener POIs: {str(e)}")
             return []
@@ -139,7 +338,124 @@ class SupabaseDB:
     def get_poi(self, poi_id: str) -> Optional[Dict]:
         """Alias de get_poi_by_id"""
         return self.get_poi_by_id(poi_id)
+
+    def get_pois_by_ids(self, poi_ids) -> Dict[str, Dict]:
+        """Obtiene varios POIs (con su ciudad) en una sola consulta, indexados por ID"""
+        try:
+            rows = self._select_in("points_of_interest", "*, cities(*)", "id", poi_ids)
+            return {poi["id"]: poi for poi in rows}
+        except Exception as e:
+            st.error(f"Error al obtener POIs: {str(e)}")
+            return {}
     
+    def search_pois(self, query: str, filters: Optional[Dict] = None,
+                    limit: Optional[int] = None) -> List[Dict]:
+        """
+        Busca POIs activos por texto completo, ordenados por relevancia.
+
+        La función ``search_pois`` de la base de datos aplica la búsqueda
+        (español con raíces y sin acentos, la última palabra también como
+        prefijo para buscar mientras se escribe) y los filtros, y devuelve solo IDs
+        y relevancia; los datos se completan desde la réplica del catálogo.
+        ``filters`` admite ``city_id``, ``categories``, ``difficulties``,
+        ``price_range`` (mínimo, máximo) y ``min_rating``. Cada POI devuelto
+        lleva ``search_rank``.
+        """
+        if not query or not query.strip():
+            return []
+        filters = filters or {}
+        price_range = filters.get("price_range") or (None, None)
+        try:
+            response = self.client.rpc("search_pois", {
+                "p_query": query.strip(),
+                "p_city_id": filters.get("city_id"),
+                "p_categories": filters.get("categories") or None,
+                "p_difficulties": filters.get("difficulties") or None,
+                "p_min_price": price_range[0],
+                "p_max_price": price_range[1],
+                "p_min_rating": filters.get("min_rating") or None,
+                "p_limit": limit or config.SEARCH_RESULTS_LIMIT,
+            }).execute()
+            ranked = self._handle_response(response)
+            ids = [row["id"] for row in ranked]
+            pois = self.catalog.pois_by_ids(ids)
+            missing = [poi_id for poi_id in ids if poi_id not in pois]
+            if missing:
+                # Creados después de la última sincronización de la réplica
+                pois.update(self.get_pois_by_ids(missing))
+            results = []
+            for row in ranked:
+                poi = pois.get(row["id"])
+                if poi:
+                    poi["search_rank"] = row.get("rank")
+                    results.append(poi)
+            return results
+        except Exception as e:
+            st.error(f"Error al buscar POIs: {str(e)}")
+            return []
+
+    def get_nearby_pois(self, lat: float, lng: float, k: Optional[int] = None,
+                        max_distance_km: Optional[float] = None,
+                        city_id: Optional[str] = None) -> List[Dict]:
+        """
+        Obtiene los POIs activos más cercanos a (lat, lng), del más cercano al más lejano.
+
+        Busca en memoria sobre el índice espacial de la réplica del catálogo,
+        que solo mide distancias a los POIs de las celdas cercanas. Cada POI
+        devuelto lleva ``distance`` en km. Sin ``k`` devuelve todos los que
+        cumplan ``max_distance_km`` y ``city_id``.
+        """
+        try:
+            index = self.catalog.spatial_index()
+            positions, distances = index.nearest(lat, lng, k=k, max_distance_km=max_distance_km, group=city_id)
+            ids = [index.ids[position] for position in positions]
+            pois = self.catalog.pois_by_ids(ids)
+            results = []
+            for poi_id, distance in zip(ids, distances):
+                poi = pois.get(poi_id)
+                if poi:
+                    poi["distance"] = float(distance)
+                    results.append(poi)
+            return results
+        except Exception as e:
+            st.error(f"Error al obtener POIs cercanos: {str(e)}")
+            return []
+
+    def nearby_pois(self, lat: float, lng: float, radius_km: float,
+                    limit: Optional[int] = None, city_id: Optional[str] = None) -> List[Dict]:
+        """
+        Obtiene los POIs activos a menos de ``radius_km`` de (lat, lng), del más cercano al más lejano.
+
+        Con ``GEO_USE_POSTGIS`` la búsqueda la hace la función ``nearby_pois``
+        de la base de datos (índice GiST de PostGIS) y los datos se completan
+        desde la réplica; si no está activado o falla, se usa el índice
+        espacial en memoria de ``get_nearby_pois``.
+        """
+        if config.GEO_USE_POSTGIS:
+            try:
+                response = self.client.rpc("nearby_pois", {
+                    "p_lat": lat,
+                    "p_lng": lng,
+                    "p_radius_km": radius_km,
+                    "p_limit": limit,
+                    "p_city_id": city_id,
+                }).execute()
+                rows = self._handle_response(response)
+                pois = self.catalog.pois_by_ids(row["id"] for row in rows)
+                missing = [row["id"] for row in rows if row["id"] not in pois]
+                if missing:
+                    pois.update(self.get_pois_by_ids(missing))
+                results = []
+                for row in rows:
+                    poi = pois.get(row["id"])
+                    if poi:
+                        poi["distance"] = float(row["distance_km"])
+                        results.append(poi)
+                return results
+            except Exception as e:
+                print(f"Error en la búsqueda PostGIS de POIs cercanos, se usa el índice en memoria: {str(e)}")
+        return self.get_nearby_pois(lat, lng, k=limit, max_distance_km=radius_km, city_id=city_id)
+
     def create_poi(self, poi_data: Dict) -> Optional[Dict]:
         """Crea un nuevo punto de interés"""
         try:
@@ -159,11 +475,34 @@ class SupabaseDB:
                 "rating": new_rating,
                 "total_reviews": total_reviews
             }).eq("id", poi_id).execute()
+            self.refresh_caches()
             return True
         except Exception as e:
             st.error(f"Error al actualizar rating: {str(e)}")
             return False
     
+    def add_poi_rating(self, poi_id: str, rating: float) -> Optional[Dict]:
+        """
+        Añade una valoración a un POI recalculando la media en el servidor.
+
+        La función ``add_poi_rating`` actualiza rating y total_reviews en una
+        sola sentencia, por lo que las reseñas concurrentes no se pisan.
+        Devuelve ``{"rating", "total_reviews"}`` con los valores resultantes.
+        """
+        try:
+            response = self.client.rpc("add_poi_rating", {
+                "p_poi_id": poi_id,
+                "p_rating": rating
+            }).execute()
+            row = self._handle_single_response(response)
+            self.refresh_caches()
+            if not row:
+                return None
+            return {"rating": row.get("new_rating"), "total_reviews": row.get("new_total_reviews")}
+        except Exception as e:
+            st.error(f"Error al actualizar rating: {str(e)}")
+            return None
+
     def update_poi(self, poi_id: str, poi_data: Dict) -> Optional[Dict]:
         """Actualiza un POI"""
         try:
@@ -198,6 +537,82 @@ class SupabaseDB:
             st.error(f"Error al obtener POIs: {str(e)}")
             return []
     
+    # ==================== IMPORTACIÓN MASIVA ====================
+
+    def _bulk_upsert(self, table: str, rows: List[Dict], on_conflict: str,
+                     batch_size: Optional[int] = None,
+                     progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Inserta o actualiza ``rows`` en lotes de ``batch_size`` con un upsert por lote.
+
+        Dentro de cada lote las filas se agrupan por el conjunto de columnas que
+        traen y cada grupo va en su propio upsert: PostgREST actualiza en
+        conflicto todas las columnas de la petición, así que mezclar filas con
+        celdas vacías haría que esas columnas volvieran a su valor por defecto
+        en los registros existentes. Así una celda vacía deja el valor actual
+        (o el por defecto si la fila es nueva).
+
+        Un lote que falla no detiene la importación: sus filas se cuentan como
+        fallidas y el error se añade al resultado. Las cachés se invalidan una
+        sola vez al terminar.
+        """
+        batch_size = batch_size or config.BULK_IMPORT_BATCH_SIZE
+        result: Dict[str, Any] = {"written": 0, "failed": 0, "errors": []}
+        total = len(rows)
+        for start in range(0, total, batch_size):
+            batch = rows[start:start + batch_size]
+            groups: Dict[Tuple[str, ...], List[Dict]] = {}
+            for row in batch:
+                groups.setdefault(tuple(sorted(row)), []).append(row)
+            for group in groups.values():
+                try:
+                    self.client.table(table).upsert(
+                        group, on_conflict=on_conflict, default_to_null=False,
+                        returning=ReturnMethod.minimal
+                    ).execute()
+                    result["written"] += len(group)
+                except Exception as e:
+                    result["failed"] += len(group)
+                    result["errors"].append({
+                        "fila": f"{start + 1}-{start + len(batch)}",
+                        "error": f"Error al guardar el lote: {str(e)}"
+                    })
+            if progress:
+                progress(min(start + batch_size, total), total)
+        if result["written"]:
+            self.refresh_caches()
+        return result
+
+    def bulk_upsert_cities(self, rows: List[Dict], batch_size: Optional[int] = None,
+                           progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Valida e importa ciudades; las existentes (mismo nombre y país) se actualizan.
+
+        Devuelve ``{"written", "failed", "invalid", "errors"}``, con los errores
+        de validación por fila y los de los lotes que no se pudieron guardar.
+        """
+        valid, errors = validate_cities(rows)
+        result = self._bulk_upsert("cities", valid, "name,country", batch_size, progress)
+        result["invalid"] = len(errors)
+        result["errors"] = errors + result["errors"]
+        return result
+
+    def bulk_upsert_pois(self, rows: List[Dict], batch_size: Optional[int] = None,
+                         progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        """
+        Valida e importa POIs; los existentes (misma ciudad y nombre) se actualizan.
+
+        Las filas pueden indicar la ciudad con ``city_id`` o con su nombre en
+        ``city``. Devuelve lo mismo que ``bulk_upsert_cities``.
+        """
+        cities = self.get_all_cities(include_inactive=True)
+        city_ids_by_name = {city["name"].strip().lower(): city["id"] for city in cities if city.get("name")}
+        valid, errors = validate_pois(rows, city_ids_by_name, known_city_ids=[city["id"] for city in cities])
+        result = self._bulk_upsert("points_of_interest", valid, "city_id,name", batch_size, progress)
+        result["invalid"] = len(errors)
+        result["errors"] = errors + result["errors"]
+        return result
+
     # ==================== OPERACIONES DE USUARIOS ====================
     
     def get_user_by_email(self, email: str) -> Optional[Dict]:
@@ -215,21 +630,29 @@ class SupabaseDB:
             payload = dict(user_data)
             payload.setdefault("role", "user")
             response = self.client.table("users").insert(payload).execute()
+            self.cache.invalidate("leaderboard")
             return self._handle_single_response(response)
         except Exception as e:
             st.error(f"Error al crear usuario: {str(e)}")
             return None
     
-    def update_user_points(self, user_id: str, points: int) -> bool:
-        """Actualiza los puntos de un usuario"""
+    def add_user_points(self, user_id: str, points: int) -> Optional[int]:
+        """
+        Suma (o resta) puntos a un usuario de forma atómica y devuelve el nuevo total.
+
+        El incremento se hace en la base de datos, así que dos sesiones que
+        suman a la vez no se pisan como pasaría leyendo y escribiendo el total.
+        """
         try:
-            self.client.table("users").update({
-                "total_points": points
-            }).eq("id", user_id).execute()
-            return True
+            response = self.client.rpc("add_user_points", {
+                "p_user_id": user_id,
+                "p_points": points
+            }).execute()
+            self.cache.invalidate("leaderboard")
+            return response.data
         except Exception as e:
             st.error(f"Error al actualizar puntos: {str(e)}")
-            return False
+            return None
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
         """Obtiene un usuario por su ID"""
@@ -242,12 +665,13 @@ class SupabaseDB:
     
     def get_all_users(self) -> List[Dict]:
         """Obtiene todos los usuarios"""
-        try:
-            response = self.client.table("users").select("*").order("created_at", desc=True).execute()
-            return self._handle_response(response)
-        except Exception as e:
-            st.error(f"Error al obtener usuarios: {str(e)}")
-            return []
+        return list(self.iter_all_users())
+
+    def iter_all_users(self, page_size: Optional[int] = None,
+                       projection: str = "default") -> Iterator[Dict]:
+        """Itera sobre todos los usuarios, del más reciente al más antiguo, por páginas"""
+        return self._iter_keyset("users", self._projection("users", projection), "created_at",
+                                 page_size=page_size, error_label="usuarios")
     
     def update_user(self, user_id: str, user_data: Dict) -> Optional[Dict]:
         """Actualiza un usuario"""
@@ -262,6 +686,7 @@ class SupabaseDB:
         """Elimina un usuario"""
         try:
             self.client.table("users").delete().eq("id", user_id).execute()
+            self.cache.invalidate("leaderboard")
             return True
         except Exception as e:
             st.error(f"Error al eliminar usuario: {str(e)}")
@@ -300,14 +725,13 @@ class SupabaseDB:
     
     def get_all_visits(self) -> List[Dict]:
         """Obtiene todas las visitas"""
-        try:
-            response = self.client.table("user_visits").select(
-                "*, points_of_interest(*, cities(*)), users(*)"
-            ).order("visit_date", desc=True).execute()
-            return response.data
-        except Exception as e:
-            st.error(f"Error al obtener visitas: {str(e)}")
-            return []
+        return list(self.iter_all_visits())
+
+    def iter_all_visits(self, page_size: Optional[int] = None,
+                        projection: str = "default") -> Iterator[Dict]:
+        """Itera sobre todas las visitas por páginas, de la más reciente a la más antigua"""
+        return self._iter_keyset("user_visits", self._projection("user_visits", projection),
+                                 "visit_date", page_size=page_size, error_label="visitas")
     
     def update_visit(self, visit_id: str, visit_data: Dict) -> Optional[Dict]:
         """Actualiza una visita"""
@@ -353,16 +777,46 @@ class SupabaseDB:
             return []
 
     def create_achievement(self, achievement_data: Dict) -> Optional[Dict]:
-        """Crea un nuevo logro para un usuario"""
+        """
+        Crea un nuevo logro para un usuario.
+
+        Un logro que el usuario ya tiene (UNIQUE user_id, achievement_name) se
+        ignora en el servidor sin error y devuelve None.
+        """
         try:
-            response = self.client.table("user_achievements").insert(achievement_data).execute()
-            return self._handle_single_response(response)
+            response = self.client.table("user_achievements").upsert(
+                achievement_data, on_conflict="user_id,achievement_name", ignore_duplicates=True
+            ).execute()
+            created = self._handle_single_response(response)
+            if created:
+                # El trigger add_points_on_achievement suma los puntos al usuario
+                self.cache.invalidate("leaderboard")
+            return created
         except Exception as e:
-            # El error puede ser por duplicado (UNIQUE constraint)
-            if "duplicate" in str(e).lower():
-                return None
             st.error(f"Error al crear logro: {str(e)}")
             return None
+
+    def get_achievement_progress(self, user_id: str) -> Optional[Dict]:
+        """
+        Obtiene los contadores de logros de un usuario en una sola fila.
+
+        La función ``get_achievement_progress`` devuelve ``audio_guides``,
+        ``bookings``, ``visits``, ``reviews``, ``city_ids`` (ciudades visitadas)
+        y ``earned`` (nombres de los logros obtenidos); a las audio-guías se
+        suman las del buffer de estadísticas aún sin guardar. Devuelve None si
+        la consulta falla.
+        """
+        try:
+            response = self.client.rpc("get_achievement_progress", {"p_user_id": user_id}).execute()
+            progress = self._handle_single_response(response)
+        except Exception as e:
+            print(f"Error al obtener el progreso de logros: {str(e)}")
+            return None
+        if progress is None:
+            return None
+        pending = self.stats_buffer.pending(user_id=user_id, action_type="audio_guide")
+        progress["audio_guides"] = int(progress.get("audio_guides") or 0) + len(pending)
+        return progress
     
     # ==================== OPERACIONES DE RESERVAS ====================
     
@@ -399,14 +853,13 @@ class SupabaseDB:
     
     def get_all_bookings(self) -> List[Dict]:
         """Obtiene todas las reservas"""
-        try:
-            response = self.client.table("bookings").select(
-                "*, points_of_interest(*, cities(*)), users(*)"
-            ).order("booking_date", desc=True).execute()
-            return self._handle_response(response)
-        except Exception as e:
-            st.error(f"Error al obtener reservas: {str(e)}")
-            return []
+        return list(self.iter_all_bookings())
+
+    def iter_all_bookings(self, page_size: Optional[int] = None,
+                          projection: str = "default") -> Iterator[Dict]:
+        """Itera sobre todas las reservas por páginas, de la más reciente a la más antigua"""
+        return self._iter_keyset("bookings", self._projection("bookings", projection),
+                                 "booking_date", page_size=page_size, error_label="reservas")
     
     def get_booking_by_id(self, booking_id: str) -> Optional[Dict]:
         """Obtiene una reserva por su ID"""
@@ -449,10 +902,35 @@ class SupabaseDB:
             print(f"Error al crear estadística: {str(e)}")
             return None
     
+    def _insert_usage_stats(self, rows: List[Dict]):
+        """
+        Inserta varias estadísticas en una sola petición (usado por el buffer).
+
+        Las filas del lote pueden traer columnas distintas: con
+        ``default_to_null=False`` las que falten toman su DEFAULT (p. ej.
+        ``metadata = '{}'``) en lugar de NULL.
+        """
+        self.client.table("usage_stats").insert(
+            rows, default_to_null=False, returning=ReturnMethod.minimal
+        ).execute()
+
+    def log_usage_stat(self, stat_data: Dict) -> bool:
+        """
+        Registra una estadística de uso sin bloquear la petición del usuario.
+
+        La fila se encola en ``stats_buffer`` y se inserta por lotes en segundo
+        plano. Devuelve False si el evento se descartó por cola llena.
+        """
+        return self.stats_buffer.enqueue(stat_data)
+
+    def get_usage_stats_buffer_stats(self) -> Dict[str, int]:
+        """Devuelve las métricas del buffer de estadísticas de uso"""
+        return self.stats_buffer.stats()
+    
     def get_usage_stats(self, user_id: Optional[str] = None, 
                        action_type: Optional[str] = None,
                        limit: int = 100) -> List[Dict]:
-        """Obtiene estadísticas de uso"""
+        """Obtiene estadísticas de uso, incluidas las que aún están en el buffer"""
         try:
             query = self.client.table("usage_stats").select("*")
             
@@ -462,7 +940,8 @@ class SupabaseDB:
                 query = query.eq("action_type", action_type)
             
             response = query.order("timestamp", desc=True).limit(limit).execute()
-            return self._handle_response(response)
+            pending = self.stats_buffer.pending(user_id=user_id, action_type=action_type)
+            return (pending + self._handle_response(response))[:limit]
         except Exception as e:
             st.error(f"Error al obtener estadísticas: {str(e)}")
             return []
@@ -493,6 +972,25 @@ class SupabaseDB:
             st.error(f"Error al obtener audio-guías: {str(e)}")
             return []
     
+    def get_audio_guides_for_pois(self, poi_ids, language: Optional[str] = None,
+                                  is_active: bool = True) -> Dict[str, List[Dict]]:
+        """Obtiene las audio-guías de varios POIs en una sola consulta, agrupadas por POI"""
+        def apply(query):
+            if language:
+                query = query.eq("language", language)
+            if is_active:
+                query = query.eq("is_active", True)
+            return query.order("created_at", desc=True)
+
+        try:
+            grouped: Dict[str, List[Dict]] = {}
+            for audio in self._select_in("audio_guides", "*", "poi_id", poi_ids, apply):
+                grouped.setdefault(audio["poi_id"], []).append(audio)
+            return grouped
+        except Exception as e:
+            st.error(f"Error al obtener audio-guías: {str(e)}")
+            return {}
+
     def create_audio_guide(self, audio_data: Dict) -> Optional[Dict]:
         """Crea una nueva audio-guía"""
         try:
@@ -505,17 +1003,9 @@ class SupabaseDB:
     def increment_audio_play_count(self, audio_id: str) -> bool:
         """Incrementa el contador de reproducciones de una audio-guía"""
         try:
-            # Primero obtener el audio actual
-            audio = self.client.table("audio_guides").select("play_count").eq("id", audio_id).execute()
-            if audio.data:
-                current_count = audio.data[0].get("play_count", 0)
-                now = datetime.now()
-                self.client.table("audio_guides").update({
-                    "play_count": current_count + 1,
-                    "last_played_at": now.isoformat() if now else None
-                }).eq("id", audio_id).execute()
-                return True
-            return False
+            # El incremento se hace en el servidor en una sola sentencia
+            response = self.client.rpc("increment_audio_play_count", {"p_audio_id": audio_id}).execute()
+            return response.data is not None
         except Exception as e:
             print(f"Error al incrementar contador: {str(e)}")
             return False
@@ -558,6 +1048,44 @@ class SupabaseDB:
             st.error(f"Error al eliminar favorito: {str(e)}")
             return False
     
+    def get_user_favorite_ids(self, user_id: str) -> Optional[Set[str]]:
+        """
+        Obtiene solo los IDs de los POIs favoritos de un usuario, sin joins.
+
+        Devuelve None si la consulta falla, para distinguirlo de no tener favoritos.
+        """
+        try:
+            rows = self._iter_keyset("favorites", "id, poi_id, created_at", "created_at",
+                                     lambda query: query.eq("user_id", user_id),
+                                     error_label="favoritos", raise_errors=True)
+            return {row["poi_id"] for row in rows if row.get("poi_id")}
+        except Exception as e:
+            print(f"Error al obtener los favoritos del usuario: {str(e)}")
+            return None
+
+    def set_favorite(self, user_id: str, poi_id: str, favorite: bool) -> bool:
+        """
+        Marca o desmarca un favorito con una sola escritura idempotente.
+
+        Pensado para ejecutarse en segundo plano: no devuelve la fila y los
+        errores se registran en consola en lugar de en la página.
+        """
+        try:
+            if favorite:
+                self.client.table("favorites").upsert(
+                    {"user_id": user_id, "poi_id": poi_id},
+                    on_conflict="user_id,poi_id",
+                    ignore_duplicates=True,
+                    returning=ReturnMethod.minimal,
+                ).execute()
+            else:
+                self.client.table("favorites").delete(returning=ReturnMethod.minimal) \
+                    .eq("user_id", user_id).eq("poi_id", poi_id).execute()
+            return True
+        except Exception as e:
+            print(f"Error al {'añadir' if favorite else 'eliminar'} favorito: {str(e)}")
+            return False
+
     def is_favorite(self, user_id: str, poi_id: str) -> bool:
         """Verifica si un POI está en favoritos"""
         try:
@@ -581,28 +1109,32 @@ class SupabaseDB:
 
     def get_poi_categories(self, include_inactive: bool = False) -> List[str]:
         """Obtiene las categorías disponibles para POIs desde la base de datos."""
-        try:
+        def load():
             query = self.client.table("points_of_interest").select("category")
             if not include_inactive:
                 query = query.eq("is_active", True)
             response = query.execute()
             data = self._handle_response(response)
-            categories = sorted({item.get("category") for item in data if item.get("category")})
-            return categories
+            return sorted({item.get("category") for item in data if item.get("category")})
+
+        try:
+            return self._cached("poi_categories", include_inactive, load)
         except Exception as e:
             st.error(f"Error al obtener categorías de POI: {str(e)}")
             return []
 
     def get_poi_difficulties(self, include_inactive: bool = False) -> List[str]:
         """Obtiene los niveles de dificultad disponibles para POIs."""
-        try:
+        def load():
             query = self.client.table("points_of_interest").select("difficulty_level")
             if not include_inactive:
                 query = query.eq("is_active", True)
             response = query.execute()
             data = self._handle_response(response)
-            difficulties = sorted({item.get("difficulty_level") for item in data if item.get("difficulty_level")})
-            return difficulties
+            return sorted({item.get("difficulty_level") for item in data if item.get("difficulty_level")})
+
+        try:
+            return self._cached("poi_difficulties", include_inactive, load)
         except Exception as e:
             st.error(f"Error al obtener niveles de dificultad: {str(e)}")
             return []
@@ -611,59 +1143,201 @@ class SupabaseDB:
                               end_date: Optional[datetime] = None,
                               action_type: Optional[str] = None) -> List[Dict]:
         """Obtiene estadísticas de uso dentro de un rango de fechas."""
-        try:
-            query = self.client.table("usage_stats").select("*")
+        return list(self.iter_usage_stats_range(start_date, end_date, action_type))
+
+    def iter_usage_stats_range(self, start_date: Optional[datetime] = None,
+                               end_date: Optional[datetime] = None,
+                               action_type: Optional[str] = None,
+                               page_size: Optional[int] = None,
+                               projection: str = "default",
+                               include_rollups: bool = True,
+                               raise_errors: bool = False) -> Iterator[Dict]:
+        """
+        Itera por páginas sobre las estadísticas de uso de un rango de fechas.
+
+        Los eventos anteriores a la marca de agua del rollup ya no están en
+        ``usage_stats``: para esa parte del rango se devuelven las filas de
+        ``usage_stats_daily`` con la forma de un evento más ``event_count`` y
+        ``is_rollup``. Los eventos sueltos no llevan ``event_count``; quien
+        cuente debe usar ``stat.get("event_count", 1)``.
+        """
+        select_clause = self._projection("usage_stats", projection)
+        watermark = self.get_usage_stats_watermark() if include_rollups else None
+
+        raw_start = start_date
+        if watermark and (raw_start is None or raw_start < watermark):
+            raw_start = watermark
+        date_filter = self._date_range_filter("timestamp", raw_start, end_date)
+
+        def apply(query):
+            query = date_filter(query)
+            if action_type:
+                query = query.eq("action_type", action_type)
+            return query
+
+        raw = self._iter_keyset("usage_stats", select_clause, "timestamp", apply, page_size,
+                                error_label="estadísticas de uso", raise_errors=raise_errors)
+        yield from raw
+        if not watermark or (start_date and start_date >= watermark):
+            return
+
+        def apply_rollup(query):
             if start_date:
-                query = query.gte("timestamp", start_date.isoformat())
+                query = query.gte("day", start_date.date().isoformat())
+            query = query.lt("day", watermark.date().isoformat())
             if end_date:
-                query = query.lte("timestamp", end_date.isoformat())
+                query = query.lte("day", end_date.date().isoformat())
             if action_type:
                 query = query.eq("action_type", action_type)
-            response = query.order("timestamp", desc=True).execute()
-            return self._handle_response(response)
+            return query
+
+        rollups = self._iter_keyset("usage_stats_daily", "*", "day", apply_rollup, page_size,
+                                    error_label="resúmenes de estadísticas de uso",
+                                    raise_errors=raise_errors)
+        # Orden descendente por fecha: primero los eventos recientes, después los días resumidos
+        for row in rollups:
+            yield self._rollup_as_event(row)
+
+    @staticmethod
+    def _rollup_as_event(row: Dict) -> Dict:
+        """Da a una fila de usage_stats_daily la forma de un evento de usage_stats"""
+        return {
+            "id": row.get("id"),
+            "user_id": row.get("user_id"),
+            "poi_id": row.get("poi_id"),
+            "city_id": row.get("city_id"),
+            "action_type": row.get("action_type"),
+            "timestamp": f"{row.get('day')}T00:00:00",
+            "duration_seconds": row.get("total_duration_seconds"),
+            "event_count": row.get("event_count") or 0,
+            "is_rollup": True,
+        }
+
+    def get_usage_stats_watermark(self) -> Optional[datetime]:
+        """Devuelve la fecha antes de la cual las estadísticas de uso están resumidas por día."""
+        def load():
+            response = self.client.table("usage_stats_rollup_state").select("rolled_up_before").execute()
+            row = self._handle_single_response(response)
+            return [row.get("rolled_up_before")] if row and row.get("rolled_up_before") else []
+
+        try:
+            values = self._cached("usage_rollup", "watermark", load)
         except Exception as e:
-            st.error(f"Error al obtener estadísticas de uso: {str(e)}")
-            return []
+            # Sin la migración del rollup se sigue leyendo solo usage_stats
+            print(f"Error al obtener la marca de agua del rollup: {str(e)}")
+            return None
+        return datetime.fromisoformat(values[0]) if values else None
 
-    def get_visits_range(self, start_date: Optional[datetime] = None,
-                         end_date: Optional[datetime] = None) -> List[Dict]:
-        """Obtiene visitas dentro de un rango de fechas."""
+    def ensure_partitions(self, months_ahead: Optional[int] = None) -> Optional[int]:
+        """
+        Crea las particiones mensuales de usage_stats y user_visits que falten
+        hasta ``months_ahead`` meses por delante (0-24). Requiere la clave
+        service_role. Devuelve cuántas se crearon.
+        """
+        months_ahead = config.PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
         try:
-            query = self.client.table("user_visits").select(
-                "*, points_of_interest(*, cities(*)), users(*)"
-            )
-            if start_date:
-                query = query.gte("visit_date", start_date.isoformat())
-            if end_date:
-                query = query.lte("visit_date", end_date.isoformat())
-            response = query.order("visit_date", desc=True).execute()
-            return self._handle_response(response)
+            response = self.client.rpc("ensure_monthly_partitions", {"p_months_ahead": months_ahead}).execute()
+            return response.data if isinstance(response.data, int) else 0
         except Exception as e:
-            st.error(f"Error al obtener visitas en rango: {str(e)}")
-            return []
+            print(f"Error al crear particiones: {str(e)}")
+            return None
 
-    def get_bookings_range(self, start_date: Optional[datetime] = None,
-                           end_date: Optional[datetime] = None) -> List[Dict]:
-        """Obtiene reservas en un rango de fechas."""
+    def rollup_usage_stats(self, older_than_days: Optional[int] = None,
+                           archive: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+        """
+        Resume por día los eventos de usage_stats más antiguos que ``older_than_days``.
+
+        Vacía antes el buffer de escrituras para no dejar eventos pendientes por
+        detrás del corte. La función solo la puede ejecutar la clave service_role
+        (``SupabaseDB(config.SUPABASE_SERVICE_KEY)``). Devuelve
+        ``{"moved_rows", "summary_rows", "watermark"}``.
+        """
+        older_than_days = config.USAGE_STATS_RETENTION_DAYS if older_than_days is None else older_than_days
+        archive = config.USAGE_STATS_ARCHIVE if archive is None else archive
+        # Los timestamps de usage_stats se guardan en UTC sin zona
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
         try:
-            query = self.client.table("bookings").select(
-                "*, points_of_interest(*, cities(*)), users(*)"
-            )
-            if start_date:
-                query = query.gte("booking_date", start_date.isoformat())
-            if end_date:
-                query = query.lte("booking_date", end_date.isoformat())
-            response = query.order("booking_date", desc=True).execute()
-            return self._handle_response(response)
+            self.stats_buffer.flush()
+            response = self.client.rpc("rollup_usage_stats", {
+                "p_before": cutoff.isoformat(),
+                "p_archive": archive
+            }).execute()
+            self.cache.invalidate("usage_rollup")
+            return self._handle_single_response(response)
         except Exception as e:
-            st.error(f"Error al obtener reservas en rango: {str(e)}")
-            return []
+            print(f"Error al resumir estadísticas de uso: {str(e)}")
+            return None
+
+    def get_visits_range(self, start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         projection: str = "default") -> List[Dict]:
+        """Obtiene visitas dentro de un rango de fechas."""
+        return list(self.iter_visits_range(start_date, end_date, projection=projection))
+
+    def iter_visits_range(self, start_date: Optional[datetime] = None,
+                          end_date: Optional[datetime] = None,
+                          page_size: Optional[int] = None,
+                          projection: str = "default") -> Iterator[Dict]:
+        """Itera por páginas sobre las visitas de un rango de fechas."""
+        return self._iter_keyset("user_visits", self._projection("user_visits", projection),
+                                 "visit_date", self._date_range_filter("visit_date", start_date, end_date),
+                                 page_size, error_label="visitas en rango")
+
+    def get_bookings_range(self, start_date: Optional[datetime] = None,
+                           end_date: Optional[datetime] = None,
+                           projection: str = "default") -> List[Dict]:
+        """Obtiene reservas en un rango de fechas."""
+        return list(self.iter_bookings_range(start_date, end_date, projection=projection))
+
+    def iter_bookings_range(self, start_date: Optional[datetime] = None,
+                            end_date: Optional[datetime] = None,
+                            page_size: Optional[int] = None,
+                            projection: str = "default") -> Iterator[Dict]:
+        """Itera por páginas sobre las reservas de un rango de fechas."""
+        return self._iter_keyset("bookings", self._projection("bookings", projection),
+                                 "booking_date", self._date_range_filter("booking_date", start_date, end_date),
+                                 page_size, error_label="reservas en rango")
+
+    def iter_export_rows(self, source: str, start_date: Optional[datetime] = None,
+                         end_date: Optional[datetime] = None,
+                         page_size: Optional[int] = None) -> Iterator[Dict]:
+        """
+        Itera sobre las filas completas de ``source`` (``EXPORT_SOURCES``) para exportarlas.
+
+        A diferencia de los iteradores de las vistas, un error a mitad de la
+        lectura se propaga para no generar ficheros truncados.
+
+        En ``usage_stats`` la parte del rango anterior a la marca de agua del
+        rollup sale de ``usage_stats_daily`` (como en ``iter_usage_stats_range``);
+        todas las filas llevan ``event_count`` e ``is_rollup`` para distinguirlas.
+        """
+        if source not in EXPORT_SOURCES:
+            raise ValueError(f"Origen de exportación desconocido: {source}")
+        table, date_field = EXPORT_SOURCES[source]
+        if table == "usage_stats":
+            return self._iter_usage_stats_export(start_date, end_date, page_size)
+        return self._iter_keyset(table, self._projection(table, "export"), date_field,
+                                 self._date_range_filter(date_field, start_date, end_date),
+                                 page_size, raise_errors=True)
+
+    def _iter_usage_stats_export(self, start_date: Optional[datetime],
+                                 end_date: Optional[datetime],
+                                 page_size: Optional[int]) -> Iterator[Dict]:
+        """Eventos y resúmenes diarios de usage_stats con las mismas columnas de recuento"""
+        rows = self.iter_usage_stats_range(start_date, end_date, page_size=page_size,
+                                           projection="export", raise_errors=True)
+        for row in rows:
+            row.setdefault("event_count", 1)
+            row.setdefault("is_rollup", False)
+            yield row
 
     def get_audio_guides_range(self, start_date: Optional[datetime] = None,
-                               end_date: Optional[datetime] = None) -> List[Dict]:
+                               end_date: Optional[datetime] = None,
+                               projection: str = "default") -> List[Dict]:
         """Obtiene audio-guías dentro de un rango de fechas."""
+        select_clause = self._projection("audio_guides", projection)
         try:
-            query = self.client.table("audio_guides").select("*")
+            query = self.client.table("audio_guides").select(select_clause)
             if start_date:
                 query = query.gte("created_at", start_date.isoformat())
             if end_date:
@@ -675,10 +1349,12 @@ class SupabaseDB:
             return []
 
     def get_users_range(self, start_date: Optional[datetime] = None,
-                        end_date: Optional[datetime] = None) -> List[Dict]:
+                        end_date: Optional[datetime] = None,
+                        projection: str = "default") -> List[Dict]:
         """Obtiene usuarios en un rango de fechas."""
+        select_clause = self._projection("users", projection)
         try:
-            query = self.client.table("users").select("*")
+            query = self.client.table("users").select(select_clause)
             if start_date:
                 query = query.gte("created_at", start_date.isoformat())
             if end_date:
@@ -689,20 +1365,203 @@ class SupabaseDB:
             st.error(f"Error al obtener usuarios en rango: {str(e)}")
             return []
 
+    def get_poi_popularity(self) -> Dict[str, Dict]:
+        """
+        Obtiene los contadores de popularidad precalculados por POI, indexados por ID.
+
+        La vista se recorre por páginas (más visitados primero) para no quedarse
+        en el límite de filas de PostgREST cuando hay muchos POIs.
+        """
+        rows = self._iter_keyset("vw_poi_popularity", "*", "visit_count",
+                                 error_label="popularidad de POIs", id_field="poi_id")
+        return {row["poi_id"]: row for row in rows}
+
+    def get_city_popularity(self) -> Dict[str, Dict]:
+        """Obtiene los contadores de popularidad precalculados por ciudad, indexados por ID"""
+        rows = self._iter_keyset("vw_city_popularity", "*", "visit_count",
+                                 lambda query: query.not_.is_("city_id", "null"),
+                                 error_label="popularidad de ciudades", id_field="city_id")
+        return {row["city_id"]: row for row in rows}
+
     def get_top_users(self, limit: int = 10) -> List[Dict]:
-        """Obtiene los usuarios con más puntos."""
-        try:
+        """Obtiene los usuarios con más puntos (cacheado durante ``CACHE_TTLS['leaderboard']``)."""
+        def load():
             response = self.client.table("users").select(
                 "id, name, email, total_points, level, avatar_url"
             ).order("total_points", desc=True).limit(limit).execute()
             return self._handle_response(response)
+
+        try:
+            return self._cached("leaderboard", ("top", limit), load)
         except Exception as e:
             st.error(f"Error al obtener ranking de usuarios: {str(e)}")
             return []
 
+    def get_user_rank(self, user_id: str) -> Optional[Dict[str, int]]:
+        """
+        Obtiene la posición de un usuario en el ranking global.
+
+        La función ``get_user_rank`` de la base de datos cuenta solo los
+        usuarios con más puntos sobre ``idx_users_points`` y devuelve una fila
+        ``{"rank", "total_points", "leader_points"}``; se añade
+        ``total_users`` con un conteo cacheado. Los empates comparten posición.
+        """
+        try:
+            response = self.client.rpc("get_user_rank", {"p_user_id": user_id}).execute()
+            row = self._handle_single_response(response)
+            if not row:
+                return None
+            total_users = self.cache.get_or_load("leaderboard", "count", lambda: self._count("users"))
+        except Exception as e:
+            st.error(f"Error al obtener la posición en el ranking: {str(e)}")
+            return None
+        return {
+            "rank": int(row["rank"]),
+            "total_points": int(row.get("total_points") or 0),
+            "leader_points": int(row.get("leader_points") or 0),
+            "total_users": max(int(total_users), int(row["rank"])),
+        }
+
+    def _count(self, table: str, apply_filters: Optional[Callable] = None) -> int:
+        """Cuenta filas con una petición HEAD ``count=exact``, sin descargar datos"""
+        query = self.client.table(table).select("id", count="exact", head=True)
+        if apply_filters:
+            query = apply_filters(query)
+        return query.execute().count or 0
+
+    def count_cities(self, is_active: Optional[bool] = None) -> int:
+        """Cuenta las ciudades, opcionalmente filtradas por estado"""
+        try:
+            return self._count("cities", (lambda q: q.eq("is_active", is_active)) if is_active is not None else None)
+        except Exception as e:
+            st.error(f"Error al contar ciudades: {str(e)}")
+            return 0
+
+    def count_pois(self, is_active: Optional[bool] = True) -> int:
+        """Cuenta los puntos de interés, opcionalmente filtrados por estado"""
+        try:
+            return self._count("points_of_interest", (lambda q: q.eq("is_active", is_active)) if is_active is not None else None)
+        except Exception as e:
+            st.error(f"Error al contar POIs: {str(e)}")
+            return 0
+
+    def count_audio_guides(self, is_active: Optional[bool] = True) -> int:
+        """Cuenta las audio-guías, opcionalmente filtradas por estado"""
+        try:
+            return self._count("audio_guides", (lambda q: q.eq("is_active", is_active)) if is_active is not None else None)
+        except Exception as e:
+            st.error(f"Error al contar audio-guías: {str(e)}")
+            return 0
+
+    def count_users(self) -> int:
+        """Cuenta los usuarios registrados"""
+        try:
+            return self._count("users")
+        except Exception as e:
+            st.error(f"Error al contar usuarios: {str(e)}")
+            return 0
+
+    def get_home_metrics(self) -> Dict[str, int]:
+        """
+        Obtiene los contadores de la portada (ciudades, POIs, audio-guías y usuarios).
+
+        Los cuatro conteos se lanzan en paralelo y el resultado se cachea con un
+        TTL corto compartido por todas las sesiones. Si algún conteo falla no
+        se cachea nada y se devuelve un diccionario vacío.
+        """
+        def load():
+            return fan_out(self, {
+                "cities": lambda: self._count("cities"),
+                "pois": lambda: self._count("points_of_interest", lambda q: q.eq("is_active", True)),
+                "audio_guides": lambda: self._count("audio_guides", lambda q: q.eq("is_active", True)),
+                "users": lambda: self._count("users"),
+            })
+
+        try:
+            return dict(self.cache.get_or_load("metrics", "home", load))
+        except Exception as e:
+            st.error(f"Error al obtener las métricas de la portada: {str(e)}")
+            return {}
+
     def refresh_caches(self):
         """Limpia caches internas después de cambios relevantes."""
         self.get_cached_countries.cache_clear()
+        self.cache.invalidate(*CATALOG_CACHE_NAMESPACES)
+        # Trae ya los cambios propios para que el usuario los vea sin esperar al sondeo
+        try:
+            self.catalog.sync()
+        except Exception as e:
+            print(f"Error al sincronizar el catálogo: {str(e)}")
+
+    def _on_catalog_change(self, changes: Optional[List[Dict]]):
+        """
+        Aplica un grupo de notificaciones de ``notify_catalog_change()``.
+
+        Borra las entradas de la caché que dependen del catálogo y parchea la
+        réplica: los borrados se quitan directamente y, si hay altas o cambios,
+        se traen todos con una única sincronización incremental. ``None`` (tras
+        conectar) fuerza una recarga completa.
+        """
+        self.get_cached_countries.cache_clear()
+        self.cache.invalidate(*CATALOG_CACHE_NAMESPACES)
+        if not self.catalog.full_loads:
+            return
+        if changes is None:
+            self.catalog.reload()
+            return
+        needs_sync = False
+        for change in changes:
+            if change.get("table") not in CATALOG_TABLES:
+                continue
+            if change.get("op") == "DELETE":
+                self.catalog.discard(change["table"], change.get("id"))
+            else:
+                needs_sync = True
+        if needs_sync:
+            self.catalog.sync()
+
+    def _on_change_feed_status(self, connected: bool):
+        """Con la escucha activa el sondeo del catálogo solo hace de respaldo"""
+        self.catalog.poll_interval = (
+            config.CATALOG_POLL_INTERVAL_WITH_FEED if connected else config.CATALOG_POLL_INTERVAL
+        )
+
+    def get_change_feed_stats(self) -> Dict[str, Any]:
+        """Devuelve las métricas de la escucha de cambios (vacío si está desactivada)."""
+        return self.change_feed.stats() if self.change_feed else {}
+
+    def get_catalog_stats(self) -> Dict[str, Any]:
+        """Devuelve las métricas de la réplica del catálogo."""
+        return self.catalog.stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Devuelve las métricas de la caché de lecturas."""
+        return self.cache.stats()
+
+    def get_query_telemetry(self) -> List[Dict[str, Any]]:
+        """Devuelve las métricas de latencia por método, de mayor a menor tiempo total."""
+        return self.telemetry.snapshot()
+
+    def get_latency_histogram(self, method: Optional[str] = None) -> Dict[str, int]:
+        """Devuelve el histograma de latencias recientes de un método (o de todos)."""
+        return self.telemetry.histogram(method)
+
+    def get_slow_queries(self) -> List[Dict[str, Any]]:
+        """Devuelve el registro de consultas lentas."""
+        return self.telemetry.slow_queries()
+
+    def reset_query_telemetry(self):
+        """Reinicia las métricas de telemetría."""
+        self.telemetry.reset()
+
+
+# Métodos que no consultan Supabase y no se instrumentan
+TELEMETRY_EXCLUDED = (
+    "client", "get_pool_stats", "get_catalog_stats", "get_change_feed_stats",
+    "refresh_caches", "get_cache_stats", "log_usage_stat", "get_usage_stats_buffer_stats",
+    "get_query_telemetry", "get_latency_histogram", "get_slow_queries", "reset_query_telemetry",
+)
+instrument_class(SupabaseDB, get_telemetry(), exclude=TELEMETRY_EXCLUDED)
 
 # Instancia global de la base de datos
 @st.cache_resource
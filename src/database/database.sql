@@ -5,6 +5,7 @@
 -- Paso 1: Habilitar extensiones necesarias
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "postgis"; -- Para funciones geoespaciales avanzadas (opcional)
+CREATE EXTENSION IF NOT EXISTS "unaccent"; -- Búsqueda de texto sin distinguir acentos
 
 -- ============================================
 -- TABLA: users (Usuarios)
@@ -29,6 +30,9 @@ CREATE TABLE users (
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_users_subscription ON users(subscription_tier);
 CREATE INDEX IF NOT EXISTS idx_users_role ON users(role);
+-- Ranking (get_top_users, get_user_rank) y paginación keyset (iter_all_users)
+CREATE INDEX idx_users_points ON users(total_points DESC);
+CREATE INDEX idx_users_created_id ON users(created_at DESC NULLS LAST, id DESC);
 ALTER TABLE users
     ADD COLUMN IF NOT EXISTS role VARCHAR(50) DEFAULT 'user';
 UPDATE users
@@ -61,6 +65,10 @@ CREATE TABLE cities (
 CREATE INDEX idx_cities_name ON cities(name);
 CREATE INDEX idx_cities_country ON cities(country);
 CREATE INDEX idx_cities_active ON cities(is_active);
+-- Clave natural para la importación masiva (upsert por nombre y país)
+CREATE UNIQUE INDEX uq_cities_name_country ON cities(name, country);
+-- Sincronización incremental de la réplica del catálogo (updated_at, id)
+CREATE INDEX idx_cities_updated ON cities(updated_at NULLS FIRST, id);
 
 -- ============================================
 -- TABLA: points_of_interest (Puntos de Interés)
@@ -97,16 +105,24 @@ CREATE INDEX idx_poi_city ON points_of_interest(city_id);
 CREATE INDEX idx_poi_category ON points_of_interest(category);
 CREATE INDEX idx_poi_active ON points_of_interest(is_active);
 CREATE INDEX idx_poi_rating ON points_of_interest(rating DESC);
-CREATE INDEX idx_poi_location ON points_of_interest(latitude, longitude);
+-- Clave natural para la importación masiva (upsert por ciudad y nombre)
+CREATE UNIQUE INDEX uq_poi_city_name ON points_of_interest(city_id, name);
+-- Sincronización incremental de la réplica del catálogo (updated_at, id)
+CREATE INDEX idx_poi_updated ON points_of_interest(updated_at NULLS FIRST, id);
+-- Listados de POIs activos ordenados por nombre
+CREATE INDEX idx_poi_active_name ON points_of_interest(name) WHERE is_active;
+CREATE INDEX idx_poi_active_city_category ON points_of_interest(city_id, category, name) WHERE is_active;
 
 -- ============================================
 -- TABLA: user_visits (Visitas de Usuarios)
 -- ============================================
+-- Particionada por mes sobre visit_date (ver ensure_monthly_partitions);
+-- la clave primaria debe incluir la columna de partición
 CREATE TABLE user_visits (
-    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    id UUID DEFAULT gen_random_uuid(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     poi_id UUID REFERENCES points_of_interest(id) ON DELETE CASCADE,
-    visit_date TIMESTAMP DEFAULT NOW(),
+    visit_date TIMESTAMP NOT NULL DEFAULT NOW(),
     duration_minutes INTEGER,
     rating INTEGER CHECK (rating >= 1 AND rating <= 5),
     review TEXT,
@@ -116,13 +132,17 @@ CREATE TABLE user_visits (
     weather_conditions VARCHAR(100),
     is_completed BOOLEAN DEFAULT false,
     metadata JSONB DEFAULT '{}',
-    created_at TIMESTAMP DEFAULT NOW()
-);
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (id, visit_date)
+) PARTITION BY RANGE (visit_date);
 
--- Índices para visitas
-CREATE INDEX idx_visits_user ON user_visits(user_id);
+-- Partición para fechas sin partición mensual
+CREATE TABLE user_visits_default PARTITION OF user_visits DEFAULT;
+
+-- Índices para visitas (se crean en cada partición)
+CREATE INDEX idx_visits_user_date ON user_visits(user_id, visit_date DESC);
 CREATE INDEX idx_visits_poi ON user_visits(poi_id);
-CREATE INDEX idx_visits_date ON user_visits(visit_date DESC);
+CREATE INDEX idx_visits_date_id ON user_visits(visit_date DESC NULLS LAST, id DESC);
 CREATE INDEX idx_visits_rating ON user_visits(rating);
 
 -- ============================================
@@ -143,7 +163,7 @@ CREATE TABLE user_achievements (
 );
 
 -- Índices para logros
-CREATE INDEX idx_achievements_user ON user_achievements(user_id);
+CREATE INDEX idx_achievements_user_date ON user_achievements(user_id, earned_at DESC);
 CREATE INDEX idx_achievements_type ON user_achievements(achievement_type);
 CREATE INDEX idx_achievements_date ON user_achievements(earned_at DESC);
 
@@ -172,36 +192,76 @@ CREATE TABLE bookings (
 );
 
 -- Índices para reservas
-CREATE INDEX idx_bookings_user ON bookings(user_id);
+CREATE INDEX idx_bookings_user_date ON bookings(user_id, booking_date DESC);
 CREATE INDEX idx_bookings_poi ON bookings(poi_id);
-CREATE INDEX idx_bookings_date ON bookings(booking_date);
+CREATE INDEX idx_bookings_date_id ON bookings(booking_date DESC NULLS LAST, id DESC);
 CREATE INDEX idx_bookings_status ON bookings(status);
 CREATE INDEX idx_bookings_confirmation ON bookings(confirmation_code);
 
 -- ============================================
 -- TABLA: usage_stats (Estadísticas de Uso)
 -- ============================================
+-- Particionada por mes sobre timestamp (ver ensure_monthly_partitions)
 CREATE TABLE usage_stats (
-    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    id UUID DEFAULT gen_random_uuid(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     action_type VARCHAR(100) NOT NULL CHECK (action_type IN ('audio_guide', 'poi_view', 'search', 'booking', 'review', 'share', 'favorite', 'navigation')),
     poi_id UUID REFERENCES points_of_interest(id) ON DELETE SET NULL,
     city_id UUID REFERENCES cities(id) ON DELETE SET NULL,
-    timestamp TIMESTAMP DEFAULT NOW(),
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
     duration_seconds INTEGER,
     device_type VARCHAR(50),
     platform VARCHAR(50),
     ip_address INET,
     user_agent TEXT,
-    metadata JSONB DEFAULT '{}'
-);
+    metadata JSONB DEFAULT '{}',
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
 
--- Índices para estadísticas
-CREATE INDEX idx_stats_user ON usage_stats(user_id);
-CREATE INDEX idx_stats_action ON usage_stats(action_type);
-CREATE INDEX idx_stats_timestamp ON usage_stats(timestamp DESC);
+-- Partición para fechas sin partición mensual
+CREATE TABLE usage_stats_default PARTITION OF usage_stats DEFAULT;
+
+-- Índices para estadísticas (se crean en cada partición)
+CREATE INDEX idx_stats_user_timestamp ON usage_stats(user_id, "timestamp" DESC);
+CREATE INDEX idx_stats_action_timestamp ON usage_stats(action_type, "timestamp" DESC);
+CREATE INDEX idx_stats_user_action_timestamp ON usage_stats(user_id, action_type, "timestamp" DESC);
+CREATE INDEX idx_stats_timestamp_id ON usage_stats("timestamp" DESC NULLS LAST, id DESC);
 CREATE INDEX idx_stats_poi ON usage_stats(poi_id);
 
+-- ============================================
+-- TABLA: usage_stats_daily (Resumen diario de estadísticas de uso)
+-- ============================================
+-- rollup_usage_stats() agrega aquí los eventos de usage_stats anteriores a
+-- la retención. poi_id y city_id no llevan FK: al borrar un POI un SET NULL
+-- podría chocar con la clave única de otra fila del mismo día
+CREATE TABLE usage_stats_daily (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    day DATE NOT NULL,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    poi_id UUID,
+    city_id UUID,
+    action_type VARCHAR(100) NOT NULL,
+    event_count INTEGER NOT NULL DEFAULT 0,
+    total_duration_seconds BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX uq_stats_daily_key ON usage_stats_daily(day, user_id, poi_id, city_id, action_type) NULLS NOT DISTINCT;
+CREATE INDEX idx_stats_daily_day_id ON usage_stats_daily(day DESC NULLS LAST, id DESC);
+CREATE INDEX idx_stats_daily_user ON usage_stats_daily(user_id);
+
+-- Eventos originales ya resumidos (solo si el rollup se ejecuta con archivo)
+CREATE TABLE usage_stats_archive (LIKE usage_stats INCLUDING DEFAULTS);
+
+CREATE INDEX idx_stats_archive_timestamp ON usage_stats_archive(timestamp DESC);
+
+-- Marca de agua: los eventos anteriores a rolled_up_before están en usage_stats_daily
+CREATE TABLE usage_stats_rollup_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    rolled_up_before TIMESTAMP,
+    last_run_at TIMESTAMP,
+    rows_rolled_up BIGINT NOT NULL DEFAULT 0
+);
+
 -- ============================================
 -- TABLA: audio_guides (Audio-Guías Generadas)
 -- ============================================
@@ -226,7 +286,7 @@ CREATE TABLE audio_guides (
 -- Índices para audio-guías
 CREATE INDEX idx_audio_poi ON audio_guides(poi_id);
 CREATE INDEX idx_audio_language ON audio_guides(language);
-CREATE INDEX idx_audio_active ON audio_guides(is_active);
+CREATE INDEX idx_audio_active_poi ON audio_guides(poi_id, language, created_at DESC) WHERE is_active;
 
 -- ============================================
 -- TABLA: favorites (Favoritos de Usuarios)
@@ -241,9 +301,23 @@ CREATE TABLE favorites (
 );
 
 -- Índices para favoritos
-CREATE INDEX idx_favorites_user ON favorites(user_id);
+-- UNIQUE(user_id, poi_id) ya cubre is_favorite y remove_favorite
+CREATE INDEX idx_favorites_user_date ON favorites(user_id, created_at DESC);
 CREATE INDEX idx_favorites_poi ON favorites(poi_id);
 
+-- ============================================
+-- TABLA: poi_popularity (Contadores de popularidad por POI)
+-- ============================================
+-- Mantenida por triggers sobre user_visits y bookings
+CREATE TABLE poi_popularity (
+    poi_id UUID PRIMARY KEY REFERENCES points_of_interest(id) ON DELETE CASCADE,
+    visit_count INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    booking_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
 -- ============================================
 -- FUNCIONES Y TRIGGERS
 -- ============================================
@@ -267,6 +341,26 @@ CREATE TRIGGER update_cities_updated_at BEFORE UPDATE ON cities
 CREATE TRIGGER update_poi_updated_at BEFORE UPDATE ON points_of_interest
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+-- Publicar los cambios del catálogo para invalidar cachés en todas las instancias
+-- (canal fijo catalog_changes, el que escucha change_feed.CATALOG_CHANNEL)
+CREATE OR REPLACE FUNCTION notify_catalog_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', COALESCE(NEW.id, OLD.id)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER notify_cities_change AFTER INSERT OR UPDATE OR DELETE ON cities
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+CREATE TRIGGER notify_poi_change AFTER INSERT OR UPDATE OR DELETE ON points_of_interest
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
 CREATE TRIGGER update_bookings_updated_at BEFORE UPDATE ON bookings
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
@@ -296,6 +390,236 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER add_points_on_achievement AFTER INSERT ON user_achievements
     FOR EACH ROW EXECUTE FUNCTION update_user_points_on_achievement();
 
+-- Contadores atómicos invocados vía RPC (una sola sentencia por actualización)
+CREATE OR REPLACE FUNCTION increment_audio_play_count(p_audio_id UUID)
+RETURNS INTEGER AS $$
+    UPDATE audio_guides
+    SET play_count = COALESCE(play_count, 0) + 1,
+        last_played_at = NOW()
+    WHERE id = p_audio_id
+    RETURNING play_count;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION add_poi_rating(p_poi_id UUID, p_rating NUMERIC)
+RETURNS TABLE (new_rating DECIMAL, new_total_reviews INTEGER) AS $$
+    UPDATE points_of_interest
+    SET rating = ROUND(
+            (COALESCE(rating, 0) * COALESCE(total_reviews, 0) + p_rating)
+            / (COALESCE(total_reviews, 0) + 1), 2),
+        total_reviews = COALESCE(total_reviews, 0) + 1
+    WHERE id = p_poi_id
+    RETURNING rating, total_reviews;
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION add_user_points(p_user_id UUID, p_points INTEGER)
+RETURNS INTEGER AS $$
+    UPDATE users
+    SET total_points = COALESCE(total_points, 0) + p_points
+    WHERE id = p_user_id
+    RETURNING total_points;
+$$ LANGUAGE sql;
+
+-- Posición de un usuario en el ranking global (invocada vía RPC desde
+-- SupabaseDB.get_user_rank). Cuenta solo los usuarios con más puntos sobre
+-- idx_users_points y toma el máximo del mismo índice: devuelve una fila sin
+-- recorrer la tabla. Los empates comparten posición, como RANK()
+CREATE OR REPLACE FUNCTION get_user_rank(p_user_id UUID)
+RETURNS TABLE (rank BIGINT, total_points INTEGER, leader_points INTEGER) AS $$
+    SELECT 1 + (SELECT COUNT(*) FROM users o WHERE o.total_points > COALESCE(u.total_points, 0)),
+           COALESCE(u.total_points, 0),
+           COALESCE((SELECT MAX(o.total_points) FROM users o), 0)
+    FROM users u
+    WHERE u.id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+-- Contadores de actividad y logros obtenidos de un usuario (invocada vía RPC
+-- desde SupabaseDB.get_achievement_progress). El motor de logros la lee una
+-- vez por sesión y después cuenta los eventos en memoria; cada subconsulta usa
+-- el índice por usuario de su tabla
+CREATE OR REPLACE FUNCTION get_achievement_progress(p_user_id UUID)
+RETURNS TABLE (
+    audio_guides BIGINT,
+    bookings BIGINT,
+    visits BIGINT,
+    reviews BIGINT,
+    city_ids UUID[],
+    earned TEXT[]
+) AS $$
+    SELECT
+        (SELECT COUNT(*) FROM usage_stats s
+         WHERE s.user_id = p_user_id AND s.action_type = 'audio_guide')
+        + (SELECT COALESCE(SUM(d.event_count), 0) FROM usage_stats_daily d
+           WHERE d.user_id = p_user_id AND d.action_type = 'audio_guide'),
+        (SELECT COUNT(*) FROM bookings b WHERE b.user_id = p_user_id),
+        (SELECT COUNT(*) FROM user_visits v WHERE v.user_id = p_user_id),
+        (SELECT COUNT(*) FROM user_visits v WHERE v.user_id = p_user_id AND v.rating IS NOT NULL),
+        ARRAY(SELECT DISTINCT p.city_id
+              FROM user_visits v
+              JOIN points_of_interest p ON p.id = v.poi_id
+              WHERE v.user_id = p_user_id AND p.city_id IS NOT NULL),
+        ARRAY(SELECT a.achievement_name::TEXT FROM user_achievements a WHERE a.user_id = p_user_id);
+$$ LANGUAGE sql STABLE;
+
+-- Mantenimiento incremental de poi_popularity
+CREATE OR REPLACE FUNCTION bump_poi_popularity(
+    p_poi_id UUID, p_visits INTEGER, p_ratings INTEGER, p_rating_sum INTEGER, p_bookings INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_poi_id IS NULL THEN
+        RETURN;
+    END IF;
+    -- El EXISTS evita recrear la fila cuando el POI se está borrando en cascada
+    INSERT INTO poi_popularity (poi_id, visit_count, rating_count, rating_sum, booking_count)
+    SELECT p_poi_id, p_visits, p_ratings, p_rating_sum, p_bookings
+    WHERE EXISTS (SELECT 1 FROM points_of_interest WHERE id = p_poi_id)
+    ON CONFLICT (poi_id) DO UPDATE
+    SET visit_count = poi_popularity.visit_count + EXCLUDED.visit_count,
+        rating_count = poi_popularity.rating_count + EXCLUDED.rating_count,
+        rating_sum = poi_popularity.rating_sum + EXCLUDED.rating_sum,
+        booking_count = poi_popularity.booking_count + EXCLUDED.booking_count,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_visit_popularity()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_poi_popularity(OLD.poi_id, -1, -(OLD.rating IS NOT NULL)::INTEGER, -COALESCE(OLD.rating, 0), 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_poi_popularity(NEW.poi_id, 1, (NEW.rating IS NOT NULL)::INTEGER, COALESCE(NEW.rating, 0), 0);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_booking_popularity()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_poi_popularity(OLD.poi_id, 0, 0, 0, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_poi_popularity(NEW.poi_id, 0, 0, 0, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER track_visit_popularity AFTER INSERT OR DELETE OR UPDATE OF poi_id, rating ON user_visits
+    FOR EACH ROW EXECUTE FUNCTION track_visit_popularity();
+
+CREATE TRIGGER track_booking_popularity AFTER INSERT OR DELETE OR UPDATE OF poi_id ON bookings
+    FOR EACH ROW EXECUTE FUNCTION track_booking_popularity();
+
+-- Particiones mensuales de usage_stats y user_visits (invocada vía RPC, cron o el job de rollup).
+-- Crea las particiones desde el mes de p_from hasta p_months_ahead meses después del actual
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(p_from DATE DEFAULT NULL, p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    v_target RECORD;
+    v_month DATE;
+    v_next DATE;
+    v_last DATE := (date_trunc('month', NOW()) + make_interval(months => p_months_ahead))::DATE;
+    v_name TEXT;
+    v_blocked BOOLEAN;
+    v_created INTEGER := 0;
+BEGIN
+    -- Límites para que una llamada no cree cientos de particiones
+    IF p_months_ahead IS NULL OR p_months_ahead NOT BETWEEN 0 AND 24 THEN
+        RAISE EXCEPTION 'p_months_ahead debe estar entre 0 y 24: %', p_months_ahead;
+    END IF;
+    IF p_from IS NOT NULL AND (p_from < (NOW() - INTERVAL '10 years')::DATE OR p_from > v_last) THEN
+        RAISE EXCEPTION 'p_from fuera de rango (últimos 10 años hasta %): %', v_last, p_from;
+    END IF;
+
+    FOR v_target IN
+        SELECT * FROM (VALUES ('usage_stats', 'timestamp'), ('user_visits', 'visit_date')) AS t(tbl, col)
+    LOOP
+        v_month := date_trunc('month', COALESCE(p_from, NOW()::DATE))::DATE;
+        WHILE v_month <= v_last LOOP
+            v_next := (v_month + INTERVAL '1 month')::DATE;
+            v_name := format('%s_%s', v_target.tbl, to_char(v_month, 'YYYY_MM'));
+            IF to_regclass(v_name) IS NULL THEN
+                -- Una partición nueva no puede solaparse con filas que ya estén en la DEFAULT
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)',
+                               v_target.tbl || '_default', v_target.col, v_month, v_target.col, v_next)
+                INTO v_blocked;
+                IF v_blocked THEN
+                    RAISE NOTICE 'La partición % no se crea: hay filas de ese mes en %_default', v_name, v_target.tbl;
+                ELSE
+                    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                                   v_name, v_target.tbl, v_month, v_next);
+                    v_created := v_created + 1;
+                END IF;
+            END IF;
+            v_month := v_next;
+        END LOOP;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Solo el job de mantenimiento (clave service_role) puede crear particiones
+REVOKE EXECUTE ON FUNCTION ensure_monthly_partitions(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ensure_monthly_partitions(DATE, INTEGER) TO service_role;
+
+-- Particiones iniciales: mes actual y los tres siguientes
+SELECT ensure_monthly_partitions();
+
+-- Resumen diario y retención de usage_stats (invocada vía RPC o desde el job de rollup)
+CREATE OR REPLACE FUNCTION rollup_usage_stats(p_before TIMESTAMP, p_archive BOOLEAN DEFAULT false)
+RETURNS TABLE (moved_rows BIGINT, summary_rows BIGINT, watermark TIMESTAMP) AS $$
+DECLARE
+    -- Se corta a día completo para no repartir un mismo día entre resumen y eventos;
+    -- nunca se resume el último día (los timestamps se guardan en UTC)
+    v_cutoff TIMESTAMP := date_trunc('day', LEAST(p_before, (NOW() AT TIME ZONE 'UTC') - INTERVAL '1 day'));
+    v_moved BIGINT;
+    v_summaries BIGINT;
+BEGIN
+    IF p_before IS NULL THEN
+        RAISE EXCEPTION 'p_before es obligatorio';
+    END IF;
+
+    WITH moved AS (
+        DELETE FROM usage_stats WHERE "timestamp" < v_cutoff RETURNING *
+    ), archived AS (
+        INSERT INTO usage_stats_archive SELECT * FROM moved WHERE p_archive
+    ), summarized AS (
+        INSERT INTO usage_stats_daily AS d
+            (day, user_id, poi_id, city_id, action_type, event_count, total_duration_seconds)
+        SELECT moved."timestamp"::date, user_id, poi_id, city_id, action_type,
+               COUNT(*), COALESCE(SUM(duration_seconds), 0)
+        FROM moved
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (day, user_id, poi_id, city_id, action_type) DO UPDATE
+        SET event_count = d.event_count + EXCLUDED.event_count,
+            total_duration_seconds = d.total_duration_seconds + EXCLUDED.total_duration_seconds
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM moved), (SELECT COUNT(*) FROM summarized)
+    INTO v_moved, v_summaries;
+
+    INSERT INTO usage_stats_rollup_state AS s (id, rolled_up_before, last_run_at, rows_rolled_up)
+    VALUES (true, v_cutoff, NOW(), v_moved)
+    ON CONFLICT (id) DO UPDATE
+    SET rolled_up_before = GREATEST(s.rolled_up_before, EXCLUDED.rolled_up_before),
+        last_run_at = NOW(),
+        rows_rolled_up = s.rows_rolled_up + EXCLUDED.rows_rolled_up;
+
+    RETURN QUERY
+    SELECT v_moved, v_summaries, s.rolled_up_before
+    FROM usage_stats_rollup_state s
+    WHERE s.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Solo el job de mantenimiento (clave service_role) puede resumir y borrar eventos
+REVOKE EXECUTE ON FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) TO service_role;
+
 -- ============================================
 -- DATOS DE EJEMPLO (OPCIONAL)
 -- ============================================
@@ -347,18 +671,147 @@ LEFT JOIN bookings b ON u.id = b.user_id
 LEFT JOIN user_achievements a ON u.id = a.user_id
 GROUP BY u.id, u.name, u.email, u.total_points, u.level;
 
+-- Vista de popularidad por POI (lectura O(#POIs))
+CREATE OR REPLACE VIEW vw_poi_popularity AS
+SELECT
+    p.id AS poi_id,
+    p.city_id,
+    COALESCE(pp.visit_count, 0) AS visit_count,
+    COALESCE(pp.booking_count, 0) AS booking_count,
+    COALESCE(pp.rating_count, 0) AS rating_count,
+    CASE WHEN COALESCE(pp.rating_count, 0) > 0
+         THEN ROUND(pp.rating_sum::NUMERIC / pp.rating_count, 2)
+         ELSE 0 END AS avg_rating
+FROM points_of_interest p
+LEFT JOIN poi_popularity pp ON pp.poi_id = p.id;
+
+-- Vista de popularidad por ciudad, agregada a partir de la de POIs
+CREATE OR REPLACE VIEW vw_city_popularity AS
+SELECT
+    p.city_id,
+    COUNT(p.id) AS poi_count,
+    COALESCE(SUM(pp.visit_count), 0) AS visit_count,
+    COALESCE(SUM(pp.booking_count), 0) AS booking_count,
+    COALESCE(SUM(pp.rating_count), 0) AS rating_count,
+    CASE WHEN COALESCE(SUM(pp.rating_count), 0) > 0
+         THEN ROUND(SUM(pp.rating_sum)::NUMERIC / SUM(pp.rating_count), 2)
+         ELSE 0 END AS avg_rating
+FROM points_of_interest p
+LEFT JOIN poi_popularity pp ON pp.poi_id = p.id
+GROUP BY p.city_id;
+
 -- ============================================
 -- ÍNDICES DE TEXTO COMPLETO (Full-Text Search)
 -- ============================================
 
--- Crear índice de búsqueda para POIs
-CREATE INDEX idx_poi_search ON points_of_interest 
-USING gin(to_tsvector('spanish', name || ' ' || COALESCE(description, '')));
+-- Configuración en español que ignora acentos ("Museo" encuentra "muséo" y viceversa)
+CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish);
+ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+
+-- Documento de búsqueda de un POI: el nombre pesa más que las descripciones
+CREATE OR REPLACE FUNCTION poi_search_document(p_name TEXT, p_short_description TEXT, p_description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('public.spanish_unaccent', COALESCE(p_name, '')), 'A')
+        || setweight(to_tsvector('public.spanish_unaccent', COALESCE(p_short_description, '')), 'B')
+        || setweight(to_tsvector('public.spanish_unaccent', COALESCE(p_description, '')), 'C');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Crear índice de búsqueda para POIs (solo los activos, que son los que se buscan)
+CREATE INDEX idx_poi_search ON points_of_interest
+USING gin(poi_search_document(name, short_description, description)) WHERE is_active;
+
+-- Consulta de búsqueda: la última palabra cuenta también como prefijo
+-- ("catedr" encuentra "Catedral") mientras se escribe. Si la consulta acaba en
+-- espacio, comillas o signos no se añade prefijo; la palabra no lleva espacios
+-- ni signos y pasa por websearch_to_tsquery, así que la entrada nunca llega a la sintaxis de tsquery
+CREATE OR REPLACE FUNCTION poi_search_query(p_query TEXT)
+RETURNS tsquery AS $$
+    SELECT CASE
+        WHEN last_term IS NULL OR numnode(last_query) = 0 THEN full_query
+        ELSE full_query
+            || (websearch_to_tsquery('public.spanish_unaccent', left(p_query, -length(last_term)))
+                && (last_query::text || ':*')::tsquery)
+    END
+    FROM (
+        SELECT websearch_to_tsquery('public.spanish_unaccent', p_query) AS full_query,
+               m[1] AS last_term,
+               websearch_to_tsquery('public.spanish_unaccent', m[1]) AS last_query
+        FROM regexp_match(p_query, '(?:^|\s)([^[:space:][:punct:]]+)$') AS m
+    ) t;
+$$ LANGUAGE sql STABLE;
+
+-- Búsqueda de POIs con ranking (invocada vía RPC desde SupabaseDB.search_pois).
+-- Devuelve solo IDs y relevancia: la aplicación completa los datos con su
+-- réplica del catálogo, así que nunca viaja el catálogo entero
+CREATE OR REPLACE FUNCTION search_pois(
+    p_query TEXT,
+    p_city_id UUID DEFAULT NULL,
+    p_categories TEXT[] DEFAULT NULL,
+    p_difficulties TEXT[] DEFAULT NULL,
+    p_min_price NUMERIC DEFAULT NULL,
+    p_max_price NUMERIC DEFAULT NULL,
+    p_min_rating NUMERIC DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (id UUID, rank REAL) AS $$
+    WITH q AS (
+        SELECT poi_search_query(p_query) AS query
+    )
+    SELECT p.id, ts_rank_cd(poi_search_document(p.name, p.short_description, p.description), q.query) AS rank
+    FROM points_of_interest p, q
+    WHERE p.is_active
+      AND poi_search_document(p.name, p.short_description, p.description) @@ q.query
+      AND (p_city_id IS NULL OR p.city_id = p_city_id)
+      AND (p_categories IS NULL OR p.category = ANY(p_categories))
+      AND (p_difficulties IS NULL OR p.difficulty_level = ANY(p_difficulties))
+      AND (p_min_price IS NULL OR p.entry_price >= p_min_price)
+      AND (p_max_price IS NULL OR p.entry_price <= p_max_price)
+      AND (p_min_rating IS NULL OR p.rating >= p_min_rating)
+    ORDER BY rank DESC, p.name
+    LIMIT LEAST(GREATEST(p_limit, 1), 500);
+$$ LANGUAGE sql STABLE;
 
 -- Crear índice de búsqueda para ciudades
 CREATE INDEX idx_city_search ON cities 
 USING gin(to_tsvector('spanish', name || ' ' || COALESCE(description, '')));
 
+-- ============================================
+-- BÚSQUEDA ESPACIAL (PostGIS)
+-- ============================================
+
+-- Punto geográfico (WGS84) de unas coordenadas; se usa igual en el índice y en las consultas
+CREATE OR REPLACE FUNCTION poi_geography(p_lat DOUBLE PRECISION, p_lng DOUBLE PRECISION)
+RETURNS geography AS $$
+    SELECT ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326)::geography;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Índice GiST de la ubicación de los POIs activos
+CREATE INDEX idx_poi_geography ON points_of_interest
+USING gist(poi_geography(latitude, longitude)) WHERE is_active;
+
+-- POIs activos a menos de p_radius_km de un punto, del más cercano al más lejano
+-- (invocada vía RPC desde SupabaseDB.nearby_pois). Devuelve solo IDs y distancia
+CREATE OR REPLACE FUNCTION nearby_pois(
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_radius_km DOUBLE PRECISION,
+    p_limit INTEGER DEFAULT NULL,
+    p_city_id UUID DEFAULT NULL
+)
+RETURNS TABLE (id UUID, distance_km DOUBLE PRECISION) AS $$
+    WITH origin AS (
+        SELECT poi_geography(p_lat, p_lng) AS point
+    )
+    SELECT p.id, ST_Distance(poi_geography(p.latitude, p.longitude), o.point) / 1000.0 AS distance_km
+    FROM points_of_interest p, origin o
+    WHERE p.is_active
+      AND ST_DWithin(poi_geography(p.latitude, p.longitude), o.point, p_radius_km * 1000.0)
+      AND (p_city_id IS NULL OR p.city_id = p_city_id)
+    ORDER BY poi_geography(p.latitude, p.longitude) <-> o.point
+    LIMIT LEAST(COALESCE(p_limit, 1000), 1000);
+$$ LANGUAGE sql STABLE;
+
 -- ============================================
 -- COMENTARIOS EN TABLAS
 -- ============================================
@@ -372,6 +825,8 @@ COMMENT ON TABLE bookings IS 'Reservas realizadas por usuarios';
 COMMENT ON TABLE usage_stats IS 'Estadísticas de uso del sistema';
 COMMENT ON TABLE audio_guides IS 'Audio-guías generadas por IA';
 COMMENT ON TABLE favorites IS 'POIs marcados como favoritos';
+COMMENT ON TABLE poi_popularity IS 'Contadores de visitas, valoraciones y reservas por POI';
+COMMENT ON TABLE usage_stats_daily IS 'Resumen diario de estadísticas de uso anteriores a la retención';
 
 -- ============================================
 -- FINALIZACIÓN
@@ -0,0 +1,154 @@
+"""
+Buffer en segundo plano para las escrituras de estadísticas de uso
+"""
+import atexit
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional
+
+
+class UsageStatsBuffer:
+    """
+    Acumula filas de ``usage_stats`` en memoria y las inserta por lotes.
+
+    Un hilo en segundo plano vacía la cola cuando se alcanza ``batch_size`` o
+    cuando pasan ``flush_interval`` segundos desde el último vaciado. Si la
+    inserción de un lote falla se reintenta fila a fila, de modo que una fila
+    inválida no arrastra al resto. Con la cola llena los eventos nuevos se
+    descartan y se contabilizan en ``dropped``.
+    """
+
+    def __init__(self, writer: Callable[[List[Dict]], None], batch_size: int = 50,
+                 flush_interval: float = 2.0, max_queue: int = 10000):
+        """Inicializa el buffer con la función que inserta un lote de filas"""
+        self.writer = writer
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self._queue: Deque[Dict] = deque()
+        self._inflight: List[Dict] = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self.enqueued = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        atexit.register(self.close)
+
+    def enqueue(self, row: Dict) -> bool:
+        """Encola una fila; devuelve False si se descartó por cola llena o buffer cerrado"""
+        row = dict(row)
+        # La hora del evento es la de la acción, no la del vaciado. Se guarda en
+        # UTC sin zona, como el NOW() de la base de datos en la columna TIMESTAMP
+        row.setdefault("timestamp", datetime.now(timezone.utc).replace(tzinfo=None).isoformat())
+        with self._cond:
+            if self._closed or len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return False
+            self._queue.append(row)
+            self.enqueued += 1
+            self._ensure_worker()
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def pending(self, user_id: Optional[str] = None,
+                action_type: Optional[str] = None) -> List[Dict]:
+        """Devuelve las filas aún no persistidas (más recientes primero) que cumplen los filtros"""
+        with self._cond:
+            rows = list(self._inflight) + list(self._queue)
+        return [
+            dict(row) for row in reversed(rows)
+            if (not user_id or row.get("user_id") == user_id)
+            and (not action_type or row.get("action_type") == action_type)
+        ]
+
+    def flush(self):
+        """Vacía la cola completa de forma síncrona desde el hilo que llama"""
+        while True:
+            with self._cond:
+                batch = self._take_batch()
+            if not batch:
+                return
+            self._write(batch)
+
+    def close(self):
+        """Detiene el hilo en segundo plano y persiste lo que quede en la cola"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(timeout=max(self.flush_interval * 2, 5.0))
+        self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve métricas del buffer"""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "inflight": len(self._inflight),
+                "enqueued": self.enqueued,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "failed": self.failed,
+                "batches": self.batches,
+            }
+
+    def _ensure_worker(self):
+        """Arranca el hilo de vaciado la primera vez que se encola algo"""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="usage-stats-buffer", daemon=True)
+            self._thread.start()
+
+    def _take_batch(self) -> List[Dict]:
+        """Saca hasta ``batch_size`` filas de la cola (requiere tener el lock)"""
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        self._inflight.extend(batch)
+        return batch
+
+    def _run(self):
+        """Bucle del hilo en segundo plano"""
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._closed and len(self._queue) < self.batch_size:
+                    remaining = self.flush_interval - (time.monotonic() - last_flush)
+                    if remaining <= 0 and self._queue:
+                        break
+                    self._cond.wait(timeout=remaining if remaining > 0 else self.flush_interval)
+                if self._closed:
+                    return
+                batch = self._take_batch()
+            if batch:
+                self._write(batch)
+            last_flush = time.monotonic()
+
+    def _write(self, batch: List[Dict]):
+        """Inserta un lote; si falla, reintenta fila a fila"""
+        with self._write_lock:
+            written = 0
+            try:
+                self.writer(batch)
+                written = len(batch)
+            except Exception as e:
+                print(f"Error al insertar lote de estadísticas ({len(batch)} filas): {str(e)}")
+                for row in batch:
+                    try:
+                        self.writer([row])
+                        written += 1
+                    except Exception as row_error:
+                        print(f"Error al crear estadística: {str(row_error)}")
+            with self._cond:
+                for row in batch:
+                    self._inflight.remove(row)
+                self.batches += 1
+                self.flushed += written
+                self.failed += len(batch) - written
@@ -0,0 +1,171 @@
+"""
+Exportación masiva de usage_stats, visitas y reservas a CSV o Parquet
+
+Uso desde la línea de comandos (desde ``src/``):
+
+    python -m database.export visits --format parquet --start 2024-01-01 --end 2024-06-30 -o visitas.parquet
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from datetime import datetime
+from itertools import islice
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional
+
+import config.config as config
+
+# Importación opcional de pyarrow para Parquet
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+def _chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """Agrupa un iterador de filas en listas de como mucho ``size`` filas"""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _flatten_value(value: Any) -> Any:
+    """Serializa a JSON las columnas JSONB (dict/list) para que quepan en una celda"""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def write_csv(rows: Iterable[Dict], output: BinaryIO, chunk_rows: int,
+              progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Escribe las filas en CSV (UTF-8) bloque a bloque y devuelve cuántas escribió.
+
+    Las columnas se toman de la primera fila; solo hay en memoria un bloque
+    de ``chunk_rows`` filas a la vez.
+    """
+    text = io.TextIOWrapper(output, encoding="utf-8", newline="", write_through=True)
+    writer = None
+    written = 0
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            if writer is None:
+                writer = csv.DictWriter(text, fieldnames=list(chunk[0].keys()), extrasaction="ignore")
+                writer.writeheader()
+            writer.writerows({key: _flatten_value(value) for key, value in row.items()} for row in chunk)
+            written += len(chunk)
+            if progress:
+                progress(written)
+    finally:
+        # Sin detach() cerrar el wrapper cerraría también ``output``
+        text.flush()
+        text.detach()
+    return written
+
+
+def _parquet_schema(chunk: List[Dict]) -> "pa.Schema":
+    """
+    Infiere el esquema del primer bloque.
+
+    Las columnas que en ese bloque solo traen nulos se declaran como texto,
+    ya que Arrow no puede ampliar el tipo nulo en bloques posteriores.
+    """
+    inferred = pa.Table.from_pylist(chunk).schema
+    return pa.schema([
+        pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+        for field in inferred
+    ])
+
+
+def write_parquet(rows: Iterable[Dict], output: BinaryIO, chunk_rows: int,
+                  progress: Optional[Callable[[int], None]] = None) -> int:
+    """Escribe las filas en Parquet, un grupo de filas por bloque, y devuelve cuántas escribió"""
+    if not PARQUET_AVAILABLE:
+        raise RuntimeError("pyarrow no está instalado. Instálalo con: pip install pyarrow")
+    writer = None
+    schema = None
+    written = 0
+    try:
+        for chunk in _chunks(rows, chunk_rows):
+            chunk = [{key: _flatten_value(value) for key, value in row.items()} for row in chunk]
+            if writer is None:
+                schema = _parquet_schema(chunk)
+                writer = pq.ParquetWriter(output, schema, compression="snappy")
+            string_columns = [field.name for field in schema if pa.types.is_string(field.type)]
+            for row in chunk:
+                for column in string_columns:
+                    if row.get(column) is not None and not isinstance(row[column], str):
+                        row[column] = str(row[column])
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+            if progress:
+                progress(written)
+    finally:
+        if writer is not None:
+            writer.close()
+    return written
+
+
+def export_rows(db, source: str, fmt: str, output: BinaryIO,
+                start_date: Optional[datetime] = None, end_date: Optional[datetime] = None,
+                chunk_rows: Optional[int] = None,
+                progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    Vuelca ``source`` (usage_stats, visits o bookings) en ``output`` con el formato ``fmt``.
+
+    Las filas se leen con paginación keyset y se escriben por bloques, así
+    que la memoria no depende del tamaño del rango exportado.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+    chunk_rows = chunk_rows or config.EXPORT_CHUNK_ROWS
+    # Las páginas siguen en DB_PAGE_SIZE: pedir más que el máximo de filas de
+    # PostgREST haría creer al iterador que ya no quedan páginas
+    rows = db.iter_export_rows(source, start_date, end_date)
+    writer = write_csv if fmt == "csv" else write_parquet
+    return writer(rows, output, chunk_rows, progress)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Punto de entrada de la línea de comandos"""
+    from database.database import EXPORT_SOURCES, SupabaseDB
+
+    parser = argparse.ArgumentParser(description="Exporta datos de uso, visitas o reservas a CSV/Parquet")
+    parser.add_argument("source", choices=sorted(EXPORT_SOURCES))
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="csv")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="Fecha inicial (ISO, p. ej. 2024-01-01)")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="Fecha final (ISO)")
+    parser.add_argument("--chunk-rows", type=int, default=config.EXPORT_CHUNK_ROWS)
+    parser.add_argument("-o", "--output", help="Fichero de salida (por defecto, salida estándar)")
+    args = parser.parse_args(argv)
+
+    db = SupabaseDB()
+
+    def report(written):
+        print(f"\r{written} filas exportadas", end="", file=sys.stderr)
+
+    try:
+        if args.output:
+            with open(args.output, "wb") as output:
+                total = export_rows(db, args.source, args.format, output, args.start, args.end,
+                                    args.chunk_rows, report)
+        else:
+            total = export_rows(db, args.source, args.format, sys.stdout.buffer, args.start, args.end,
+                                args.chunk_rows, report)
+    except Exception as e:
+        print(f"\nError al exportar: {str(e)}", file=sys.stderr)
+        return 1
+    print(f"\nExportación completada: {total} filas", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+"""
+Conjunto de favoritos de la sesión con actualización optimista
+"""
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, Dict, FrozenSet, List, Optional, Set, Tuple
+
+import streamlit as st
+
+import config.config as config
+from .async_database import _get_executor
+
+
+class FavoritesSet:
+    """
+    IDs de los POIs favoritos de un usuario, guardados en la sesión.
+
+    Se leen una vez al crear el conjunto (solo IDs). Después, marcar o
+    desmarcar un favorito cambia el conjunto al momento y lanza una única
+    escritura en segundo plano: pintar la página no necesita ninguna lectura.
+    Las escrituras de un mismo conjunto se serializan y cada una escribe el
+    estado más reciente del POI, así que varios clics seguidos terminan en el
+    estado del último. Si una escritura falla y no hubo clics posteriores, se
+    deshace el cambio y se anota en ``pop_failures``.
+
+    ``reconcile`` vuelve a leer los IDs en segundo plano cada
+    ``reconcile_interval`` segundos para recoger cambios hechos desde otras
+    sesiones; una lectura que coincide con clics pendientes se descarta.
+    """
+
+    def __init__(self, user_id: str,
+                 load_ids: Callable[[str], Optional[Set[str]]],
+                 write: Callable[[str, str, bool], bool],
+                 executor: Optional[Executor] = None,
+                 reconcile_interval: float = 60.0):
+        """Inicializa el conjunto y hace la lectura inicial de IDs"""
+        self.user_id = user_id
+        self.load_ids = load_ids
+        self.write = write
+        self.executor = executor or _get_executor()
+        self.reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pending: Dict[str, Tuple[bool, int]] = {}
+        self._failures: List[str] = []
+        self._version = 0
+        self._refreshing = False
+        self._ids: Set[str] = set(load_ids(user_id) or ())
+        self._loaded_at = time.monotonic()
+        self.writes = 0
+        self.failed_writes = 0
+        self.reconciles = 0
+
+    def __contains__(self, poi_id: str) -> bool:
+        return poi_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def ids(self) -> FrozenSet[str]:
+        """Copia inmutable de los IDs actuales"""
+        with self._lock:
+            return frozenset(self._ids)
+
+    # ---------- escrituras ----------
+
+    def toggle(self, poi_id: str) -> bool:
+        """Invierte el estado del POI y devuelve el nuevo (True si queda como favorito)"""
+        with self._lock:
+            favorite = poi_id not in self._ids
+        self.set(poi_id, favorite)
+        return favorite
+
+    def add(self, poi_id: str):
+        """Marca el POI como favorito"""
+        self.set(poi_id, True)
+
+    def remove(self, poi_id: str):
+        """Quita el POI de favoritos"""
+        self.set(poi_id, False)
+
+    def set(self, poi_id: str, favorite: bool):
+        """Aplica el estado al conjunto y programa su escritura"""
+        with self._lock:
+            if (poi_id in self._ids) == favorite and poi_id not in self._pending:
+                return
+            self._apply(poi_id, favorite)
+            self._version += 1
+            self._pending[poi_id] = (favorite, self._version)
+        self.executor.submit(self._write_latest, poi_id)
+
+    def forget(self, poi_id: str):
+        """Quita el POI del conjunto sin escribir (ya se borró por otra vía)"""
+        with self._lock:
+            self._ids.discard(poi_id)
+            self._pending.pop(poi_id, None)
+            self._version += 1
+
+    def _apply(self, poi_id: str, favorite: bool):
+        """Cambia el conjunto en memoria (requiere el lock)"""
+        if favorite:
+            self._ids.add(poi_id)
+        else:
+            self._ids.discard(poi_id)
+
+    def _write_latest(self, poi_id: str):
+        """Escribe el estado más reciente del POI (en el pool de hilos)"""
+        with self._write_lock:
+            with self._lock:
+                entry = self._pending.get(poi_id)
+            if entry is None:
+                # Una escritura anterior ya dejó este estado
+                return
+            favorite, version = entry
+            try:
+                ok = self.write(self.user_id, poi_id, favorite)
+            except Exception as e:
+                print(f"Error al guardar el favorito {poi_id}: {str(e)}")
+                ok = False
+            with self._lock:
+                self.writes += 1
+                latest = self._pending.get(poi_id)
+                if latest is None or latest[1] != version:
+                    return
+                del self._pending[poi_id]
+                if not ok:
+                    self.failed_writes += 1
+                    self._apply(poi_id, not favorite)
+                    self._failures.append(poi_id)
+
+    def pop_failures(self) -> List[str]:
+        """Devuelve (y olvida) los POIs cuyo cambio no se pudo guardar"""
+        with self._lock:
+            failures, self._failures = self._failures, []
+        return failures
+
+    # ---------- reconciliación ----------
+
+    def reconcile(self, force: bool = False):
+        """Lanza en segundo plano una relectura de IDs si ha pasado el intervalo"""
+        with self._lock:
+            due = force or time.monotonic() - self._loaded_at >= self.reconcile_interval
+            if not due or self._refreshing:
+                return
+            self._refreshing = True
+            version = self._version
+        self.executor.submit(self._refresh, version)
+
+    def _refresh(self, version: int):
+        """Sustituye el conjunto por el de la base de datos si no hubo clics entretanto"""
+        try:
+            ids = self.load_ids(self.user_id)
+        except Exception as e:
+            print(f"Error al reconciliar favoritos: {str(e)}")
+            ids = None
+        with self._lock:
+            self._refreshing = False
+            if ids is None or self._version != version or self._pending:
+                return
+            self._ids = set(ids)
+            self._loaded_at = time.monotonic()
+            self.reconciles += 1
+
+
+def get_session_favorites(db, user_id: str) -> FavoritesSet:
+    """Obtiene (o crea) el conjunto de favoritos del usuario en la sesión de Streamlit"""
+    favorites = st.session_state.get("favorites_set")
+    if favorites is None or favorites.user_id != user_id:
+        favorites = FavoritesSet(
+            user_id,
+            db.get_user_favorite_ids,
+            db.set_favorite,
+            reconcile_interval=config.FAVORITES_RECONCILE_INTERVAL,
+        )
+        st.session_state.favorites_set = favorites
+    else:
+        favorites.reconcile()
+    return favorites
@@ -0,0 +1,38 @@
+-- ============================================
+-- MIGRACIÓN: Contadores para el motor de logros
+-- ============================================
+-- Añade la función get_achievement_progress() que usa
+-- SupabaseDB.get_achievement_progress: devuelve en una sola fila los
+-- contadores de audio-guías, reservas, visitas, reseñas y ciudades visitadas
+-- de un usuario junto con los logros que ya tiene. El motor de logros de la
+-- aplicación la lee una vez por sesión y después cuenta los eventos en
+-- memoria, en lugar de descargar estadísticas y reservas en cada evento.
+-- Requiere usage_stats_daily (migration_usage_stats_rollup.sql).
+
+-- Paso 1: Función de contadores de logros
+CREATE OR REPLACE FUNCTION get_achievement_progress(p_user_id UUID)
+RETURNS TABLE (
+    audio_guides BIGINT,
+    bookings BIGINT,
+    visits BIGINT,
+    reviews BIGINT,
+    city_ids UUID[],
+    earned TEXT[]
+) AS $$
+    SELECT
+        (SELECT COUNT(*) FROM usage_stats s
+         WHERE s.user_id = p_user_id AND s.action_type = 'audio_guide')
+        + (SELECT COALESCE(SUM(d.event_count), 0) FROM usage_stats_daily d
+           WHERE d.user_id = p_user_id AND d.action_type = 'audio_guide'),
+        (SELECT COUNT(*) FROM bookings b WHERE b.user_id = p_user_id),
+        (SELECT COUNT(*) FROM user_visits v WHERE v.user_id = p_user_id),
+        (SELECT COUNT(*) FROM user_visits v WHERE v.user_id = p_user_id AND v.rating IS NOT NULL),
+        ARRAY(SELECT DISTINCT p.city_id
+              FROM user_visits v
+              JOIN points_of_interest p ON p.id = v.poi_id
+              WHERE v.user_id = p_user_id AND p.city_id IS NOT NULL),
+        ARRAY(SELECT a.achievement_name::TEXT FROM user_achievements a WHERE a.user_id = p_user_id);
+$$ LANGUAGE sql STABLE;
+
+-- Script completado exitosamente
+SELECT 'Migración del motor de logros completada exitosamente!' as resultado;
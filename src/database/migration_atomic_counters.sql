@@ -0,0 +1,40 @@
+-- ============================================
+-- MIGRACIÓN: Contadores atómicos en el servidor
+-- ============================================
+-- Este script crea funciones RPC que actualizan contadores en una sola
+-- sentencia UPDATE, evitando la secuencia leer-calcular-escribir desde el
+-- cliente (que pierde actualizaciones cuando hay escrituras concurrentes)
+
+-- Paso 1: Incrementar reproducciones de una audio-guía
+CREATE OR REPLACE FUNCTION increment_audio_play_count(p_audio_id UUID)
+RETURNS INTEGER AS $$
+    UPDATE audio_guides
+    SET play_count = COALESCE(play_count, 0) + 1,
+        last_played_at = NOW()
+    WHERE id = p_audio_id
+    RETURNING play_count;
+$$ LANGUAGE sql;
+
+-- Paso 2: Añadir una valoración a un POI actualizando la media de forma incremental
+CREATE OR REPLACE FUNCTION add_poi_rating(p_poi_id UUID, p_rating NUMERIC)
+RETURNS TABLE (new_rating DECIMAL, new_total_reviews INTEGER) AS $$
+    UPDATE points_of_interest
+    SET rating = ROUND(
+            (COALESCE(rating, 0) * COALESCE(total_reviews, 0) + p_rating)
+            / (COALESCE(total_reviews, 0) + 1), 2),
+        total_reviews = COALESCE(total_reviews, 0) + 1
+    WHERE id = p_poi_id
+    RETURNING rating, total_reviews;
+$$ LANGUAGE sql;
+
+-- Paso 3: Sumar (o restar) puntos a un usuario
+CREATE OR REPLACE FUNCTION add_user_points(p_user_id UUID, p_points INTEGER)
+RETURNS INTEGER AS $$
+    UPDATE users
+    SET total_points = COALESCE(total_points, 0) + p_points
+    WHERE id = p_user_id
+    RETURNING total_points;
+$$ LANGUAGE sql;
+
+-- Script completado exitosamente
+SELECT 'Migración de contadores atómicos completada exitosamente!' as resultado;
@@ -0,0 +1,19 @@
+-- ============================================
+-- MIGRACIÓN: Claves naturales para la importación masiva
+-- ============================================
+-- La importación masiva de ciudades y POIs hace upsert por lotes con
+-- ON CONFLICT sobre (name, country) y (city_id, name). PostgREST exige un
+-- índice único sobre esas columnas.
+--
+-- Si ya hay duplicados la creación del índice fallará. Para localizarlos:
+--   SELECT name, country, COUNT(*) FROM cities GROUP BY 1, 2 HAVING COUNT(*) > 1;
+--   SELECT city_id, name, COUNT(*) FROM points_of_interest GROUP BY 1, 2 HAVING COUNT(*) > 1;
+
+-- Paso 1: Ciudades únicas por nombre y país
+CREATE UNIQUE INDEX IF NOT EXISTS uq_cities_name_country ON cities(name, country);
+
+-- Paso 2: POIs únicos por ciudad y nombre
+CREATE UNIQUE INDEX IF NOT EXISTS uq_poi_city_name ON points_of_interest(city_id, name);
+
+-- Script completado exitosamente
+SELECT 'Migración de importación masiva completada exitosamente!' as resultado;
@@ -0,0 +1,33 @@
+-- ============================================
+-- MIGRACIÓN: Notificación de cambios del catálogo
+-- ============================================
+-- Este script publica cada alta, cambio o borrado de ciudades y POIs en el
+-- canal 'catalog_changes' con pg_notify. Las instancias de la aplicación que
+-- tengan DATABASE_URL configurada escuchan el canal (LISTEN) e invalidan sus
+-- cachés al momento, en lugar de esperar a que caduquen. El nombre del canal
+-- es fijo: es el que escucha change_feed.CATALOG_CHANNEL
+
+-- Paso 1: Función que publica la tabla, la operación y el ID de la fila
+CREATE OR REPLACE FUNCTION notify_catalog_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM pg_notify('catalog_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'id', COALESCE(NEW.id, OLD.id)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Paso 2: Triggers sobre las tablas del catálogo
+DROP TRIGGER IF EXISTS notify_cities_change ON cities;
+CREATE TRIGGER notify_cities_change AFTER INSERT OR UPDATE OR DELETE ON cities
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+DROP TRIGGER IF EXISTS notify_poi_change ON points_of_interest;
+CREATE TRIGGER notify_poi_change AFTER INSERT OR UPDATE OR DELETE ON points_of_interest
+    FOR EACH ROW EXECUTE FUNCTION notify_catalog_change();
+
+-- Script completado exitosamente
+SELECT 'Migración de notificación de cambios del catálogo completada exitosamente!' as resultado;
@@ -0,0 +1,84 @@
+-- ============================================
+-- MIGRACIÓN: Índices compuestos y parciales por forma de consulta
+-- ============================================
+-- Cada índice corresponde a una consulta de SupabaseDB (filtro + orden), de
+-- modo que Postgres puede devolver las filas ya ordenadas sin ordenar el
+-- resultado ni recorrer la tabla:
+--   get_user_visits / get_user_bookings / get_user_favorites /
+--   get_user_achievements -> (user_id, fecha DESC)
+--   get_usage_stats        -> (user_id | action_type | user_id + action_type,
+--                             timestamp DESC)
+--   _iter_keyset           -> (fecha DESC NULLS LAST, id DESC), mismo orden
+--                             que pide PostgREST
+--   réplica del catálogo   -> (updated_at NULLS FIRST, id)
+--   get_audio_guides       -> (poi_id, language, created_at DESC) WHERE is_active
+--
+-- Los índices de una sola columna que quedan cubiertos por el prefijo de uno
+-- compuesto se eliminan. (user_id, poi_id) en favoritos y (user_id,
+-- achievement_name) en logros ya existen como restricciones UNIQUE.
+--
+-- user_visits y usage_stats están particionadas: CREATE INDEX CONCURRENTLY no
+-- se admite en tablas particionadas, así que conviene ejecutar esta migración
+-- en una ventana de poco tráfico. Las pruebas de src/tests/test_query_plans.py
+-- comprueban con EXPLAIN que cada consulta usa su índice.
+
+-- Paso 1: Usuarios (ranking y paginación keyset)
+CREATE INDEX IF NOT EXISTS idx_users_points ON users(total_points DESC);
+CREATE INDEX IF NOT EXISTS idx_users_created_id ON users(created_at DESC NULLS LAST, id DESC);
+
+-- Paso 2: Catálogo (sincronización de la réplica y listados de POIs activos)
+CREATE INDEX IF NOT EXISTS idx_cities_updated ON cities(updated_at NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_poi_updated ON points_of_interest(updated_at NULLS FIRST, id);
+CREATE INDEX IF NOT EXISTS idx_poi_active_name ON points_of_interest(name) WHERE is_active;
+CREATE INDEX IF NOT EXISTS idx_poi_active_city_category ON points_of_interest(city_id, category, name) WHERE is_active;
+
+-- Paso 3: Visitas
+CREATE INDEX IF NOT EXISTS idx_visits_user_date ON user_visits(user_id, visit_date DESC);
+CREATE INDEX IF NOT EXISTS idx_visits_date_id ON user_visits(visit_date DESC NULLS LAST, id DESC);
+DROP INDEX IF EXISTS idx_visits_user;
+DROP INDEX IF EXISTS idx_visits_date;
+
+-- Paso 4: Logros
+CREATE INDEX IF NOT EXISTS idx_achievements_user_date ON user_achievements(user_id, earned_at DESC);
+DROP INDEX IF EXISTS idx_achievements_user;
+
+-- Paso 5: Reservas
+CREATE INDEX IF NOT EXISTS idx_bookings_user_date ON bookings(user_id, booking_date DESC);
+CREATE INDEX IF NOT EXISTS idx_bookings_date_id ON bookings(booking_date DESC NULLS LAST, id DESC);
+DROP INDEX IF EXISTS idx_bookings_user;
+DROP INDEX IF EXISTS idx_bookings_date;
+
+-- Paso 6: Estadísticas de uso y resúmenes diarios
+CREATE INDEX IF NOT EXISTS idx_stats_user_timestamp ON usage_stats(user_id, "timestamp" DESC);
+CREATE INDEX IF NOT EXISTS idx_stats_action_timestamp ON usage_stats(action_type, "timestamp" DESC);
+CREATE INDEX IF NOT EXISTS idx_stats_user_action_timestamp ON usage_stats(user_id, action_type, "timestamp" DESC);
+CREATE INDEX IF NOT EXISTS idx_stats_timestamp_id ON usage_stats("timestamp" DESC NULLS LAST, id DESC);
+DROP INDEX IF EXISTS idx_stats_user;
+DROP INDEX IF EXISTS idx_stats_action;
+DROP INDEX IF EXISTS idx_stats_timestamp;
+
+CREATE INDEX IF NOT EXISTS idx_stats_daily_day_id ON usage_stats_daily(day DESC NULLS LAST, id DESC);
+DROP INDEX IF EXISTS idx_stats_daily_day;
+
+-- Paso 7: Audio-guías activas
+CREATE INDEX IF NOT EXISTS idx_audio_active_poi ON audio_guides(poi_id, language, created_at DESC) WHERE is_active;
+DROP INDEX IF EXISTS idx_audio_active;
+
+-- Paso 8: Favoritos
+CREATE INDEX IF NOT EXISTS idx_favorites_user_date ON favorites(user_id, created_at DESC);
+DROP INDEX IF EXISTS idx_favorites_user;
+
+-- Paso 9: Actualizar estadísticas del planificador
+ANALYZE users;
+ANALYZE cities;
+ANALYZE points_of_interest;
+ANALYZE user_visits;
+ANALYZE user_achievements;
+ANALYZE bookings;
+ANALYZE usage_stats;
+ANALYZE usage_stats_daily;
+ANALYZE audio_guides;
+ANALYZE favorites;
+
+-- Script completado exitosamente
+SELECT 'Migración de índices compuestos completada exitosamente!' as resultado;
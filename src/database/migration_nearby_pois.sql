@@ -0,0 +1,49 @@
+-- ============================================
+-- MIGRACIÓN: Búsqueda de POIs cercanos con PostGIS
+-- ============================================
+-- Sustituye el B-tree idx_poi_location sobre (latitude, longitude), que no
+-- sirve para buscar por distancia, por un índice GiST sobre la ubicación, y
+-- añade la función nearby_pois() que usa SupabaseDB.nearby_pois cuando
+-- GEO_USE_POSTGIS=true. Sin PostGIS la aplicación sigue usando su índice
+-- espacial en memoria y esta migración no es necesaria.
+
+-- Paso 1: Extensión PostGIS
+CREATE EXTENSION IF NOT EXISTS "postgis";
+
+-- Paso 2: Punto geográfico de unas coordenadas
+CREATE OR REPLACE FUNCTION poi_geography(p_lat DOUBLE PRECISION, p_lng DOUBLE PRECISION)
+RETURNS geography AS $$
+    SELECT ST_SetSRID(ST_MakePoint(p_lng, p_lat), 4326)::geography;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Paso 3: Reemplazar el índice de ubicación
+DROP INDEX IF EXISTS idx_poi_location;
+CREATE INDEX IF NOT EXISTS idx_poi_geography ON points_of_interest
+USING gist(poi_geography(latitude, longitude)) WHERE is_active;
+
+-- Paso 4: Función de búsqueda por radio
+CREATE OR REPLACE FUNCTION nearby_pois(
+    p_lat DOUBLE PRECISION,
+    p_lng DOUBLE PRECISION,
+    p_radius_km DOUBLE PRECISION,
+    p_limit INTEGER DEFAULT NULL,
+    p_city_id UUID DEFAULT NULL
+)
+RETURNS TABLE (id UUID, distance_km DOUBLE PRECISION) AS $$
+    WITH origin AS (
+        SELECT poi_geography(p_lat, p_lng) AS point
+    )
+    SELECT p.id, ST_Distance(poi_geography(p.latitude, p.longitude), o.point) / 1000.0 AS distance_km
+    FROM points_of_interest p, origin o
+    WHERE p.is_active
+      AND ST_DWithin(poi_geography(p.latitude, p.longitude), o.point, p_radius_km * 1000.0)
+      AND (p_city_id IS NULL OR p.city_id = p_city_id)
+    ORDER BY poi_geography(p.latitude, p.longitude) <-> o.point
+    LIMIT LEAST(COALESCE(p_limit, 1000), 1000);
+$$ LANGUAGE sql STABLE;
+
+-- Paso 5: Actualizar estadísticas
+ANALYZE points_of_interest;
+
+-- Script completado exitosamente
+SELECT 'Migración de búsqueda de POIs cercanos completada exitosamente!' as resultado;
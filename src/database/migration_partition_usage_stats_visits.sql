@@ -0,0 +1,218 @@
+-- ============================================
+-- MIGRACIÓN: Particionado mensual de usage_stats y user_visits
+-- ============================================
+-- Este script convierte usage_stats y user_visits en tablas particionadas
+-- por rango mensual (timestamp y visit_date). Las consultas con filtro de
+-- fechas que ya hace la aplicación (gte/lte) solo leen las particiones del
+-- rango. Los datos existentes se copian a las particiones nuevas y las
+-- tablas originales se eliminan al final.
+--
+-- Todo se ejecuta en una transacción: si algo falla no cambia nada. Copiar
+-- tablas grandes bloquea las escrituras mientras dura; ejecútalo en una
+-- ventana de mantenimiento. Requiere PostgreSQL 13 o superior.
+
+BEGIN;
+
+-- Paso 1: Apartar las tablas actuales (el nombre de la clave primaria es global)
+ALTER TABLE user_visits RENAME TO user_visits_legacy;
+ALTER TABLE user_visits_legacy RENAME CONSTRAINT user_visits_pkey TO user_visits_legacy_pkey;
+ALTER TABLE usage_stats RENAME TO usage_stats_legacy;
+ALTER TABLE usage_stats_legacy RENAME CONSTRAINT usage_stats_pkey TO usage_stats_legacy_pkey;
+
+-- Paso 2: Tablas particionadas (la clave primaria incluye la columna de partición)
+CREATE TABLE user_visits (
+    id UUID DEFAULT gen_random_uuid(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    poi_id UUID REFERENCES points_of_interest(id) ON DELETE CASCADE,
+    visit_date TIMESTAMP NOT NULL DEFAULT NOW(),
+    duration_minutes INTEGER,
+    rating INTEGER CHECK (rating >= 1 AND rating <= 5),
+    review TEXT,
+    notes TEXT,
+    photos JSONB DEFAULT '[]',
+    checkin_location JSONB,
+    weather_conditions VARCHAR(100),
+    is_completed BOOLEAN DEFAULT false,
+    metadata JSONB DEFAULT '{}',
+    created_at TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (id, visit_date)
+) PARTITION BY RANGE (visit_date);
+
+CREATE TABLE user_visits_default PARTITION OF user_visits DEFAULT;
+
+CREATE TABLE usage_stats (
+    id UUID DEFAULT gen_random_uuid(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    action_type VARCHAR(100) NOT NULL CHECK (action_type IN ('audio_guide', 'poi_view', 'search', 'booking', 'review', 'share', 'favorite', 'navigation')),
+    poi_id UUID REFERENCES points_of_interest(id) ON DELETE SET NULL,
+    city_id UUID REFERENCES cities(id) ON DELETE SET NULL,
+    timestamp TIMESTAMP NOT NULL DEFAULT NOW(),
+    duration_seconds INTEGER,
+    device_type VARCHAR(50),
+    platform VARCHAR(50),
+    ip_address INET,
+    user_agent TEXT,
+    metadata JSONB DEFAULT '{}',
+    PRIMARY KEY (id, "timestamp")
+) PARTITION BY RANGE ("timestamp");
+
+CREATE TABLE usage_stats_default PARTITION OF usage_stats DEFAULT;
+
+-- Paso 3: Función de mantenimiento de particiones
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(p_from DATE DEFAULT NULL, p_months_ahead INTEGER DEFAULT 3)
+RETURNS INTEGER AS $$
+DECLARE
+    v_target RECORD;
+    v_month DATE;
+    v_next DATE;
+    v_last DATE := (date_trunc('month', NOW()) + make_interval(months => p_months_ahead))::DATE;
+    v_name TEXT;
+    v_blocked BOOLEAN;
+    v_created INTEGER := 0;
+BEGIN
+    -- Límites para que una llamada no cree cientos de particiones
+    IF p_months_ahead IS NULL OR p_months_ahead NOT BETWEEN 0 AND 24 THEN
+        RAISE EXCEPTION 'p_months_ahead debe estar entre 0 y 24: %', p_months_ahead;
+    END IF;
+    IF p_from IS NOT NULL AND (p_from < (NOW() - INTERVAL '10 years')::DATE OR p_from > v_last) THEN
+        RAISE EXCEPTION 'p_from fuera de rango (últimos 10 años hasta %): %', v_last, p_from;
+    END IF;
+
+    FOR v_target IN
+        SELECT * FROM (VALUES ('usage_stats', 'timestamp'), ('user_visits', 'visit_date')) AS t(tbl, col)
+    LOOP
+        v_month := date_trunc('month', COALESCE(p_from, NOW()::DATE))::DATE;
+        WHILE v_month <= v_last LOOP
+            v_next := (v_month + INTERVAL '1 month')::DATE;
+            v_name := format('%s_%s', v_target.tbl, to_char(v_month, 'YYYY_MM'));
+            IF to_regclass(v_name) IS NULL THEN
+                -- Una partición nueva no puede solaparse con filas que ya estén en la DEFAULT
+                EXECUTE format('SELECT EXISTS (SELECT 1 FROM %I WHERE %I >= %L AND %I < %L)',
+                               v_target.tbl || '_default', v_target.col, v_month, v_target.col, v_next)
+                INTO v_blocked;
+                IF v_blocked THEN
+                    RAISE NOTICE 'La partición % no se crea: hay filas de ese mes en %_default', v_name, v_target.tbl;
+                ELSE
+                    EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                                   v_name, v_target.tbl, v_month, v_next);
+                    v_created := v_created + 1;
+                END IF;
+            END IF;
+            v_month := v_next;
+        END LOOP;
+    END LOOP;
+    RETURN v_created;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Solo el job de mantenimiento (clave service_role) puede crear particiones
+REVOKE EXECUTE ON FUNCTION ensure_monthly_partitions(DATE, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION ensure_monthly_partitions(DATE, INTEGER) TO service_role;
+
+-- Paso 4: Particiones para el histórico (hasta 10 años; lo anterior queda en la
+-- partición DEFAULT) y los próximos tres meses
+SELECT ensure_monthly_partitions(GREATEST(LEAST(
+    (SELECT MIN(visit_date) FROM user_visits_legacy),
+    (SELECT MIN("timestamp") FROM usage_stats_legacy),
+    NOW()
+)::DATE, (NOW() - INTERVAL '10 years')::DATE), 3);
+
+-- Paso 5: Copiar los datos (antes de crear los triggers, para no contar dos veces la popularidad)
+INSERT INTO user_visits (id, user_id, poi_id, visit_date, duration_minutes, rating, review, notes, photos,
+                         checkin_location, weather_conditions, is_completed, metadata, created_at)
+SELECT id, user_id, poi_id, COALESCE(visit_date, created_at, NOW()), duration_minutes, rating, review, notes, photos,
+       checkin_location, weather_conditions, is_completed, metadata, created_at
+FROM user_visits_legacy;
+
+INSERT INTO usage_stats (id, user_id, action_type, poi_id, city_id, "timestamp", duration_seconds, device_type,
+                         platform, ip_address, user_agent, metadata)
+SELECT id, user_id, action_type, poi_id, city_id, COALESCE("timestamp", NOW()), duration_seconds, device_type,
+       platform, ip_address, user_agent, metadata
+FROM usage_stats_legacy;
+
+-- Paso 6: Trasladar RLS y políticas de las tablas originales
+DO $$
+DECLARE
+    v_table RECORD;
+    v_policy RECORD;
+BEGIN
+    FOR v_table IN
+        SELECT relname FROM pg_class
+        WHERE relname IN ('user_visits_legacy', 'usage_stats_legacy') AND relrowsecurity
+    LOOP
+        EXECUTE format('ALTER TABLE %I ENABLE ROW LEVEL SECURITY', replace(v_table.relname, '_legacy', ''));
+    END LOOP;
+
+    FOR v_policy IN
+        SELECT * FROM pg_policies
+        WHERE schemaname = 'public' AND tablename IN ('user_visits_legacy', 'usage_stats_legacy')
+    LOOP
+        EXECUTE format('CREATE POLICY %I ON %I AS %s FOR %s TO %s%s%s',
+            v_policy.policyname,
+            replace(v_policy.tablename, '_legacy', ''),
+            v_policy.permissive,
+            v_policy.cmd,
+            (SELECT string_agg(CASE WHEN r = 'public' THEN 'public' ELSE quote_ident(r) END, ', ')
+             FROM unnest(v_policy.roles) AS r),
+            COALESCE(' USING (' || v_policy.qual || ')', ''),
+            COALESCE(' WITH CHECK (' || v_policy.with_check || ')', ''));
+    END LOOP;
+END $$;
+
+-- Paso 7: Eliminar las tablas originales (arrastra vw_user_stats, que se recrea abajo)
+DROP TABLE user_visits_legacy CASCADE;
+DROP TABLE usage_stats_legacy CASCADE;
+
+-- Paso 8: Índices (se crean en cada partición, también en las futuras)
+CREATE INDEX idx_visits_user ON user_visits(user_id);
+CREATE INDEX idx_visits_poi ON user_visits(poi_id);
+CREATE INDEX idx_visits_date ON user_visits(visit_date DESC);
+CREATE INDEX idx_visits_rating ON user_visits(rating);
+
+CREATE INDEX idx_stats_user ON usage_stats(user_id);
+CREATE INDEX idx_stats_action ON usage_stats(action_type);
+CREATE INDEX idx_stats_timestamp ON usage_stats(timestamp DESC);
+CREATE INDEX idx_stats_poi ON usage_stats(poi_id);
+
+-- Paso 9: Triggers y vistas que dependían de user_visits
+CREATE TRIGGER track_visit_popularity AFTER INSERT OR DELETE OR UPDATE OF poi_id, rating ON user_visits
+    FOR EACH ROW EXECUTE FUNCTION track_visit_popularity();
+
+CREATE OR REPLACE VIEW vw_user_stats AS
+SELECT 
+    u.id,
+    u.name,
+    u.email,
+    u.total_points,
+    u.level,
+    COUNT(DISTINCT v.id) as total_visits,
+    COUNT(DISTINCT b.id) as total_bookings,
+    COUNT(DISTINCT a.id) as total_achievements
+FROM users u
+LEFT JOIN user_visits v ON u.id = v.user_id
+LEFT JOIN bookings b ON u.id = b.user_id
+LEFT JOIN user_achievements a ON u.id = a.user_id
+GROUP BY u.id, u.name, u.email, u.total_points, u.level;
+
+COMMENT ON TABLE user_visits IS 'Registro de visitas de usuarios a POIs';
+COMMENT ON TABLE usage_stats IS 'Estadísticas de uso del sistema';
+
+-- Paso 10: El rollup de usage_stats borra filas que la política RLS no permite borrar a anon;
+-- como se salta RLS, solo puede ejecutarlo el job de mantenimiento (clave service_role)
+ALTER FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) SECURITY DEFINER SET search_path = public;
+REVOKE EXECUTE ON FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) TO service_role;
+
+COMMIT;
+
+-- Paso 11: Programar las particiones futuras con pg_cron si está disponible
+-- (si no, el job de rollup también las crea: python -m database.usage_rollup)
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_cron') THEN
+        PERFORM cron.schedule('ensure-monthly-partitions', '0 3 * * *', 'SELECT ensure_monthly_partitions()');
+    END IF;
+END $$;
+
+-- Script completado exitosamente
+SELECT 'Migración de particionado mensual completada exitosamente!' as resultado;
@@ -0,0 +1,89 @@
+-- ============================================
+-- MIGRACIÓN: Búsqueda de texto completo de POIs con ranking
+-- ============================================
+-- Sustituye el índice idx_poi_search (español, sin pesos y sensible a
+-- acentos) por uno sobre poi_search_document(), que pondera el nombre sobre
+-- las descripciones y pliega los acentos, y añade la función search_pois()
+-- que usa SupabaseDB.search_pois.
+
+-- Paso 1: Extensión unaccent
+CREATE EXTENSION IF NOT EXISTS "unaccent";
+
+-- Paso 2: Configuración de búsqueda en español sin acentos
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'spanish_unaccent') THEN
+        CREATE TEXT SEARCH CONFIGURATION spanish_unaccent (COPY = spanish);
+        ALTER TEXT SEARCH CONFIGURATION spanish_unaccent
+            ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+    END IF;
+END;
+$$;
+
+-- Paso 3: Documento de búsqueda ponderado
+CREATE OR REPLACE FUNCTION poi_search_document(p_name TEXT, p_short_description TEXT, p_description TEXT)
+RETURNS tsvector AS $$
+    SELECT setweight(to_tsvector('public.spanish_unaccent', COALESCE(p_name, '')), 'A')
+        || setweight(to_tsvector('public.spanish_unaccent', COALESCE(p_short_description, '')), 'B')
+        || setweight(to_tsvector('public.spanish_unaccent', COALESCE(p_description, '')), 'C');
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Paso 4: Reemplazar el índice GIN de POIs
+DROP INDEX IF EXISTS idx_poi_search;
+CREATE INDEX idx_poi_search ON points_of_interest
+USING gin(poi_search_document(name, short_description, description)) WHERE is_active;
+
+-- Paso 5: Funciones de búsqueda con ranking
+-- Consulta de búsqueda: la última palabra cuenta también como prefijo
+-- ("catedr" encuentra "Catedral") mientras se escribe. Si la consulta acaba en
+-- espacio, comillas o signos no se añade prefijo; la palabra no lleva espacios
+-- ni signos y pasa por websearch_to_tsquery, así que la entrada nunca llega a la sintaxis de tsquery
+CREATE OR REPLACE FUNCTION poi_search_query(p_query TEXT)
+RETURNS tsquery AS $$
+    SELECT CASE
+        WHEN last_term IS NULL OR numnode(last_query) = 0 THEN full_query
+        ELSE full_query
+            || (websearch_to_tsquery('public.spanish_unaccent', left(p_query, -length(last_term)))
+                && (last_query::text || ':*')::tsquery)
+    END
+    FROM (
+        SELECT websearch_to_tsquery('public.spanish_unaccent', p_query) AS full_query,
+               m[1] AS last_term,
+               websearch_to_tsquery('public.spanish_unaccent', m[1]) AS last_query
+        FROM regexp_match(p_query, '(?:^|\s)([^[:space:][:punct:]]+)$') AS m
+    ) t;
+$$ LANGUAGE sql STABLE;
+
+CREATE OR REPLACE FUNCTION search_pois(
+    p_query TEXT,
+    p_city_id UUID DEFAULT NULL,
+    p_categories TEXT[] DEFAULT NULL,
+    p_difficulties TEXT[] DEFAULT NULL,
+    p_min_price NUMERIC DEFAULT NULL,
+    p_max_price NUMERIC DEFAULT NULL,
+    p_min_rating NUMERIC DEFAULT NULL,
+    p_limit INTEGER DEFAULT 50
+)
+RETURNS TABLE (id UUID, rank REAL) AS $$
+    WITH q AS (
+        SELECT poi_search_query(p_query) AS query
+    )
+    SELECT p.id, ts_rank_cd(poi_search_document(p.name, p.short_description, p.description), q.query) AS rank
+    FROM points_of_interest p, q
+    WHERE p.is_active
+      AND poi_search_document(p.name, p.short_description, p.description) @@ q.query
+      AND (p_city_id IS NULL OR p.city_id = p_city_id)
+      AND (p_categories IS NULL OR p.category = ANY(p_categories))
+      AND (p_difficulties IS NULL OR p.difficulty_level = ANY(p_difficulties))
+      AND (p_min_price IS NULL OR p.entry_price >= p_min_price)
+      AND (p_max_price IS NULL OR p.entry_price <= p_max_price)
+      AND (p_min_rating IS NULL OR p.rating >= p_min_rating)
+    ORDER BY rank DESC, p.name
+    LIMIT LEAST(GREATEST(p_limit, 1), 500);
+$$ LANGUAGE sql STABLE;
+
+-- Paso 6: Actualizar estadísticas
+ANALYZE points_of_interest;
+
+-- Script completado exitosamente
+SELECT 'Migración de búsqueda de POIs completada exitosamente!' as resultado;
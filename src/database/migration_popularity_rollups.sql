@@ -0,0 +1,129 @@
+-- ============================================
+-- MIGRACIÓN: Rollups de popularidad por POI y ciudad
+-- ============================================
+-- Este script crea la tabla poi_popularity, mantenida de forma incremental
+-- por triggers sobre user_visits y bookings, y las vistas que la exponen
+-- por POI y por ciudad. Las lecturas de popularidad dejan de recorrer todo
+-- el histórico de visitas.
+
+-- Paso 1: Tabla de contadores por POI
+CREATE TABLE IF NOT EXISTS poi_popularity (
+    poi_id UUID PRIMARY KEY REFERENCES points_of_interest(id) ON DELETE CASCADE,
+    visit_count INTEGER NOT NULL DEFAULT 0,
+    rating_count INTEGER NOT NULL DEFAULT 0,
+    rating_sum INTEGER NOT NULL DEFAULT 0,
+    booking_count INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Paso 2: Funciones y triggers de mantenimiento incremental
+CREATE OR REPLACE FUNCTION bump_poi_popularity(
+    p_poi_id UUID, p_visits INTEGER, p_ratings INTEGER, p_rating_sum INTEGER, p_bookings INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+    IF p_poi_id IS NULL THEN
+        RETURN;
+    END IF;
+    -- El EXISTS evita recrear la fila cuando el POI se está borrando en cascada
+    INSERT INTO poi_popularity (poi_id, visit_count, rating_count, rating_sum, booking_count)
+    SELECT p_poi_id, p_visits, p_ratings, p_rating_sum, p_bookings
+    WHERE EXISTS (SELECT 1 FROM points_of_interest WHERE id = p_poi_id)
+    ON CONFLICT (poi_id) DO UPDATE
+    SET visit_count = poi_popularity.visit_count + EXCLUDED.visit_count,
+        rating_count = poi_popularity.rating_count + EXCLUDED.rating_count,
+        rating_sum = poi_popularity.rating_sum + EXCLUDED.rating_sum,
+        booking_count = poi_popularity.booking_count + EXCLUDED.booking_count,
+        updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_visit_popularity()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_poi_popularity(OLD.poi_id, -1, -(OLD.rating IS NOT NULL)::INTEGER, -COALESCE(OLD.rating, 0), 0);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_poi_popularity(NEW.poi_id, 1, (NEW.rating IS NOT NULL)::INTEGER, COALESCE(NEW.rating, 0), 0);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION track_booking_popularity()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM bump_poi_popularity(OLD.poi_id, 0, 0, 0, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM bump_poi_popularity(NEW.poi_id, 0, 0, 0, 1);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS track_visit_popularity ON user_visits;
+CREATE TRIGGER track_visit_popularity AFTER INSERT OR DELETE OR UPDATE OF poi_id, rating ON user_visits
+    FOR EACH ROW EXECUTE FUNCTION track_visit_popularity();
+
+DROP TRIGGER IF EXISTS track_booking_popularity ON bookings;
+CREATE TRIGGER track_booking_popularity AFTER INSERT OR DELETE OR UPDATE OF poi_id ON bookings
+    FOR EACH ROW EXECUTE FUNCTION track_booking_popularity();
+
+-- Paso 3: Vistas de lectura
+-- Vista de popularidad por POI (lectura O(#POIs))
+CREATE OR REPLACE VIEW vw_poi_popularity AS
+SELECT
+    p.id AS poi_id,
+    p.city_id,
+    COALESCE(pp.visit_count, 0) AS visit_count,
+    COALESCE(pp.booking_count, 0) AS booking_count,
+    COALESCE(pp.rating_count, 0) AS rating_count,
+    CASE WHEN COALESCE(pp.rating_count, 0) > 0
+         THEN ROUND(pp.rating_sum::NUMERIC / pp.rating_count, 2)
+         ELSE 0 END AS avg_rating
+FROM points_of_interest p
+LEFT JOIN poi_popularity pp ON pp.poi_id = p.id;
+
+-- Vista de popularidad por ciudad, agregada a partir de la de POIs
+CREATE OR REPLACE VIEW vw_city_popularity AS
+SELECT
+    p.city_id,
+    COUNT(p.id) AS poi_count,
+    COALESCE(SUM(pp.visit_count), 0) AS visit_count,
+    COALESCE(SUM(pp.booking_count), 0) AS booking_count,
+    COALESCE(SUM(pp.rating_count), 0) AS rating_count,
+    CASE WHEN COALESCE(SUM(pp.rating_count), 0) > 0
+         THEN ROUND(SUM(pp.rating_sum)::NUMERIC / SUM(pp.rating_count), 2)
+         ELSE 0 END AS avg_rating
+FROM points_of_interest p
+LEFT JOIN poi_popularity pp ON pp.poi_id = p.id
+GROUP BY p.city_id;
+
+-- Paso 4: Cargar los contadores a partir del histórico existente
+INSERT INTO poi_popularity (poi_id, visit_count, rating_count, rating_sum, booking_count)
+SELECT
+    p.id,
+    COALESCE(v.visit_count, 0),
+    COALESCE(v.rating_count, 0),
+    COALESCE(v.rating_sum, 0),
+    COALESCE(b.booking_count, 0)
+FROM points_of_interest p
+LEFT JOIN (
+    SELECT poi_id, COUNT(*) AS visit_count, COUNT(rating) AS rating_count, COALESCE(SUM(rating), 0) AS rating_sum
+    FROM user_visits GROUP BY poi_id
+) v ON v.poi_id = p.id
+LEFT JOIN (
+    SELECT poi_id, COUNT(*) AS booking_count FROM bookings GROUP BY poi_id
+) b ON b.poi_id = p.id
+ON CONFLICT (poi_id) DO UPDATE
+SET visit_count = EXCLUDED.visit_count,
+    rating_count = EXCLUDED.rating_count,
+    rating_sum = EXCLUDED.rating_sum,
+    booking_count = EXCLUDED.booking_count,
+    updated_at = NOW();
+
+-- Script completado exitosamente
+SELECT 'Migración de rollups de popularidad completada exitosamente!' as resultado;
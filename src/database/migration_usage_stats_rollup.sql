@@ -0,0 +1,94 @@
+-- ============================================
+-- MIGRACIÓN: Resumen diario y retención de usage_stats
+-- ============================================
+-- Este script crea usage_stats_daily, la tabla de archivo y la marca de agua
+-- del rollup, y la función rollup_usage_stats(), que agrega en una sola
+-- sentencia los eventos anteriores a una fecha por día, usuario, POI, ciudad
+-- y acción, y los borra (o archiva) de usage_stats.
+-- Requiere PostgreSQL 15 o superior (NULLS NOT DISTINCT).
+
+-- Paso 1: Tablas del resumen, del archivo y de la marca de agua
+CREATE TABLE IF NOT EXISTS usage_stats_daily (
+    id UUID DEFAULT gen_random_uuid() PRIMARY KEY,
+    day DATE NOT NULL,
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    poi_id UUID,
+    city_id UUID,
+    action_type VARCHAR(100) NOT NULL,
+    event_count INTEGER NOT NULL DEFAULT 0,
+    total_duration_seconds BIGINT NOT NULL DEFAULT 0
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_stats_daily_key ON usage_stats_daily(day, user_id, poi_id, city_id, action_type) NULLS NOT DISTINCT;
+CREATE INDEX IF NOT EXISTS idx_stats_daily_day ON usage_stats_daily(day DESC);
+CREATE INDEX IF NOT EXISTS idx_stats_daily_user ON usage_stats_daily(user_id);
+
+-- Eventos originales ya resumidos (solo si el rollup se ejecuta con archivo)
+CREATE TABLE IF NOT EXISTS usage_stats_archive (LIKE usage_stats INCLUDING DEFAULTS);
+
+CREATE INDEX IF NOT EXISTS idx_stats_archive_timestamp ON usage_stats_archive(timestamp DESC);
+
+-- Marca de agua: los eventos anteriores a rolled_up_before están en usage_stats_daily
+CREATE TABLE IF NOT EXISTS usage_stats_rollup_state (
+    id BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),
+    rolled_up_before TIMESTAMP,
+    last_run_at TIMESTAMP,
+    rows_rolled_up BIGINT NOT NULL DEFAULT 0
+);
+
+-- Paso 2: Función de rollup (cortes a día completo; se puede ejecutar varias veces)
+CREATE OR REPLACE FUNCTION rollup_usage_stats(p_before TIMESTAMP, p_archive BOOLEAN DEFAULT false)
+RETURNS TABLE (moved_rows BIGINT, summary_rows BIGINT, watermark TIMESTAMP) AS $$
+DECLARE
+    -- Se corta a día completo para no repartir un mismo día entre resumen y eventos;
+    -- nunca se resume el último día (los timestamps se guardan en UTC)
+    v_cutoff TIMESTAMP := date_trunc('day', LEAST(p_before, (NOW() AT TIME ZONE 'UTC') - INTERVAL '1 day'));
+    v_moved BIGINT;
+    v_summaries BIGINT;
+BEGIN
+    IF p_before IS NULL THEN
+        RAISE EXCEPTION 'p_before es obligatorio';
+    END IF;
+
+    WITH moved AS (
+        DELETE FROM usage_stats WHERE "timestamp" < v_cutoff RETURNING *
+    ), archived AS (
+        INSERT INTO usage_stats_archive SELECT * FROM moved WHERE p_archive
+    ), summarized AS (
+        INSERT INTO usage_stats_daily AS d
+            (day, user_id, poi_id, city_id, action_type, event_count, total_duration_seconds)
+        SELECT moved."timestamp"::date, user_id, poi_id, city_id, action_type,
+               COUNT(*), COALESCE(SUM(duration_seconds), 0)
+        FROM moved
+        GROUP BY 1, 2, 3, 4, 5
+        ON CONFLICT (day, user_id, poi_id, city_id, action_type) DO UPDATE
+        SET event_count = d.event_count + EXCLUDED.event_count,
+            total_duration_seconds = d.total_duration_seconds + EXCLUDED.total_duration_seconds
+        RETURNING 1
+    )
+    SELECT (SELECT COUNT(*) FROM moved), (SELECT COUNT(*) FROM summarized)
+    INTO v_moved, v_summaries;
+
+    INSERT INTO usage_stats_rollup_state AS s (id, rolled_up_before, last_run_at, rows_rolled_up)
+    VALUES (true, v_cutoff, NOW(), v_moved)
+    ON CONFLICT (id) DO UPDATE
+    SET rolled_up_before = GREATEST(s.rolled_up_before, EXCLUDED.rolled_up_before),
+        last_run_at = NOW(),
+        rows_rolled_up = s.rows_rolled_up + EXCLUDED.rows_rolled_up;
+
+    RETURN QUERY
+    SELECT v_moved, v_summaries, s.rolled_up_before
+    FROM usage_stats_rollup_state s
+    WHERE s.id;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Solo el job de mantenimiento (clave service_role) puede resumir y borrar eventos
+REVOKE EXECUTE ON FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rollup_usage_stats(TIMESTAMP, BOOLEAN) TO service_role;
+
+-- Paso 3: Comentarios
+COMMENT ON TABLE usage_stats_daily IS 'Resumen diario de estadísticas de uso anteriores a la retención';
+
+-- Script completado exitosamente
+SELECT 'Migración de rollup de estadísticas de uso completada exitosamente!' as resultado;
@@ -0,0 +1,26 @@
+-- ============================================
+-- MIGRACIÓN: Posición de un usuario en el ranking global
+-- ============================================
+-- Añade la función get_user_rank() que usa SupabaseDB.get_user_rank para
+-- mostrar la posición del usuario sin descargar la tabla de usuarios: cuenta
+-- los usuarios con más puntos sobre el índice idx_users_points y devuelve
+-- una sola fila.
+
+-- Paso 1: Índice del ranking (ya existe si se aplicó migration_index_pack.sql)
+CREATE INDEX IF NOT EXISTS idx_users_points ON users(total_points DESC);
+
+-- Paso 2: Función de posición en el ranking
+CREATE OR REPLACE FUNCTION get_user_rank(p_user_id UUID)
+RETURNS TABLE (rank BIGINT, total_points INTEGER, leader_points INTEGER) AS $$
+    SELECT 1 + (SELECT COUNT(*) FROM users o WHERE o.total_points > COALESCE(u.total_points, 0)),
+           COALESCE(u.total_points, 0),
+           COALESCE((SELECT MAX(o.total_points) FROM users o), 0)
+    FROM users u
+    WHERE u.id = p_user_id;
+$$ LANGUAGE sql STABLE;
+
+-- Paso 3: Actualizar estadísticas
+ANALYZE users;
+
+-- Script completado exitosamente
+SELECT 'Migración del ranking de usuarios completada exitosamente!' as resultado;
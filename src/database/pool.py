@@ -0,0 +1,162 @@
+"""
+Pool de clientes Supabase compartido por las sesiones de Streamlit
+"""
+import threading
+import weakref
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+import httpx
+from supabase import Client, ClientOptions, create_client
+
+import config.config as config
+
+# Importación opcional de h2 para multiplexar peticiones sobre HTTP/2
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class _PooledClient:
+    """Cliente Supabase del pool junto a su cliente httpx y sus préstamos activos"""
+
+    __slots__ = ("client", "http_client", "leases")
+
+    def __init__(self, client: Client, http_client: httpx.Client):
+        self.client = client
+        self.http_client = http_client
+        self.leases = 0
+
+
+class ClientPool:
+    """
+    Conjunto acotado de clientes Supabase con conexiones keep-alive.
+
+    Cada cliente lleva su propio ``httpx.Client`` con límites de conexiones,
+    de modo que las sesiones concurrentes no compiten por un único pool de
+    conexiones. Los préstamos se asignan al cliente con menos préstamos
+    activos; mientras haya huecos se crea uno nuevo, hasta ``size``. Al
+    alcanzar el límite los clientes se comparten (httpx es seguro entre hilos)
+    en lugar de bloquear al usuario.
+    """
+
+    def __init__(self, url: str, key: str, size: int = 8,
+                 max_connections: int = 20, max_keepalive: int = 10,
+                 keepalive_expiry: float = 30.0, timeout: float = 30.0,
+                 on_create: Optional[Callable[[httpx.Client], None]] = None):
+        """Inicializa el pool; los clientes se crean bajo demanda"""
+        self.url = url
+        self.key = key
+        self.size = max(1, size)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = timeout
+        self.on_create = on_create
+        self._clients: List[_PooledClient] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.shared_checkouts = 0
+        self.thread_bindings = 0
+
+    def _create(self) -> _PooledClient:
+        """Crea un cliente Supabase sobre un httpx.Client con límites y keep-alive"""
+        http_client = httpx.Client(
+            limits=self.limits,
+            timeout=self.timeout,
+            follow_redirects=True,
+            http2=HTTP2_AVAILABLE,
+        )
+        if self.on_create:
+            self.on_create(http_client)
+        client = create_client(self.url, self.key, options=ClientOptions(httpx_client=http_client))
+        return _PooledClient(client, http_client)
+
+    def _acquire(self) -> _PooledClient:
+        """Presta el cliente menos ocupado, creando uno nuevo si todos están en uso"""
+        with self._lock:
+            self.checkouts += 1
+            idle = min(self._clients, key=lambda pooled: pooled.leases, default=None)
+            if idle is None or (idle.leases > 0 and len(self._clients) < self.size):
+                idle = self._create()
+                self._clients.append(idle)
+            elif idle.leases > 0:
+                self.shared_checkouts += 1
+            idle.leases += 1
+            return idle
+
+    def _release(self, pooled: _PooledClient):
+        """Devuelve un préstamo al pool"""
+        with self._lock:
+            pooled.leases = max(0, pooled.leases - 1)
+
+    @contextmanager
+    def checkout(self) -> Iterator[Client]:
+        """Presta un cliente durante el bloque ``with``"""
+        pooled = self._acquire()
+        try:
+            yield pooled.client
+        finally:
+            self._release(pooled)
+
+    def client_for_thread(self) -> Client:
+        """
+        Devuelve el cliente asignado al hilo actual, asignándole uno si no lo tiene.
+
+        Streamlit ejecuta cada rerun en su propio hilo; el préstamo se libera
+        cuando el objeto del hilo se recolecta.
+        """
+        pooled = getattr(self._local, "pooled", None)
+        if pooled is None:
+            pooled = self._acquire()
+            self._local.pooled = pooled
+            weakref.finalize(threading.current_thread(), self._release, pooled)
+            with self._lock:
+                self.thread_bindings += 1
+        return pooled.client
+
+    def http_clients(self) -> List[httpx.Client]:
+        """Clientes httpx creados hasta el momento"""
+        with self._lock:
+            return [pooled.http_client for pooled in self._clients]
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve métricas del pool"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "clients": len(self._clients),
+                "active_leases": sum(pooled.leases for pooled in self._clients),
+                "busy_clients": sum(1 for pooled in self._clients if pooled.leases),
+                "checkouts": self.checkouts,
+                "shared_checkouts": self.shared_checkouts,
+                "thread_bindings": self.thread_bindings,
+                "max_connections_per_client": self.limits.max_connections,
+            }
+
+    def close(self):
+        """Cierra todas las conexiones abiertas"""
+        with self._lock:
+            for pooled in self._clients:
+                pooled.http_client.close()
+            self._clients.clear()
+
+
+def create_client_pool(on_create: Optional[Callable[[httpx.Client], None]] = None,
+                       key: Optional[str] = None) -> ClientPool:
+    """Crea el pool de clientes con la configuración de la aplicación (``key`` sustituye a SUPABASE_KEY)"""
+    return ClientPool(
+        config.SUPABASE_URL,
+        key or config.SUPABASE_KEY,
+        size=config.DB_POOL_SIZE,
+        max_connections=config.DB_POOL_MAX_CONNECTIONS,
+        max_keepalive=config.DB_POOL_MAX_KEEPALIVE,
+        keepalive_expiry=config.DB_POOL_KEEPALIVE_EXPIRY,
+        timeout=config.DB_POOL_TIMEOUT,
+        on_create=on_create,
+    )
@@ -0,0 +1,278 @@
+"""
+Telemetría de consultas: tiempos, filas, bytes y registro de consultas lentas
+"""
+import functools
+import threading
+import time
+import types
+from collections import deque
+from datetime import datetime
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import config.config as config
+
+# Límites superiores (ms) de los cubos del histograma; el último cubo es "> 5000"
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_active = threading.local()
+
+
+class _CallFrame:
+    """Acumula lo que ocurre en HTTP mientras un método está en ejecución"""
+
+    __slots__ = ("method", "requests", "bytes", "filters", "failed")
+
+    def __init__(self, method: str):
+        self.method = method
+        self.requests = 0
+        self.bytes = 0
+        self.filters: List[str] = []
+        self.failed = False
+
+
+def _frames() -> List[_CallFrame]:
+    """Pila de llamadas instrumentadas activas en el hilo actual"""
+    if not hasattr(_active, "frames"):
+        _active.frames = []
+    return _active.frames
+
+
+def _count_rows(result: Any) -> int:
+    """Estima las filas devueltas por un método a partir de su resultado"""
+    if result is None or isinstance(result, bool):
+        return 0
+    if isinstance(result, (list, tuple, dict, set)):
+        return len(result)
+    return 1
+
+
+class _MethodStats:
+    """Métricas acumuladas y ventana deslizante de tiempos de un método"""
+
+    def __init__(self, window_size: int):
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.bytes = 0
+        self.requests = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent: Deque[float] = deque(maxlen=window_size)
+
+
+class QueryTelemetry:
+    """
+    Registro de latencia por método de SupabaseDB.
+
+    Guarda contadores acumulados y una ventana deslizante de tiempos por
+    método (de la que salen percentiles e histograma). Las llamadas que
+    superan ``slow_threshold_ms`` se añaden al registro de consultas lentas
+    junto con los filtros PostgREST de las peticiones que hicieron.
+    """
+
+    def __init__(self, slow_threshold_ms: float = 500.0, window_size: int = 500,
+                 slow_log_size: int = 200, enabled: bool = True):
+        """Inicializa la telemetría con el umbral de consulta lenta y el tamaño de ventana"""
+        self.slow_threshold_ms = slow_threshold_ms
+        self.window_size = window_size
+        self.enabled = enabled
+        self._methods: Dict[str, _MethodStats] = {}
+        self._slow_log: Deque[Dict[str, Any]] = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    # ---------- captura ----------
+
+    def attach(self, http_client):
+        """Engancha la telemetría a un cliente httpx para medir bytes y filtros"""
+        hooks = http_client.event_hooks
+        if self._on_response not in hooks.get("response", []):
+            hooks["response"] = list(hooks.get("response", [])) + [self._on_response]
+            http_client.event_hooks = hooks
+
+    def _on_response(self, response):
+        """Hook de httpx: atribuye la respuesta a las llamadas activas del hilo"""
+        frames = _frames()
+        if not frames:
+            return
+        response.read()
+        size = len(response.content)
+        request = response.request
+        query = request.url.query.decode() if isinstance(request.url.query, bytes) else str(request.url.query)
+        summary = f"{request.method} {request.url.path}" + (f"?{query[:300]}" if query else "")
+        for frame in frames:
+            frame.requests += 1
+            frame.bytes += size
+            frame.failed = frame.failed or response.status_code >= 400
+            if len(frame.filters) < 10:
+                frame.filters.append(summary)
+
+    def record(self, method: str, elapsed_ms: float, rows: int, frame: _CallFrame, error: bool = False):
+        """Registra una llamada terminada"""
+        # Los métodos de SupabaseDB capturan sus excepciones: un 4xx/5xx también cuenta como error
+        error = error or frame.failed
+        with self._lock:
+            stats = self._methods.get(method)
+            if stats is None:
+                stats = self._methods[method] = _MethodStats(self.window_size)
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.rows += rows
+            stats.bytes += frame.bytes
+            stats.requests += frame.requests
+            stats.total_ms += elapsed_ms
+            stats.max_ms = max(stats.max_ms, elapsed_ms)
+            stats.recent.append(elapsed_ms)
+
+            if elapsed_ms >= self.slow_threshold_ms:
+                entry = {
+                    "timestamp": datetime.now().isoformat(timespec="seconds"),
+                    "method": method,
+                    "elapsed_ms": round(elapsed_ms, 1),
+                    "rows": rows,
+                    "bytes": frame.bytes,
+                    "requests": frame.requests,
+                    "filters": " | ".join(frame.filters),
+                }
+                self._slow_log.append(entry)
+
+    def wrap(self, method_name: str, func: Callable) -> Callable:
+        """Devuelve ``func`` instrumentado; los iteradores se miden hasta agotarse"""
+        telemetry = self
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not telemetry.enabled:
+                return func(*args, **kwargs)
+            frame = _CallFrame(method_name)
+            frames = _frames()
+            frames.append(frame)
+            start = time.perf_counter()
+            error = False
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                error = True
+                raise
+            finally:
+                frames.remove(frame)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                if error:
+                    telemetry.record(method_name, elapsed_ms, 0, frame, error=True)
+            if isinstance(result, types.GeneratorType):
+                return telemetry._wrap_generator(method_name, result, frame, elapsed_ms)
+            telemetry.record(method_name, elapsed_ms, _count_rows(result), frame)
+            return result
+
+        return wrapper
+
+    def _wrap_generator(self, method_name: str, generator, frame: _CallFrame, elapsed_ms: float):
+        """Mide un generador: tiempo activo dentro de next() y filas producidas"""
+        rows = 0
+        frames = _frames()
+        try:
+            while True:
+                frames.append(frame)
+                start = time.perf_counter()
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed_ms += (time.perf_counter() - start) * 1000
+                    frames.remove(frame)
+                rows += 1
+                yield item
+        finally:
+            generator.close()
+            self.record(method_name, elapsed_ms, rows, frame)
+
+    # ---------- consulta ----------
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """Devuelve métricas por método, ordenadas por tiempo total descendente"""
+        with self._lock:
+            items = [(name, stats, sorted(stats.recent)) for name, stats in self._methods.items()]
+        rows = []
+        for name, stats, recent in items:
+            rows.append({
+                "method": name,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "rows": stats.rows,
+                "bytes": stats.bytes,
+                "requests": stats.requests,
+                "total_ms": round(stats.total_ms, 1),
+                "avg_ms": round(stats.total_ms / stats.calls, 1) if stats.calls else 0.0,
+                "p50_ms": round(_percentile(recent, 50), 1),
+                "p95_ms": round(_percentile(recent, 95), 1),
+                "p99_ms": round(_percentile(recent, 99), 1),
+                "max_ms": round(stats.max_ms, 1),
+            })
+        return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+    def histogram(self, method: Optional[str] = None) -> Dict[str, int]:
+        """Histograma de la ventana deslizante (de un método o de todos)"""
+        with self._lock:
+            if method:
+                samples = list(self._methods[method].recent) if method in self._methods else []
+            else:
+                samples = [value for stats in self._methods.values() for value in stats.recent]
+        labels = [f"≤{bound}" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}"]
+        counts = dict.fromkeys(labels, 0)
+        for value in samples:
+            for bound, label in zip(HISTOGRAM_BUCKETS_MS, labels):
+                if value <= bound:
+                    counts[label] += 1
+                    break
+            else:
+                counts[labels[-1]] += 1
+        return counts
+
+    def slow_queries(self) -> List[Dict[str, Any]]:
+        """Devuelve el registro de consultas lentas, de la más reciente a la más antigua"""
+        with self._lock:
+            return list(reversed(self._slow_log))
+
+    def reset(self):
+        """Borra todas las métricas y el registro de consultas lentas"""
+        with self._lock:
+            self._methods.clear()
+            self._slow_log.clear()
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def instrument_class(cls, telemetry: "QueryTelemetry", exclude=()):
+    """Instrumenta todos los métodos públicos de ``cls`` con ``telemetry``"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith("_") or name in exclude or not callable(attr):
+            continue
+        # Los métodos con lru_cache exponen cache_clear(), que se perdería al envolverlos
+        if hasattr(attr, "cache_clear"):
+            continue
+        setattr(cls, name, telemetry.wrap(name, attr))
+    return cls
+
+
+_telemetry: Optional[QueryTelemetry] = None
+_telemetry_lock = threading.Lock()
+
+
+def get_telemetry() -> QueryTelemetry:
+    """Obtiene la telemetría compartida por todas las sesiones"""
+    global _telemetry
+    with _telemetry_lock:
+        if _telemetry is None:
+            _telemetry = QueryTelemetry(
+                slow_threshold_ms=config.SLOW_QUERY_THRESHOLD_MS,
+                window_size=config.TELEMETRY_WINDOW_SIZE,
+                slow_log_size=config.SLOW_QUERY_LOG_SIZE,
+                enabled=config.TELEMETRY_ENABLED,
+            )
+        return _telemetry
@@ -0,0 +1,60 @@
+"""
+Job de mantenimiento de usage_stats, pensado para ejecutarse desde cron:
+crea las particiones mensuales que falten y resume los eventos antiguos
+
+Uso (desde ``src/``, con ``SUPABASE_SERVICE_KEY`` en el entorno):
+
+    python -m database.usage_rollup --older-than 90 --archive
+"""
+import argparse
+import sys
+from typing import List, Optional
+
+import config.config as config
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Punto de entrada de la línea de comandos"""
+    from database.database import SupabaseDB
+
+    parser = argparse.ArgumentParser(
+        description="Resume por día los eventos antiguos de usage_stats y los retira de la tabla"
+    )
+    parser.add_argument("--older-than", type=int, default=config.USAGE_STATS_RETENTION_DAYS,
+                        help="Días de eventos sueltos que se conservan (por defecto USAGE_STATS_RETENTION_DAYS)")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--archive", dest="archive", action="store_true", default=config.USAGE_STATS_ARCHIVE,
+                         help="Copia los eventos resumidos a usage_stats_archive antes de borrarlos")
+    archive.add_argument("--no-archive", dest="archive", action="store_false")
+    parser.add_argument("--months-ahead", type=int, default=config.PARTITION_MONTHS_AHEAD,
+                        help="Meses futuros con partición ya creada (por defecto PARTITION_MONTHS_AHEAD)")
+    args = parser.parse_args(argv)
+
+    if args.older_than < 1:
+        parser.error("--older-than debe ser al menos 1 día")
+    if not 0 <= args.months_ahead <= 24:
+        parser.error("--months-ahead debe estar entre 0 y 24")
+    if not config.SUPABASE_SERVICE_KEY:
+        print("Falta SUPABASE_SERVICE_KEY: las funciones de mantenimiento solo las ejecuta service_role",
+              file=sys.stderr)
+        return 1
+
+    db = SupabaseDB(key=config.SUPABASE_SERVICE_KEY)
+    created = db.ensure_partitions(months_ahead=args.months_ahead)
+    if created is None:
+        print("Error al crear las particiones mensuales", file=sys.stderr)
+    else:
+        print(f"Particiones creadas: {created}")
+
+    result = db.rollup_usage_stats(older_than_days=args.older_than, archive=args.archive)
+    db.stats_buffer.close()
+    if result is None:
+        print("Error al ejecutar el rollup de estadísticas de uso", file=sys.stderr)
+        return 1
+    print(f"Eventos resumidos: {result.get('moved_rows')} · filas de resumen: {result.get('summary_rows')} · "
+          f"marca de agua: {result.get('watermark')}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""
+Módulo de cálculo geográfico
+"""
+from .distance import EARTH_RADIUS_KM, PointIndex, haversine_km
+from .grid import GridIndex
+
+__all__ = ['EARTH_RADIUS_KM', 'GridIndex', 'PointIndex', 'haversine_km']
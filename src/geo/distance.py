@@ -0,0 +1,183 @@
+"""
+Distancias haversine vectorizadas con NumPy y búsqueda de los k puntos más cercanos
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Radio medio de la Tierra en km
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Distancia haversine en km entre pares de puntos en grados.
+
+    Acepta escalares o arrays y sigue las reglas de broadcasting de NumPy:
+    un punto contra un array de N puntos devuelve N distancias, y un array
+    columna (M, 1) contra N puntos devuelve una matriz (M, N).
+    """
+    lat1 = np.radians(np.asarray(lat1, dtype=np.float64))
+    lon1 = np.radians(np.asarray(lon1, dtype=np.float64))
+    lat2 = np.radians(np.asarray(lat2, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lon2, dtype=np.float64))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def _chord_to_km(chord_sq: np.ndarray) -> np.ndarray:
+    """
+    Convierte la cuerda al cuadrado entre puntos de la esfera unidad en km.
+
+    Es la misma fórmula haversine: ``a = sin²(Δφ/2) + cos φ1 cos φ2 sin²(Δλ/2)``
+    coincide con ``cuerda² / 4``.
+    """
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(chord_sq / 4, 0.0, 1.0)))
+
+
+def _km_to_chord_sq(distance_km: float) -> float:
+    """Inversa de ``_chord_to_km`` para convertir un radio en km en un umbral"""
+    half_angle = min(distance_km / (2 * EARTH_RADIUS_KM), np.pi / 2)
+    return float((2 * np.sin(half_angle)) ** 2)
+
+
+def _unit_vectors(latitudes, longitudes) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Coordenadas cartesianas en la esfera unidad de puntos en grados"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)
+
+
+class PointIndex:
+    """
+    Coordenadas de un conjunto de puntos en arrays float64 contiguos.
+
+    Cada punto se guarda como vector unitario (x, y, z), así la distancia a
+    un punto de consulta es una pasada vectorizada de restas y productos sin
+    trigonometría por punto: la cuerda al cuadrado equivale al término ``a``
+    de la fórmula haversine y es monótona con la distancia, de modo que se
+    ordena por ella y solo se convierte a km lo que se devuelve.
+    ``groups`` (opcional) asigna a cada punto una etiqueta, como la ciudad de
+    un POI, para restringir las búsquedas sin reconstruir el índice.
+    """
+
+    def __init__(self, ids: Sequence[str], latitudes: Sequence[float], longitudes: Sequence[float],
+                 groups: Optional[Sequence[Optional[str]]] = None):
+        """Crea el índice a partir de IDs y coordenadas en grados"""
+        self.ids: List[str] = list(ids)
+        x, y, z = _unit_vectors(latitudes, longitudes)
+        self._x = np.ascontiguousarray(x)
+        self._y = np.ascontiguousarray(y)
+        self._z = np.ascontiguousarray(z)
+        self.missing_ids: List[str] = []
+        self._group_codes: Dict[Optional[str], int] = {}
+        if groups is not None:
+            codes = [self._group_codes.setdefault(group, len(self._group_codes)) for group in groups]
+            self._groups = np.asarray(codes, dtype=np.int32)
+        else:
+            self._groups = None
+
+    @classmethod
+    def from_pois(cls, pois: Iterable[Dict], group_field: Optional[str] = "city_id") -> "PointIndex":
+        """
+        Construye el índice con los POIs que tienen coordenadas.
+
+        Los POIs sin latitud o longitud se omiten; ``missing_ids`` los lista.
+        """
+        ids, lats, lons, groups, missing = [], [], [], [], []
+        for poi in pois:
+            lat, lon = poi.get("latitude"), poi.get("longitude")
+            if lat is None or lon is None:
+                missing.append(poi.get("id"))
+                continue
+            ids.append(poi.get("id"))
+            lats.append(float(lat))
+            lons.append(float(lon))
+            groups.append(poi.get(group_field) if group_field else None)
+        index = cls(ids, lats, lons, groups if group_field else None)
+        index.missing_ids = missing
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _chord_sq(self, lat: float, lon: float, positions: Optional[np.ndarray] = None) -> np.ndarray:
+        """Cuerda al cuadrado de (lat, lon) a los puntos del índice (o a ``positions``)"""
+        qx, qy, qz = _unit_vectors(lat, lon)
+        if positions is None:
+            x, y, z = self._x, self._y, self._z
+        else:
+            x, y, z = self._x[positions], self._y[positions], self._z[positions]
+        return (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+
+    def distances_to(self, lat: float, lon: float) -> np.ndarray:
+        """Distancias en km de cada punto del índice a (lat, lon)"""
+        return _chord_to_km(self._chord_sq(lat, lon))
+
+    def distances_to_many(self, latitudes: Sequence[float], longitudes: Sequence[float]) -> np.ndarray:
+        """Matriz (M, N) de distancias en km de M puntos de consulta a los N del índice"""
+        qx, qy, qz = (component[:, None] for component in
+                      _unit_vectors(np.atleast_1d(latitudes), np.atleast_1d(longitudes)))
+        return _chord_to_km((self._x - qx) ** 2 + (self._y - qy) ** 2 + (self._z - qz) ** 2)
+
+    def group_positions(self, group: Optional[str],
+                        positions: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Posiciones de los puntos de ``group`` entre ``positions`` (entre todos si es None).
+
+        Si no hay que filtrar (sin ``group`` o índice sin grupos) devuelve
+        ``positions`` tal cual, None incluido.
+        """
+        if group is None or self._groups is None:
+            return positions
+        code = self._group_codes.get(group)
+        if code is None:
+            return np.empty(0, dtype=np.intp)
+        if positions is None:
+            return np.flatnonzero(self._groups == code)
+        return positions[self._groups[positions] == code]
+
+    def latitudes(self) -> np.ndarray:
+        """Latitudes en grados"""
+        return np.degrees(np.arcsin(np.clip(self._z, -1.0, 1.0)))
+
+    def longitudes(self) -> np.ndarray:
+        """Longitudes en grados"""
+        return np.degrees(np.arctan2(self._y, self._x))
+
+    def nearest(self, lat: float, lon: float, k: Optional[int] = None,
+                max_distance_km: Optional[float] = None,
+                group: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Posiciones y distancias (km) de los ``k`` puntos más cercanos a (lat, lon).
+
+        Recorre todos los puntos (o los de ``group``). Con ``k`` se usa
+        ``argpartition`` (O(N)) y solo se ordenan los k elegidos; sin ``k`` se
+        ordenan todos. ``max_distance_km`` descarta puntos antes de elegir.
+        Las posiciones indexan ``ids``.
+        """
+        return self.rank(lat, lon, self.group_positions(group), k, max_distance_km)
+
+    def rank(self, lat: float, lon: float, positions: Optional[np.ndarray] = None,
+             k: Optional[int] = None,
+             max_distance_km: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ordena ``positions`` (todos los puntos si es None) por distancia a (lat, lon).
+
+        Filtra por radio, elige los k más cercanos y los devuelve ordenados
+        con su distancia en km. Es el paso final de ``nearest``; otros índices
+        (como ``GridIndex``) lo usan sobre los candidatos que preseleccionan.
+        """
+        chord_sq = self._chord_sq(lat, lon, positions)
+        candidates = np.arange(len(self.ids)) if positions is None else positions
+        if max_distance_km is not None:
+            within = chord_sq <= _km_to_chord_sq(max_distance_km)
+            candidates, chord_sq = candidates[within], chord_sq[within]
+        if k is not None and k <= 0:
+            return candidates[:0], chord_sq[:0]
+        if k is not None and k < len(candidates):
+            top = np.argpartition(chord_sq, k - 1)[:k]
+            candidates, chord_sq = candidates[top], chord_sq[top]
+        order = np.argsort(chord_sq, kind="stable")
+        return candidates[order], _chord_to_km(chord_sq[order])
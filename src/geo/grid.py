@@ -0,0 +1,130 @@
+"""
+Índice espacial de rejilla (lat/lon) para consultas por radio y de k vecinos más cercanos
+"""
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .distance import EARTH_RADIUS_KM, PointIndex
+
+# Km por grado de arco sobre un círculo máximo
+KM_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_KM / 360
+
+
+class GridIndex:
+    """
+    Rejilla de celdas de ``cell_deg`` grados sobre un ``PointIndex``.
+
+    Los puntos se ordenan por celda (como un CSR: cada celda ocupada es un
+    tramo contiguo de ``_order``), de modo que una consulta por radio solo
+    calcula distancias a los puntos de las celdas que cubren el círculo y su
+    coste depende de los puntos cercanos, no del tamaño del catálogo. Las
+    consultas de k vecinos amplían el radio hasta tener k puntos dentro.
+    Si el círculo cubre más celdas de las que hay ocupadas (radios enormes,
+    polos) se recorre el ``PointIndex`` completo, que da el mismo resultado.
+    """
+
+    def __init__(self, points: PointIndex, cell_deg: float = 0.02):
+        """Reparte los puntos de ``points`` en celdas de ``cell_deg`` grados"""
+        self.points = points
+        self.cell_deg = cell_deg
+        self._lon_cells = int(math.ceil(360.0 / cell_deg))
+        keys = self._cell_keys(points.latitudes(), points.longitudes())
+        self._order = np.argsort(keys, kind="stable")
+        self._keys, self._starts, counts = np.unique(keys[self._order], return_index=True, return_counts=True)
+        self._ends = self._starts + counts
+        self.searches = 0
+        self.full_scans = 0
+
+    @property
+    def ids(self) -> List[str]:
+        """IDs de los puntos; las posiciones devueltas los indexan"""
+        return self.points.ids
+
+    @property
+    def missing_ids(self) -> List[str]:
+        """IDs omitidos por no tener coordenadas"""
+        return self.points.missing_ids
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def _cell_keys(self, latitudes, longitudes) -> np.ndarray:
+        """Clave entera de la celda de cada punto (fila de latitud * columnas + columna de longitud)"""
+        lat_cells = np.floor((np.asarray(latitudes, dtype=np.float64) + 90.0) / self.cell_deg).astype(np.int64)
+        lon_cells = np.floor((np.asarray(longitudes, dtype=np.float64) + 180.0) / self.cell_deg).astype(np.int64)
+        return lat_cells * self._lon_cells + lon_cells % self._lon_cells
+
+    def _candidates(self, lat: float, lon: float, radius_km: float) -> Optional[np.ndarray]:
+        """
+        Posiciones de los puntos de las celdas que cubren el círculo de ``radius_km``.
+
+        Usa la caja envolvente exacta del círculo sobre la esfera. Devuelve
+        None cuando compensa recorrer todos los puntos.
+        """
+        angular = radius_km / EARTH_RADIUS_KM
+        lat_min = lat - math.degrees(angular)
+        lat_max = lat + math.degrees(angular)
+        if lat_min <= -90.0 or lat_max >= 90.0:
+            return None
+        ratio = math.sin(angular) / math.cos(math.radians(lat))
+        if ratio >= 1.0:
+            return None
+        lon_span = math.degrees(math.asin(ratio))
+
+        lat_first = math.floor((lat_min + 90.0) / self.cell_deg)
+        lat_last = math.floor((lat_max + 90.0) / self.cell_deg)
+        lon_first = math.floor((lon - lon_span + 180.0) / self.cell_deg)
+        lon_last = math.floor((lon + lon_span + 180.0) / self.cell_deg)
+        lon_count = lon_last - lon_first + 1
+        if lon_count >= self._lon_cells or (lat_last - lat_first + 1) * lon_count > len(self._keys):
+            return None
+
+        lat_range = np.arange(lat_first, lat_last + 1, dtype=np.int64)
+        lon_range = np.arange(lon_first, lon_last + 1, dtype=np.int64) % self._lon_cells
+        wanted = (lat_range[:, None] * self._lon_cells + lon_range[None, :]).ravel()
+        slots = np.searchsorted(self._keys, wanted)
+        found = slots < len(self._keys)
+        slots, wanted = slots[found], wanted[found]
+        slots = slots[self._keys[slots] == wanted]
+        if not len(slots):
+            return self._order[:0]
+        return np.concatenate([self._order[self._starts[slot]:self._ends[slot]] for slot in slots])
+
+    def within(self, lat: float, lon: float, radius_km: float,
+               group: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Posiciones y distancias (km) de los puntos a menos de ``radius_km``, del más cercano al más lejano"""
+        return self.nearest(lat, lon, max_distance_km=radius_km, group=group)
+
+    def nearest(self, lat: float, lon: float, k: Optional[int] = None,
+                max_distance_km: Optional[float] = None,
+                group: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Misma semántica que ``PointIndex.nearest`` usando solo las celdas necesarias.
+
+        Sin ``max_distance_km`` el radio empieza en una celda y se duplica
+        hasta que dentro del círculo hay al menos ``k`` puntos: como el
+        círculo está cubierto por completo, esos k son los más cercanos.
+        """
+        self.searches += 1
+        if max_distance_km is None and k is None:
+            self.full_scans += 1
+            return self.points.nearest(lat, lon, group=group)
+
+        if k is not None and k <= 0:
+            return self.points.nearest(lat, lon, k=0)
+
+        radius = max_distance_km if max_distance_km is not None else self.cell_deg * KM_PER_DEGREE
+        while True:
+            candidates = self._candidates(lat, lon, radius)
+            if candidates is None:
+                self.full_scans += 1
+                return self.points.nearest(lat, lon, k=k, max_distance_km=max_distance_km, group=group)
+            candidates = self.points.group_positions(group, candidates)
+            if max_distance_km is not None:
+                return self.points.rank(lat, lon, candidates, k, max_distance_km)
+            positions, distances = self.points.rank(lat, lon, candidates, max_distance_km=radius)
+            if len(positions) >= k:
+                return positions[:k], distances[:k]
+            radius *= 2
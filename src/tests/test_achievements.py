@@ -0,0 +1,220 @@
+"""
+Pruebas del motor de logros por reglas (``database/achievements.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_achievements.py
+"""
+import pytest
+
+from database import achievements as achievements_module
+from database.achievements import AchievementTracker, get_session_achievements
+
+RULES = [
+    {"counter": "visits", "threshold": 3, "achievement_type": "explorador",
+     "achievement_name": "Tres Visitas", "points": 30},
+    {"counter": "visits", "threshold": 1, "achievement_type": "visitas",
+     "achievement_name": "Primera Visita", "points": 10},
+    {"counter": "cities", "threshold": 2, "achievement_type": "explorador",
+     "achievement_name": "Dos Ciudades", "points": 20},
+]
+
+
+class FakeProgress:
+    """Progreso «en la base de datos» y logros otorgados"""
+
+    def __init__(self, progress=None):
+        self.progress = progress if progress is not None else {}
+        self.loads = 0
+        self.awarded = []
+        self.fail_award = False
+
+    def load(self, user_id):
+        self.loads += 1
+        return None if self.progress is None else dict(self.progress)
+
+    def award(self, achievement):
+        self.awarded.append(achievement["achievement_name"])
+        if self.fail_award:
+            return None
+        return dict(achievement, id=f"a{len(self.awarded)}")
+
+
+def tracker_for(progress):
+    return AchievementTracker("u1", progress.load, progress.award, rules=RULES)
+
+
+def names(achievements):
+    return [achievement["achievement_name"] for achievement in achievements]
+
+
+def test_threshold_crossing_awards_once():
+    progress = FakeProgress()
+    tracker = tracker_for(progress)
+
+    assert names(tracker.record("visits")) == ["Primera Visita"]
+    assert tracker.record("visits") == []
+    awarded = tracker.record("visits")
+    assert names(awarded) == ["Tres Visitas"]
+    assert awarded[0]["user_id"] == "u1"
+    assert "counter" not in awarded[0] and "threshold" not in awarded[0]
+    assert tracker.record("visits") == []
+    assert progress.awarded == ["Primera Visita", "Tres Visitas"]
+    assert tracker.count("visits") == 4
+
+
+def test_crossing_several_thresholds_at_once_awards_in_order():
+    progress = FakeProgress({"visits": 2})
+    tracker = tracker_for(progress)
+
+    assert names(tracker.record("visits")) == ["Primera Visita", "Tres Visitas"]
+
+
+def test_distinct_cities_are_deduplicated():
+    progress = FakeProgress({"city_ids": ["lima"]})
+    tracker = tracker_for(progress)
+
+    assert tracker.record("cities", "lima") == []
+    assert tracker.record("cities") == []
+    assert tracker.count("cities") == 1
+    assert names(tracker.record("cities", "cusco")) == ["Dos Ciudades"]
+    assert tracker.record("cities", "cusco") == []
+    assert tracker.count("cities") == 2
+
+
+def test_already_earned_names_are_skipped():
+    progress = FakeProgress({"visits": 5, "earned": ["Primera Visita"]})
+    tracker = tracker_for(progress)
+
+    assert names(tracker.record("visits")) == ["Tres Visitas"]
+    assert progress.awarded == ["Tres Visitas"]
+    assert tracker.has("Primera Visita") and tracker.has("Tres Visitas")
+
+
+def test_failed_award_is_not_retried_until_reload():
+    progress = FakeProgress()
+    progress.fail_award = True
+    tracker = tracker_for(progress)
+
+    assert tracker.record("visits") == []
+    assert tracker.record("visits") == []
+    assert progress.awarded == ["Primera Visita"]
+
+    # La siguiente carga lo vuelve a evaluar con lo que haya en la base de datos
+    progress.fail_award = False
+    progress.progress = {"visits": 2}
+    assert tracker.load()
+    assert names(tracker.record("visits")) == ["Primera Visita", "Tres Visitas"]
+
+
+def test_reload_replaces_counts_instead_of_adding():
+    progress = FakeProgress({"visits": 1, "city_ids": ["lima"], "earned": ["Primera Visita"]})
+    tracker = tracker_for(progress)
+    tracker.record("visits")
+    tracker.record("cities", "cusco")
+    assert tracker.count("visits") == 2
+
+    # La base de datos ya incluye los eventos registrados en la sesión
+    progress.progress = {"visits": 2, "city_ids": ["lima", "cusco"], "earned": ["Primera Visita", "Dos Ciudades"]}
+    assert tracker.load()
+    assert tracker.count("visits") == 2
+    assert tracker.count("cities") == 2
+    assert progress.loads == 2
+
+
+def test_unloaded_tracker_ignores_events():
+    progress = FakeProgress()
+    progress.progress = None  # la lectura falla
+    tracker = tracker_for(progress)
+
+    assert not tracker.loaded and tracker.is_stale()
+    assert tracker.record("visits") == []
+    assert progress.awarded == []
+
+    progress.progress = {"visits": 0}
+    assert tracker.load()
+    assert tracker.count("visits") == 0
+    assert not tracker.is_stale()
+
+
+@pytest.mark.parametrize("counter", ["reviews", "bookings"])
+def test_counters_without_rules_just_count(counter):
+    tracker = tracker_for(FakeProgress())
+    assert tracker.record(counter) == []
+    assert tracker.count(counter) == 1
+
+
+class FakeSessionState(dict):
+    """``st.session_state`` mínimo: dict con acceso por atributo"""
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+class FakeAchievementsDB:
+    def __init__(self, progress):
+        self.progress = progress
+
+    def get_achievement_progress(self, user_id):
+        return self.progress.load(user_id)
+
+    def create_achievement(self, achievement):
+        return self.progress.award(achievement)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    state = FakeSessionState()
+    monkeypatch.setattr(achievements_module.st, "session_state", state)
+    monkeypatch.setattr(achievements_module.config, "ACHIEVEMENT_RULES", RULES)
+    return state
+
+
+def test_lazy_load_after_saving_does_not_count_the_event_twice(session):
+    # La primera visita ya está guardada cuando se crea el motor
+    progress = FakeProgress({"visits": 1, "city_ids": ["lima"]})
+    db = FakeAchievementsDB(progress)
+
+    tracker = get_session_achievements(db, "u1", refresh=False)
+    awarded = tracker.record("visits") + tracker.record("reviews") + tracker.record("cities", "lima")
+    assert names(awarded) == ["Primera Visita"]
+    assert tracker.count("visits") == 1
+    assert tracker.count("cities") == 1
+
+    # El siguiente evento sí se suma, incluido el de un contador que no se registró antes
+    progress.progress = {"visits": 3, "city_ids": ["lima"]}
+    tracker = get_session_achievements(db, "u1", refresh=False)
+    assert tracker.record("visits") == []
+    assert tracker.count("visits") == 2
+    assert names(tracker.record("cities", "cusco")) == ["Dos Ciudades"]
+    assert progress.loads == 1
+
+
+def test_tracker_loaded_before_saving_counts_the_event(session):
+    progress = FakeProgress({"visits": 0})
+    db = FakeAchievementsDB(progress)
+
+    get_session_achievements(db, "u1")
+    tracker = get_session_achievements(db, "u1", refresh=False)
+    assert names(tracker.record("visits")) == ["Primera Visita"]
+    assert tracker.count("visits") == 1
+    assert progress.loads == 1
+
+
+def test_failed_lazy_load_ignores_the_event(session):
+    progress = FakeProgress()
+    progress.progress = None
+    db = FakeAchievementsDB(progress)
+
+    tracker = get_session_achievements(db, "u1", refresh=False)
+    assert tracker.record("visits") == []
+
+    # La recarga al mostrar la página ya trae el evento de la base de datos
+    progress.progress = {"visits": 1}
+    tracker = get_session_achievements(db, "u1")
+    assert tracker.count("visits") == 1
+    assert names(tracker.record("visits")) == ["Primera Visita"]
+    assert tracker.count("visits") == 2
@@ -0,0 +1,189 @@
+"""
+Pruebas de la lectura y validación de la importación masiva (``database/bulk_import.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_bulk_import.py
+"""
+import json
+
+import pytest
+
+import config.config as config
+from database.bulk_import import read_import_file, validate_cities, validate_pois
+from database.database import SupabaseDB
+
+LIMA_ID = "0b6a3c2e-8f1d-4c3a-9a55-2f0d7c1e4b10"
+CUSCO_ID = "5d2e9f41-7c6b-4e8a-b3d2-1a9f0e8c7d65"
+
+
+class FakeUpsertClient:
+    """Cliente Supabase mínimo que anota cada upsert; falla si el grupo trae ``fail_column``"""
+
+    def __init__(self, fail_column=None):
+        self.upserts = []
+        self.fail_column = fail_column
+
+    def table(self, name):
+        self.current_table = name
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self.upserts.append((self.current_table, [dict(row) for row in rows], kwargs["on_conflict"]))
+        self.pending = rows
+        return self
+
+    def execute(self):
+        if self.fail_column and self.fail_column in self.pending[0]:
+            raise RuntimeError("lote rechazado")
+
+
+class FakePool:
+    def __init__(self, client):
+        self.client = client
+
+    def client_for_thread(self):
+        return self.client
+
+
+def upsert_db(client):
+    db = object.__new__(SupabaseDB)
+    db.pool = FakePool(client)
+    db.refresh_caches = lambda: None
+    return db
+
+
+def poi(**fields):
+    """Fila de POI válida con los campos indicados sustituidos"""
+    row = {"city_id": LIMA_ID, "name": "Huaca Pucllana", "latitude": "-12.11", "longitude": "-77.03"}
+    row.update(fields)
+    return row
+
+
+def test_read_csv_turns_empty_cells_into_none():
+    content = "name,country,price\nLima,Perú,\nCusco,Perú,10\n".encode("utf-8-sig")
+    rows = read_import_file("ciudades.CSV", content)
+    assert rows == [
+        {"name": "Lima", "country": "Perú", "price": None},
+        {"name": "Cusco", "country": "Perú", "price": "10"},
+    ]
+
+
+def test_read_json_list_and_items():
+    items = [{"name": "Lima"}, "no es un objeto", {"name": "Cusco"}]
+    assert read_import_file("a.json", json.dumps(items).encode()) == [{"name": "Lima"}, {"name": "Cusco"}]
+    wrapped = json.dumps({"items": items}).encode()
+    assert read_import_file("a.json", wrapped) == [{"name": "Lima"}, {"name": "Cusco"}]
+
+
+def test_read_json_rejects_other_shapes():
+    with pytest.raises(ValueError):
+        read_import_file("a.json", b'"Lima"')
+
+
+def test_validate_cities_reports_rows():
+    rows = [
+        {"name": "Lima", "country": "Perú", "price": "5", "is_active": "sí"},
+        {"name": "Cusco"},
+        {"name": "Arequipa", "country": "Perú", "country_code": "PER"},
+        {"name": "lima", "country": "perú"},
+        {"name": "Puno", "country": "Perú", "is_active": "quizás"},
+        {"name": "Tacna", "country": "Perú", "price": "gratis"},
+    ]
+    valid, errors = validate_cities(rows)
+
+    assert valid == [{"name": "Lima", "country": "Perú", "price": 5.0, "is_active": True}]
+    assert [error["fila"] for error in errors] == [2, 3, 4, 5, 6]
+    assert "country" in errors[0]["error"]
+    assert "quizás" in errors[3]["error"]
+
+
+@pytest.mark.parametrize("value,expected", [("Sí", True), ("x", True), ("0", False), ("No", False)])
+def test_is_active_accepts_known_values(value, expected):
+    valid, errors = validate_cities([{"name": "Lima", "country": "Perú", "is_active": value}])
+    assert not errors
+    assert valid[0]["is_active"] is expected
+
+
+def test_validate_pois_checks_city_id():
+    rows = [
+        poi(),
+        poi(city_id="lima", name="Parque"),
+        poi(city_id=CUSCO_ID, name="Sacsayhuamán"),
+        poi(city_id=LIMA_ID.upper(), name="Catedral"),
+    ]
+    valid, errors = validate_pois(rows, known_city_ids=[LIMA_ID])
+
+    assert [row["name"] for row in valid] == ["Huaca Pucllana", "Catedral"]
+    assert valid[1]["city_id"] == LIMA_ID
+    assert errors == [
+        {"fila": 2, "error": "city_id no válido: lima"},
+        {"fila": 3, "error": f"Ciudad desconocida: {CUSCO_ID}"},
+    ]
+
+
+def test_validate_pois_resolves_city_names():
+    rows = [poi(city_id=None, city=" Lima "), poi(city_id=None, city="Trujillo", name="Chan Chan")]
+    valid, errors = validate_pois(rows, {"lima": LIMA_ID}, known_city_ids=[LIMA_ID])
+
+    assert valid[0]["city_id"] == LIMA_ID
+    assert "city" not in valid[0]
+    assert errors == [{"fila": 2, "error": "Ciudad desconocida: Trujillo"}]
+
+
+def test_validate_pois_rules():
+    rows = [
+        poi(category=config.POI_CATEGORIES[0], visit_duration="90.0", is_active="false"),
+        poi(name="Sin categoría", category="Inventada"),
+        poi(name="Difícil", difficulty_level="Extremo"),
+        poi(name="Polo", latitude="95"),
+        poi(name="Sin longitud", longitude=None),
+        poi(name="HUACA PUCLLANA"),
+        poi(name="Activo", is_active="maybe"),
+    ]
+    valid, errors = validate_pois(rows)
+
+    assert len(valid) == 1
+    assert valid[0]["visit_duration"] == 90
+    assert valid[0]["is_active"] is False
+    assert [error["fila"] for error in errors] == [2, 3, 4, 5, 6, 7]
+    assert "longitude" in errors[3]["error"]
+    assert errors[5]["error"].startswith("Valor no válido")
+
+
+def test_bulk_upsert_groups_rows_by_columns():
+    client = FakeUpsertClient()
+    rows = [
+        {"name": "Lima", "country": "Perú", "description": "Capital"},
+        {"name": "Cusco", "country": "Perú"},
+        {"name": "Puno", "country": "Perú", "description": "Lago"},
+        {"country": "Perú", "name": "Tacna"},
+        {"name": "Ica", "country": "Perú", "is_active": False},
+    ]
+    progress = []
+    result = upsert_db(client)._bulk_upsert("cities", rows, "name,country", batch_size=4,
+                                            progress=lambda done, total: progress.append((done, total)))
+
+    assert result == {"written": 5, "failed": 0, "errors": []}
+    # Cada upsert lleva las mismas columnas en todas sus filas, así una celda
+    # vacía no pisa con el valor por defecto la columna de un registro existente
+    assert [[row["name"] for row in group] for _, group, _ in client.upserts] == [
+        ["Lima", "Puno"], ["Cusco", "Tacna"], ["Ica"],
+    ]
+    for table, group, on_conflict in client.upserts:
+        assert (table, on_conflict) == ("cities", "name,country")
+        assert len({tuple(sorted(row)) for row in group}) == 1
+    assert progress == [(4, 5), (5, 5)]
+
+
+def test_bulk_upsert_counts_failed_groups():
+    client = FakeUpsertClient(fail_column="description")
+    rows = [
+        {"name": "Lima", "country": "Perú", "description": "Capital"},
+        {"name": "Cusco", "country": "Perú"},
+        {"name": "Puno", "country": "Perú", "description": "Lago"},
+    ]
+    result = upsert_db(client)._bulk_upsert("cities", rows, "name,country", batch_size=10)
+
+    assert (result["written"], result["failed"]) == (1, 2)
+    assert result["errors"] == [{"fila": "1-3", "error": "Error al guardar el lote: lote rechazado"}]
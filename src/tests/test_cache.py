@@ -0,0 +1,123 @@
+"""
+Pruebas de la caché de lectura compartida (``database/cache.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_cache.py
+"""
+import pytest
+
+from database import cache as cache_module
+from database.cache import TTLCache
+from database.database import SupabaseDB
+
+
+class FakeClock:
+    """Sustituye a ``time.monotonic`` para avanzar el tiempo a mano"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(cache_module.time, "monotonic", fake)
+    return fake
+
+
+def counting_loader(values):
+    """Loader que devuelve ``values`` y cuenta sus llamadas"""
+    def load():
+        load.calls += 1
+        return values
+    load.calls = 0
+    return load
+
+
+def test_hit_until_ttl_expires(clock):
+    cache = TTLCache(default_ttl=10, ttls={"corto": 1})
+    load = counting_loader(["a"])
+
+    assert cache.get_or_load("general", "k", load) == ["a"]
+    clock.now += 9.9
+    assert cache.get_or_load("general", "k", load) == ["a"]
+    assert load.calls == 1
+
+    clock.now += 0.2
+    cache.get_or_load("general", "k", load)
+    assert load.calls == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_ttl_per_namespace(clock):
+    cache = TTLCache(default_ttl=10, ttls={"corto": 1, "sin_cache": 0})
+    load = counting_loader(["a"])
+
+    cache.get_or_load("corto", "k", load)
+    clock.now += 1.5
+    cache.get_or_load("corto", "k", load)
+    assert load.calls == 2
+
+    cache.get_or_load("sin_cache", "k", load)
+    cache.get_or_load("sin_cache", "k", load)
+    assert load.calls == 4
+    assert cache.stats()["entries"] == 1
+
+
+def test_loader_errors_are_not_cached(clock):
+    cache = TTLCache()
+
+    def failing():
+        raise RuntimeError("sin red")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("general", "k", failing)
+    assert cache.stats()["entries"] == 0
+    assert cache.get_or_load("general", "k", lambda: ["ok"]) == ["ok"]
+
+
+def test_lru_eviction_keeps_recently_used(clock):
+    cache = TTLCache(max_entries=2)
+    cache.set("general", "a", 1)
+    cache.set("general", "b", 2)
+    # Leer "a" la convierte en la más reciente: la expulsada es "b"
+    assert cache.get_or_load("general", "a", lambda: None) == 1
+    cache.set("general", "c", 3)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get_or_load("general", "a", lambda: "recargado") == 1
+    assert cache.get_or_load("general", "c", lambda: "recargado") == 3
+    assert cache.get_or_load("general", "b", lambda: "recargado") == "recargado"
+
+
+def test_invalidate_by_namespace(clock):
+    cache = TTLCache()
+    cache.set("ciudades", 1, "c1")
+    cache.set("ciudades", 2, "c2")
+    cache.set("pois", 1, "p1")
+    cache.set("metricas", 1, "m1")
+
+    cache.invalidate("ciudades", "pois")
+    assert cache.stats()["entries"] == 1
+    assert cache.get_or_load("metricas", 1, lambda: "recargado") == "m1"
+    assert cache.get_or_load("ciudades", 1, lambda: "recargado") == "recargado"
+
+    cache.invalidate()
+    assert cache.stats()["entries"] == 0
+
+
+def test_cached_rows_are_copies(clock):
+    db = object.__new__(SupabaseDB)
+    db.cache = TTLCache()
+
+    rows = db._cached("pois", "todos", lambda: [{"id": "p1", "name": "Museo"}])
+    rows[0]["distance"] = 1.5
+    rows.append({"id": "p2"})
+
+    again = db._cached("pois", "todos", lambda: [])
+    assert again == [{"id": "p1", "name": "Museo"}]
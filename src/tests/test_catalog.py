@@ -0,0 +1,198 @@
+"""
+Pruebas de la réplica local del catálogo (``database/catalog.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_catalog.py
+"""
+import itertools
+from datetime import datetime
+
+import pytest
+
+from database.catalog import CatalogReplica
+
+CITIES = [
+    {"id": "c1", "name": "Lima", "updated_at": "2024-05-01T10:00:00+00:00"},
+    {"id": "c2", "name": "Cusco", "updated_at": "2024-05-01T11:00:00+00:00"},
+]
+
+POIS = [
+    {"id": "p1", "name": "Museo", "city_id": "c1", "category": "museo", "is_active": True,
+     "latitude": -12.05, "longitude": -77.04, "updated_at": "2024-05-02T09:00:00+00:00"},
+    {"id": "p2", "name": "Catedral", "city_id": "c1", "category": "iglesia", "is_active": True,
+     "latitude": -12.046, "longitude": -77.03, "updated_at": "2024-05-02T09:00:03+00:00"},
+    {"id": "p3", "name": "Barranco", "city_id": "c1", "category": "barrio", "is_active": False,
+     "latitude": -12.14, "longitude": -77.02, "updated_at": "2024-05-02T08:00:00+00:00"},
+    {"id": "p4", "name": "Sacsayhuaman", "city_id": "c2", "category": "museo", "is_active": True,
+     "latitude": -13.51, "longitude": -71.98, "updated_at": "2024-05-02T07:00:00+00:00"},
+    {"id": "p5", "name": "Qorikancha", "city_id": "c2", "category": "iglesia", "is_active": True,
+     "latitude": None, "longitude": None, "updated_at": "2024-05-02T06:00:00+00:00"},
+]
+
+
+class FakeSource:
+    """Sustituye a ``_fetch_catalog_rows``: filtra por updated_at >= since y anota las lecturas"""
+
+    def __init__(self):
+        self.tables = {
+            "cities": {row["id"]: dict(row) for row in CITIES},
+            "points_of_interest": {row["id"]: dict(row) for row in POIS},
+        }
+        self.calls = []
+        self.error = None
+
+    def __call__(self, table, since):
+        self.calls.append((table, since))
+        if self.error:
+            raise self.error
+        rows = self.tables[table].values()
+        if since is not None:
+            rows = [row for row in rows if datetime.fromisoformat(row["updated_at"]) >= since]
+        return [dict(row) for row in rows]
+
+    def upsert(self, table, row):
+        self.tables[table][row["id"]] = dict(self.tables[table].get(row["id"], {}), **row)
+
+
+@pytest.fixture
+def source():
+    return FakeSource()
+
+
+@pytest.fixture
+def replica(source):
+    replica = CatalogReplica(source, poll_interval=3600, overlap_seconds=5,
+                             full_reload_interval=3600)
+    yield replica
+    replica.close()
+
+
+def stamp(value):
+    return datetime.fromisoformat(value)
+
+
+def test_full_load_then_delta_sync_with_overlap(replica, source):
+    replica.sync()
+    assert source.calls == [("cities", None), ("points_of_interest", None)]
+    assert replica.stats()["full_loads"] == 1
+    assert replica.stats()["watermarks"] == {
+        "cities": "2024-05-01T11:00:00+00:00",
+        "points_of_interest": "2024-05-02T09:00:03+00:00",
+    }
+
+    source.calls.clear()
+    replica.sync()
+    # La consulta incremental retrocede overlap_seconds sobre cada marca de agua
+    assert source.calls == [
+        ("cities", stamp("2024-05-01T10:59:55+00:00")),
+        ("points_of_interest", stamp("2024-05-02T08:59:58+00:00")),
+    ]
+    stats = replica.stats()
+    assert (stats["full_loads"], stats["delta_syncs"]) == (1, 1)
+    # Las filas releídas dentro del solape sin cambios no cuentan como aplicadas
+    assert stats["rows_applied"] == 0
+
+
+def test_delta_sync_picks_up_late_commit_inside_overlap(replica, source):
+    replica.sync()
+    # Fila confirmada tarde con un updated_at anterior a la marca de agua
+    source.upsert("points_of_interest", {"id": "p1", "name": "Museo de Arte",
+                                         "updated_at": "2024-05-02T09:00:01+00:00"})
+    replica.sync()
+
+    assert replica.stats()["rows_applied"] == 1
+    assert replica.stats()["watermarks"]["points_of_interest"] == "2024-05-02T09:00:03+00:00"
+    assert replica.pois_by_ids(["p1"])["p1"]["name"] == "Museo de Arte"
+
+
+def test_watermark_advances_with_newer_rows(replica, source):
+    replica.sync()
+    source.upsert("points_of_interest", {"id": "p4", "is_active": False,
+                                         "updated_at": "2024-05-03T12:00:00+00:00"})
+    source.upsert("cities", {"id": "c3", "name": "Arequipa", "updated_at": "2024-05-03T13:00:00+00:00"})
+    replica.sync()
+
+    assert replica.stats()["watermarks"] == {
+        "cities": "2024-05-03T13:00:00+00:00",
+        "points_of_interest": "2024-05-03T12:00:00+00:00",
+    }
+    assert source.calls[-1] == ("points_of_interest", stamp("2024-05-02T08:59:58+00:00"))
+    # Las filas desactivadas también llegan por la consulta incremental
+    assert [poi["id"] for poi in replica.pois(city_id="c2")] == ["p5"]
+    assert {city["id"] for city in replica.cities()} == {"c1", "c2", "c3"}
+
+    replica.sync()
+    assert source.calls[-1] == ("points_of_interest", stamp("2024-05-03T11:59:55+00:00"))
+
+
+def test_failed_sync_keeps_previous_state(replica, source):
+    replica.sync()
+    source.error = RuntimeError("sin conexión")
+    with pytest.raises(RuntimeError):
+        replica.reload()
+    source.error = None
+
+    assert len(replica.pois(is_active=False)) == len(POIS)
+    assert replica.stats()["full_loads"] == 1
+
+
+def test_discard_removes_deleted_rows(replica, source):
+    replica.sync()
+    replica.discard("points_of_interest", "p2")
+    replica.discard("points_of_interest", "no-existe")
+    replica.discard("tabla-desconocida", "p1")
+
+    assert "p2" not in replica.pois_by_ids(["p1", "p2"])
+    assert [poi["id"] for poi in replica.pois(city_id="c1")] == ["p1"]
+
+
+def expected_pois(city_id, category, is_active, limit, include_city):
+    """Resultado de la consulta original a PostgREST sobre los mismos datos"""
+    cities = {city["id"]: city for city in CITIES}
+    rows = [
+        dict(poi, cities=cities.get(poi["city_id"])) if include_city else dict(poi)
+        for poi in POIS
+        if (not is_active or poi["is_active"])
+        and (not city_id or poi["city_id"] == city_id)
+        and (not category or poi["category"] == category)
+    ]
+    rows.sort(key=lambda poi: poi["name"])
+    return rows[:limit] if limit else rows
+
+
+@pytest.mark.parametrize("city_id, category, is_active, limit, include_city", list(itertools.product(
+    (None, "c1", "c9"), (None, "iglesia"), (True, False), (None, 1), (True, False),
+)))
+def test_pois_filters_match_original_query(replica, city_id, category, is_active, limit, include_city):
+    result = replica.pois(city_id=city_id, category=category, is_active=is_active,
+                          limit=limit, include_city=include_city)
+    assert result == expected_pois(city_id, category, is_active, limit, include_city)
+
+
+def test_reads_return_copies(replica):
+    replica.pois()[0]["name"] = "cambiado"
+    replica.cities()[0]["name"] = "cambiado"
+    assert "cambiado" not in {poi["name"] for poi in replica.pois()}
+    assert "cambiado" not in {city["name"] for city in replica.cities()}
+
+
+def test_rebuild_resets_spatial_index(replica, source):
+    index = replica.spatial_index()
+    assert replica.spatial_index() is index
+    assert sorted(index.ids) == ["p1", "p2", "p4"]
+    assert index.missing_ids == ["p5"]
+
+    # Una sincronización sin cambios conserva el índice
+    replica.sync()
+    assert replica.spatial_index() is index
+
+    source.upsert("points_of_interest", {"id": "p5", "latitude": -13.52, "longitude": -71.97,
+                                         "updated_at": "2024-05-03T00:00:00+00:00"})
+    replica.sync()
+    rebuilt = replica.spatial_index()
+    assert rebuilt is not index
+    assert sorted(rebuilt.ids) == ["p1", "p2", "p4", "p5"]
+
+    replica.discard("points_of_interest", "p1")
+    assert "p1" not in replica.spatial_index().ids
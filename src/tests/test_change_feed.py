@@ -0,0 +1,150 @@
+"""
+Pruebas de la escucha de cambios del catálogo (LISTEN/NOTIFY)
+
+Crean una base de datos Postgres desechable con las tablas mínimas del
+catálogo, aplican ``migration_catalog_notify.sql`` y comprueban que un
+cambio en ``cities`` invalida las cachés de ``SupabaseDB`` a través de
+``ChangeFeedListener`` y que la escucha se recupera si se corta la conexión.
+
+Requieren psycopg y la variable ``TEST_DATABASE_URL`` (como
+``test_query_plans.py``). Se ejecutan desde ``src/``:
+
+    TEST_DATABASE_URL=postgresql://... python -m pytest tests/test_change_feed.py
+"""
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+psycopg = pytest.importorskip("psycopg")
+from psycopg import sql  # noqa: E402
+from psycopg.conninfo import make_conninfo  # noqa: E402
+
+from database.cache import TTLCache  # noqa: E402
+from database.change_feed import ChangeFeedListener  # noqa: E402
+from database.database import SupabaseDB  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+MIGRATION_FILE = Path(__file__).resolve().parent.parent / "database" / "migration_catalog_notify.sql"
+APPLICATION_NAME = "app_turismo_change_feed_test"
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL no está configurada")
+
+CATALOG_SQL = """
+CREATE TABLE cities (id UUID DEFAULT gen_random_uuid() PRIMARY KEY, name TEXT);
+CREATE TABLE points_of_interest (id UUID DEFAULT gen_random_uuid() PRIMARY KEY, name TEXT);
+"""
+
+
+class FakeCatalog:
+    """Réplica que solo anota las llamadas que recibe"""
+
+    def __init__(self):
+        self.full_loads = 1
+        self.reloads = 0
+        self.syncs = 0
+        self.discarded = []
+
+    def reload(self):
+        self.reloads += 1
+
+    def sync(self):
+        self.syncs += 1
+
+    def discard(self, table, row_id):
+        self.discarded.append((table, row_id))
+
+
+def wait_for(condition, timeout: float = 10.0) -> bool:
+    """Espera a que ``condition()`` sea cierta"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return condition()
+
+
+@pytest.fixture(scope="module")
+def feed_dsn():
+    """Crea una base de datos desechable con los triggers de notificación"""
+    name = f"app_turismo_feed_{uuid.uuid4().hex[:8]}"
+    try:
+        admin = psycopg.connect(TEST_DATABASE_URL, autocommit=True)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"No se puede conectar a TEST_DATABASE_URL: {e}")
+    with admin:
+        admin.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+        try:
+            dsn = make_conninfo(TEST_DATABASE_URL, dbname=name)
+            with psycopg.connect(dsn, autocommit=True) as conn:
+                conn.execute(CATALOG_SQL)
+                conn.execute(MIGRATION_FILE.read_text(encoding="utf-8"))
+            yield dsn
+        finally:
+            admin.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+
+
+@pytest.fixture
+def feed_db(feed_dsn):
+    """SupabaseDB mínimo conectado a un ChangeFeedListener real"""
+    db = object.__new__(SupabaseDB)
+    db.cache = TTLCache()
+    db.catalog = FakeCatalog()
+    batches = []
+    received = threading.Event()
+
+    def on_change(changes):
+        db._on_catalog_change(changes)
+        batches.append(changes)
+        received.set()
+
+    listener = ChangeFeedListener(
+        make_conninfo(feed_dsn, application_name=APPLICATION_NAME),
+        on_change=on_change,
+        batch_window=0.2,
+        reconnect_delay=0.1,
+    )
+    assert listener.start()
+    assert wait_for(lambda: listener.connected and db.catalog.reloads == 1), "la escucha no llegó a conectar"
+    yield db, listener, batches
+    listener.stop()
+
+
+def test_notify_invalidates_catalog_caches(feed_dsn, feed_db):
+    db, listener, batches = feed_db
+    db.cache.set("poi_categories", False, ["Museo"])
+    db.cache.set("leaderboard", ("top", 5), ["usuario"])
+
+    with psycopg.connect(feed_dsn, autocommit=True) as conn:
+        city_id = conn.execute("INSERT INTO cities (name) VALUES ('Lima') RETURNING id").fetchone()[0]
+        conn.execute("DELETE FROM cities WHERE id = %s", (city_id,))
+
+    assert wait_for(lambda: db.catalog.syncs >= 1 and db.catalog.discarded)
+    changes = [change for batch in batches if batch for change in batch]
+    assert {"table": "cities", "op": "INSERT", "id": str(city_id)} in changes
+    assert db.catalog.discarded == [("cities", str(city_id))]
+    # Solo se invalidan los espacios que dependen del catálogo
+    assert db.cache.get_or_load("poi_categories", False, lambda: "recargado") == "recargado"
+    assert db.cache.get_or_load("leaderboard", ("top", 5), lambda: "recargado") == ["usuario"]
+
+
+def test_listener_reconnects_and_resyncs(feed_dsn, feed_db):
+    db, listener, batches = feed_db
+
+    with psycopg.connect(feed_dsn, autocommit=True) as conn:
+        terminated = conn.execute(
+            "SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE application_name = %s",
+            (APPLICATION_NAME,),
+        ).fetchall()
+    assert terminated
+
+    # Tras reconectar se pide una recarga completa (on_change(None))
+    assert wait_for(lambda: listener.reconnects >= 1 and listener.connected and db.catalog.reloads >= 2)
+
+    with psycopg.connect(feed_dsn, autocommit=True) as conn:
+        conn.execute("INSERT INTO points_of_interest (name) VALUES ('Huaca')")
+    assert wait_for(lambda: any(batch and batch[0]["table"] == "points_of_interest" for batch in batches))
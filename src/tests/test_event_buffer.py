@@ -0,0 +1,168 @@
+"""
+Pruebas del buffer de estadísticas de uso (``database/event_buffer.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_event_buffer.py
+"""
+import threading
+import time
+
+import pytest
+
+from database.event_buffer import UsageStatsBuffer
+
+
+class FakeWriter:
+    """Sustituye a la inserción en la base de datos y guarda los lotes recibidos"""
+
+    def __init__(self, fail_batches=False, bad_ids=(), gate=None):
+        self.batches = []
+        self.fail_batches = fail_batches
+        self.bad_ids = set(bad_ids)
+        self.gate = gate
+        self.started = threading.Event()
+        self.written = threading.Event()
+        self.lock = threading.Lock()
+
+    def __call__(self, batch):
+        self.started.set()
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if self.fail_batches and len(batch) > 1:
+            raise RuntimeError("lote rechazado")
+        if any(row["id"] in self.bad_ids for row in batch):
+            raise RuntimeError("fila inválida")
+        with self.lock:
+            self.batches.append([row["id"] for row in batch])
+        self.written.set()
+
+    def rows(self):
+        with self.lock:
+            return [row_id for batch in self.batches for row_id in batch]
+
+
+def wait_until(condition, timeout=5.0):
+    """Espera activamente a que ``condition()`` sea cierta"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def make_buffer():
+    buffers = []
+
+    def make(writer, **kwargs):
+        buffer = UsageStatsBuffer(writer, **kwargs)
+        buffers.append(buffer)
+        return buffer
+
+    yield make
+    for buffer in buffers:
+        buffer.close()
+
+
+def test_flush_when_batch_size_is_reached(make_buffer):
+    writer = FakeWriter()
+    buffer = make_buffer(writer, batch_size=3, flush_interval=60)
+
+    buffer.enqueue({"id": 1})
+    buffer.enqueue({"id": 2})
+    time.sleep(0.1)
+    assert writer.batches == []
+
+    buffer.enqueue({"id": 3})
+    assert wait_until(lambda: writer.batches == [[1, 2, 3]])
+    assert wait_until(lambda: buffer.stats()["flushed"] == 3)
+    assert buffer.stats()["batches"] == 1
+
+
+def test_flush_after_interval(make_buffer):
+    writer = FakeWriter()
+    buffer = make_buffer(writer, batch_size=100, flush_interval=0.05)
+
+    buffer.enqueue({"id": 1})
+    assert writer.written.wait(timeout=5)
+    assert writer.batches == [[1]]
+    assert wait_until(lambda: buffer.stats()["queue_depth"] == 0)
+
+
+def test_drops_are_counted_when_queue_is_full(make_buffer):
+    writer = FakeWriter()
+    buffer = make_buffer(writer, batch_size=100, flush_interval=60, max_queue=2)
+
+    assert buffer.enqueue({"id": 1})
+    assert buffer.enqueue({"id": 2})
+    assert not buffer.enqueue({"id": 3})
+
+    stats = buffer.stats()
+    assert stats["enqueued"] == 2
+    assert stats["dropped"] == 1
+    assert stats["queue_depth"] == 2
+
+
+def test_failed_batch_is_retried_row_by_row(make_buffer):
+    writer = FakeWriter(fail_batches=True, bad_ids={2})
+    buffer = make_buffer(writer, batch_size=100, flush_interval=60)
+
+    for row_id in (1, 2, 3):
+        buffer.enqueue({"id": row_id})
+    buffer.flush()
+
+    assert writer.batches == [[1], [3]]
+    stats = buffer.stats()
+    assert stats["flushed"] == 2
+    assert stats["failed"] == 1
+    assert stats["batches"] == 1
+    assert stats["inflight"] == 0
+
+
+def test_pending_includes_inflight_rows(make_buffer):
+    gate = threading.Event()
+    writer = FakeWriter(gate=gate)
+    buffer = make_buffer(writer, batch_size=2, flush_interval=60)
+
+    buffer.enqueue({"id": 1, "user_id": "u1", "action_type": "view"})
+    buffer.enqueue({"id": 2, "user_id": "u2", "action_type": "view"})
+    assert writer.started.wait(timeout=5)
+    buffer.enqueue({"id": 3, "user_id": "u1", "action_type": "search"})
+
+    assert buffer.stats()["inflight"] == 2
+    assert [row["id"] for row in buffer.pending()] == [3, 2, 1]
+    assert [row["id"] for row in buffer.pending(user_id="u1")] == [3, 1]
+    assert [row["id"] for row in buffer.pending(action_type="view")] == [2, 1]
+
+    gate.set()
+    assert wait_until(lambda: buffer.stats()["inflight"] == 0)
+    assert [row["id"] for row in buffer.pending()] == [3]
+
+
+def test_enqueue_keeps_event_timestamp(make_buffer):
+    buffer = make_buffer(FakeWriter(), batch_size=100, flush_interval=60)
+
+    buffer.enqueue({"id": 1})
+    buffer.enqueue({"id": 2, "timestamp": "2024-01-01T00:00:00"})
+
+    rows = {row["id"]: row for row in buffer.pending()}
+    assert rows[1]["timestamp"]
+    assert rows[2]["timestamp"] == "2024-01-01T00:00:00"
+
+
+def test_close_drains_queue_and_rejects_new_rows(make_buffer):
+    writer = FakeWriter()
+    buffer = make_buffer(writer, batch_size=2, flush_interval=60)
+
+    for row_id in range(5):
+        buffer.enqueue({"id": row_id})
+    buffer.close()
+
+    assert sorted(writer.rows()) == [0, 1, 2, 3, 4]
+    assert buffer.pending() == []
+    assert not buffer.enqueue({"id": 5})
+    stats = buffer.stats()
+    assert stats["flushed"] == 5
+    assert stats["dropped"] == 1
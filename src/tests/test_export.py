@@ -0,0 +1,61 @@
+"""
+Pruebas de la exportación masiva (``database/export.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_export.py
+"""
+import csv
+import io
+from datetime import datetime
+
+from database.database import SupabaseDB
+from database.export import export_rows
+
+WATERMARK = datetime(2024, 3, 1)
+
+
+def export_db(tables):
+    """SupabaseDB mínimo que lee ``tables`` (tabla -> filas) y anota los filtros pedidos"""
+    db = object.__new__(SupabaseDB)
+    db.requests = []
+
+    def iter_keyset(table, select_clause, order_field, apply_filters=None, page_size=None,
+                    error_label="registros", raise_errors=False, ascending=False):
+        db.requests.append((table, raise_errors))
+        return iter([dict(row) for row in tables[table]])
+
+    db._iter_keyset = iter_keyset
+    db.get_usage_stats_watermark = lambda: WATERMARK
+    return db
+
+
+def test_usage_stats_export_includes_rollups():
+    db = export_db({
+        "usage_stats": [
+            {"id": "e1", "action_type": "poi_view", "timestamp": "2024-03-02T10:00:00", "device_type": "móvil"},
+        ],
+        "usage_stats_daily": [
+            {"id": "d1", "day": "2024-02-10", "action_type": "poi_view", "event_count": 7,
+             "total_duration_seconds": 300},
+        ],
+    })
+    output = io.BytesIO()
+    written = export_rows(db, "usage_stats", "csv", output, start_date=datetime(2024, 2, 1))
+
+    rows = list(csv.DictReader(io.StringIO(output.getvalue().decode("utf-8"))))
+    assert written == 2
+    assert [(row["id"], row["event_count"], row["is_rollup"]) for row in rows] == [
+        ("e1", "1", "False"),
+        ("d1", "7", "True"),
+    ]
+    assert rows[1]["timestamp"] == "2024-02-10T00:00:00"
+    assert db.requests == [("usage_stats", True), ("usage_stats_daily", True)]
+
+
+def test_usage_stats_export_after_watermark_skips_rollups():
+    db = export_db({"usage_stats": [{"id": "e1", "timestamp": "2024-03-02T10:00:00"}], "usage_stats_daily": []})
+    rows = list(db.iter_export_rows("usage_stats", start_date=datetime(2024, 3, 2)))
+
+    assert rows == [{"id": "e1", "timestamp": "2024-03-02T10:00:00", "event_count": 1, "is_rollup": False}]
+    assert db.requests == [("usage_stats", True)]
@@ -0,0 +1,150 @@
+"""
+Pruebas del conjunto de favoritos con actualización optimista (``database/favorites.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_favorites.py
+"""
+import pytest
+
+from database.favorites import FavoritesSet
+
+
+class QueuedExecutor:
+    """Ejecutor síncrono: guarda las tareas y las ejecuta en este hilo al llamar a ``run``"""
+
+    def __init__(self):
+        self.tasks = []
+
+    def submit(self, fn, *args):
+        self.tasks.append((fn, args))
+
+    def run(self, index=None):
+        """Ejecuta todas las tareas pendientes en orden (o solo la de ``index``)"""
+        if index is not None:
+            fn, args = self.tasks.pop(index)
+            fn(*args)
+            return
+        while self.tasks:
+            fn, args = self.tasks.pop(0)
+            fn(*args)
+
+
+class FakeStore:
+    """Favoritos «en la base de datos»: anota las escrituras y puede fallar"""
+
+    def __init__(self, ids=()):
+        self.ids = set(ids)
+        self.writes = []
+        self.results = []
+        self.on_write = None
+
+    def load_ids(self, user_id):
+        return set(self.ids)
+
+    def write(self, user_id, poi_id, favorite):
+        self.writes.append((poi_id, favorite))
+        if self.on_write:
+            self.on_write()
+        ok = self.results.pop(0) if self.results else True
+        if isinstance(ok, Exception):
+            raise ok
+        if ok:
+            (self.ids.add if favorite else self.ids.discard)(poi_id)
+        return ok
+
+
+@pytest.fixture
+def store():
+    return FakeStore({"museo"})
+
+
+@pytest.fixture
+def executor():
+    return QueuedExecutor()
+
+
+@pytest.fixture
+def favorites(store, executor):
+    return FavoritesSet("u1", store.load_ids, store.write, executor=executor)
+
+
+def test_initial_load_and_no_op_set(favorites, store, executor):
+    assert favorites.ids() == {"museo"}
+    favorites.add("museo")
+    favorites.remove("plaza")
+    assert not executor.tasks
+    assert store.writes == []
+
+
+def test_rapid_toggles_settle_on_last_state(favorites, store, executor):
+    assert favorites.toggle("plaza") is True
+    assert favorites.toggle("plaza") is False
+    assert favorites.toggle("plaza") is True
+    assert "plaza" in favorites
+
+    executor.run()
+    # Una sola escritura, con el estado del último clic
+    assert store.writes == [("plaza", True)]
+    assert store.ids == {"museo", "plaza"}
+    assert favorites.pop_failures() == []
+
+
+def test_failed_final_write_is_reverted(favorites, store, executor):
+    store.results = [False, RuntimeError("sin red")]
+    favorites.remove("museo")
+    favorites.add("plaza")
+    assert favorites.ids() == {"plaza"}
+
+    executor.run()
+    assert favorites.ids() == {"museo"}
+    assert favorites.pop_failures() == ["museo", "plaza"]
+    assert favorites.pop_failures() == []
+    assert favorites.failed_writes == 2
+
+
+def test_click_during_failed_write_wins(favorites, store, executor):
+    # Mientras se escribe el primer clic llega otro: el fallo ya no se deshace
+    store.results = [False, True]
+    store.on_write = lambda: (setattr(store, "on_write", None), favorites.toggle("plaza"))
+    favorites.add("plaza")
+
+    executor.run()
+    assert store.writes == [("plaza", True), ("plaza", False)]
+    assert "plaza" not in favorites
+    assert favorites.pop_failures() == []
+
+
+def test_refresh_replaces_ids_when_idle(favorites, store, executor):
+    store.ids = {"museo", "catedral"}
+    favorites.reconcile(force=True)
+    favorites.reconcile(force=True)
+    assert len(executor.tasks) == 1
+
+    executor.run()
+    assert favorites.ids() == {"museo", "catedral"}
+    assert favorites.reconciles == 1
+
+
+def test_refresh_discarded_while_writes_pending(favorites, store, executor):
+    store.ids = {"catedral"}
+    favorites.add("plaza")
+    favorites.reconcile(force=True)
+
+    # La relectura termina antes que la escritura pendiente: se descarta
+    executor.run(index=1)
+    assert favorites.ids() == {"museo", "plaza"}
+    assert favorites.reconciles == 0
+
+    executor.run()
+    assert store.writes == [("plaza", True)]
+    assert favorites.ids() == {"museo", "plaza"}
+
+
+def test_refresh_discarded_after_click_in_between(favorites, store, executor):
+    favorites.reconcile(force=True)
+    favorites.forget("museo")
+
+    executor.run()
+    assert favorites.ids() == set()
+    assert favorites.reconciles == 0
@@ -0,0 +1,205 @@
+"""
+Pruebas del cálculo geográfico (``geo/``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_geo.py
+"""
+import math
+
+import numpy as np
+import pytest
+
+from geo import EARTH_RADIUS_KM, GridIndex, PointIndex, haversine_km
+from views.recommendations_page import filter_by_distance
+
+
+def scalar_haversine(lat1, lon1, lat2, lon2):
+    """Fórmula haversine de referencia, punto a punto con ``math``"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def random_points(rng, n):
+    """Puntos uniformes sobre la esfera (latitud, longitud en grados)"""
+    return np.degrees(np.arcsin(rng.uniform(-1, 1, n))), rng.uniform(-180, 180, n)
+
+
+def test_haversine_matches_scalar_formula():
+    rng = np.random.default_rng(21)
+    lats, lons = random_points(rng, 200)
+    expected = [scalar_haversine(-12.05, -77.04, lat, lon) for lat, lon in zip(lats, lons)]
+    np.testing.assert_allclose(haversine_km(-12.05, -77.04, lats, lons), expected, rtol=1e-12, atol=1e-9)
+
+
+def test_haversine_broadcasting_and_known_distances():
+    # Lima - Cusco y un cuarto de meridiano
+    assert haversine_km(-12.0464, -77.0428, -13.5320, -71.9675) == pytest.approx(
+        scalar_haversine(-12.0464, -77.0428, -13.5320, -71.9675))
+    assert haversine_km(0, 0, 90, 0) == pytest.approx(math.pi / 2 * EARTH_RADIUS_KM)
+    assert haversine_km(0, 179.9, 0, -179.9) == pytest.approx(0.2 * math.pi / 180 * EARTH_RADIUS_KM)
+
+    matrix = haversine_km(np.array([[0.0], [10.0]]), np.array([[0.0], [10.0]]),
+                          np.array([0.0, 10.0, 20.0]), np.array([0.0, 10.0, 20.0]))
+    assert matrix.shape == (2, 3)
+    assert matrix[0, 0] == 0 and matrix[1, 1] == 0
+
+
+def test_point_index_distances_match_haversine():
+    rng = np.random.default_rng(7)
+    lats, lons = random_points(rng, 300)
+    index = PointIndex([f"p{i}" for i in range(300)], lats, lons)
+
+    np.testing.assert_allclose(index.distances_to(40.4, -3.7), haversine_km(40.4, -3.7, lats, lons),
+                               rtol=1e-9, atol=1e-6)
+    many = index.distances_to_many([40.4, -33.9], [-3.7, 151.2])
+    assert many.shape == (2, 300)
+    np.testing.assert_allclose(many[1], haversine_km(-33.9, 151.2, lats, lons), rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(index.latitudes(), lats, atol=1e-9)
+    np.testing.assert_allclose(index.longitudes(), lons, atol=1e-9)
+
+
+def test_point_index_from_pois_keeps_zero_and_groups():
+    pois = [
+        {"id": "ecuador", "latitude": 0.0, "longitude": 0.0, "city_id": "c1"},
+        {"id": "sin_coordenadas", "latitude": None, "longitude": 10.0, "city_id": "c1"},
+        {"id": "lima", "latitude": "-12.05", "longitude": "-77.04", "city_id": "c2"},
+        {"id": "cerca", "latitude": 0.1, "longitude": 0.0, "city_id": "c2"},
+    ]
+    index = PointIndex.from_pois(pois)
+
+    assert index.ids == ["ecuador", "lima", "cerca"]
+    assert index.missing_ids == ["sin_coordenadas"]
+    positions, _ = index.nearest(0.0, 0.0, group="c2")
+    assert [index.ids[p] for p in positions] == ["cerca", "lima"]
+    assert len(index.nearest(0.0, 0.0, group="otra")[0]) == 0
+
+
+@pytest.mark.parametrize("k", [1, 5, 37, 299, 300, 1000])
+def test_nearest_top_k_is_sorted_prefix_of_full_sort(k):
+    rng = np.random.default_rng(k)
+    lats, lons = random_points(rng, 300)
+    index = PointIndex([f"p{i}" for i in range(300)], lats, lons)
+    reference = haversine_km(48.85, 2.35, lats, lons)
+    expected_order = np.argsort(reference, kind="stable")
+
+    positions, distances = index.nearest(48.85, 2.35, k=k)
+
+    assert len(positions) == min(k, 300)
+    assert np.all(np.diff(distances) >= 0)
+    np.testing.assert_allclose(distances, reference[expected_order[:len(positions)]], rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(reference[positions], distances, rtol=1e-9, atol=1e-6)
+
+
+def test_nearest_radius_and_k_zero():
+    index = PointIndex(["a", "b", "c"], [0.0, 0.0, 0.0], [0.0, 1.0, 2.0])
+    positions, distances = index.nearest(0.0, 0.0, max_distance_km=150)
+    assert [index.ids[p] for p in positions] == ["a", "b"]
+    assert distances[1] == pytest.approx(scalar_haversine(0, 0, 0, 1))
+    assert len(index.nearest(0.0, 0.0, k=0)[0]) == 0
+
+
+def test_group_positions_and_rank_on_candidates():
+    index = PointIndex(["a", "b", "c", "d"], [0.0, 0.0, 0.0, 0.0], [3.0, 1.0, 2.0, 0.5],
+                       groups=["g1", "g2", "g1", "g1"])
+
+    assert index.group_positions(None) is None
+    assert list(index.group_positions("g1")) == [0, 2, 3]
+    assert list(index.group_positions("g1", np.array([1, 2, 3]))) == [2, 3]
+    assert len(index.group_positions("otra", np.array([0, 1]))) == 0
+
+    positions, distances = index.rank(0.0, 0.0, np.array([0, 1, 2]), k=2)
+    assert [index.ids[p] for p in positions] == ["b", "c"]
+    assert distances[0] == pytest.approx(scalar_haversine(0, 0, 0, 1))
+    positions, _ = index.rank(0.0, 0.0, max_distance_km=150)
+    assert [index.ids[p] for p in positions] == ["d", "b"]
+
+
+def clustered_index(rng, centers, per_center, spread_deg=0.3):
+    """PointIndex con ``per_center`` puntos alrededor de cada centro, agrupados por centro"""
+    lats, lons, groups = [], [], []
+    for number, (lat, lon) in enumerate(centers):
+        lats.append(np.clip(lat + rng.normal(0, spread_deg, per_center), -90, 90))
+        lons.append((lon + rng.normal(0, spread_deg, per_center) + 180) % 360 - 180)
+        groups += [f"g{number}"] * per_center
+    lats, lons = np.concatenate(lats), np.concatenate(lons)
+    return PointIndex([f"p{i}" for i in range(len(lats))], lats, lons, groups)
+
+
+def assert_same_result(grid_result, point_result):
+    """Mismas posiciones en el mismo orden y mismas distancias"""
+    grid_positions, grid_distances = grid_result
+    point_positions, point_distances = point_result
+    assert grid_positions.tolist() == point_positions.tolist()
+    np.testing.assert_allclose(grid_distances, point_distances, rtol=1e-12, atol=1e-9)
+
+
+# Lima, Madrid, Fiyi a ambos lados del antimeridiano, cerca del polo norte y del sur
+CENTERS = [(-12.05, -77.04), (40.42, -3.70), (-17.0, 179.9), (-17.0, -179.9), (89.7, 30.0), (-89.6, -120.0)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_grid_matches_point_index(seed):
+    rng = np.random.default_rng(seed)
+    points = clustered_index(rng, CENTERS, 150)
+    grid = GridIndex(points, cell_deg=0.05)
+
+    queries = [(lat, lon) for lat, lon in CENTERS] + [(-17.0, 180.0), (90.0, 0.0), (-90.0, 0.0)]
+    lats, lons = random_points(rng, 10)
+    queries += list(zip(lats, lons))
+    for lat, lon in queries:
+        for k in (1, 7, 150, 2000):
+            assert_same_result(grid.nearest(lat, lon, k=k), points.nearest(lat, lon, k=k))
+        for radius in (0.5, 25.0, 400.0, 25000.0):
+            assert_same_result(grid.within(lat, lon, radius), points.nearest(lat, lon, max_distance_km=radius))
+            assert_same_result(grid.nearest(lat, lon, k=5, max_distance_km=radius),
+                               points.nearest(lat, lon, k=5, max_distance_km=radius))
+    assert grid.full_scans < grid.searches
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_grid_groups_and_k_edge_cases(seed):
+    rng = np.random.default_rng(100 + seed)
+    points = clustered_index(rng, CENTERS, 40)
+    grid = GridIndex(points, cell_deg=0.02)
+
+    for number, (lat, lon) in enumerate(CENTERS):
+        group = f"g{number}"
+        # Más vecinos de los que tiene el grupo: se devuelven todos, ordenados
+        result = grid.nearest(lat, lon, k=100, group=group)
+        assert_same_result(result, points.nearest(lat, lon, k=100, group=group))
+        assert len(result[0]) == 40
+        assert_same_result(grid.nearest(lat, lon, k=3, group=group), points.nearest(lat, lon, k=3, group=group))
+        assert_same_result(grid.within(lat, lon, 30.0, group=group),
+                           points.nearest(lat, lon, max_distance_km=30.0, group=group))
+        assert len(grid.nearest(lat, lon, k=0)[0]) == 0
+        assert len(grid.nearest(lat, lon, k=0, group=group)[0]) == 0
+    assert len(grid.nearest(0.0, 0.0, k=5, group="desconocido")[0]) == 0
+
+
+def test_grid_antimeridian_neighbours():
+    points = PointIndex(["este", "oeste", "lejos"], [0.0, 0.0, 0.0], [179.99, -179.99, 170.0])
+    grid = GridIndex(points, cell_deg=0.02)
+
+    positions, distances = grid.nearest(0.0, 180.0, k=2)
+    assert sorted(points.ids[p] for p in positions) == ["este", "oeste"]
+    assert distances.max() < 2.0
+    assert [points.ids[p] for p in grid.within(0.0, -179.995, 5.0)[0]] == ["oeste", "este"]
+
+
+def test_filter_by_distance_accepts_zero_coordinates():
+    recommendations = [
+        {"name": "Ecuador", "latitude": 0.0, "longitude": 0.0},
+        {"name": "Lejos", "lat": 0.0, "lng": 90.0},
+        {"name": "Sin coordenadas"},
+        {"name": "Con distancia", "latitude": 0.5, "longitude": 0.0, "distance": 1.0},
+    ]
+    result = filter_by_distance(recommendations, 0.0, 0.1, max_distance=100)
+
+    assert [rec["name"] for rec in result] == ["Ecuador", "Sin coordenadas", "Con distancia"]
+    assert result[0]["distance"] == pytest.approx(scalar_haversine(0, 0.1, 0, 0))
+    assert result[2]["distance"] == 1.0
+    assert "distance" not in recommendations[0]
@@ -0,0 +1,107 @@
+"""
+Pruebas del pool de clientes Supabase (``database/pool.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_pool.py
+"""
+import gc
+import threading
+from contextlib import ExitStack
+
+import pytest
+
+from database import pool as pool_module
+from database.pool import ClientPool
+
+
+class FakeClient:
+    """Sustituye al cliente Supabase; guarda el httpx.Client recibido"""
+
+    def __init__(self, http_client):
+        self.http_client = http_client
+
+
+@pytest.fixture
+def make_pool(monkeypatch):
+    monkeypatch.setattr(
+        pool_module, "create_client",
+        lambda url, key, options: FakeClient(options.httpx_client),
+    )
+    pools = []
+
+    def make(**kwargs):
+        pool = ClientPool("http://localhost", "clave", **kwargs)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_checkout_prefers_least_leased_client(make_pool):
+    created = []
+    pool = make_pool(size=3, on_create=created.append)
+
+    with pool.checkout() as first:
+        with pool.checkout() as second:
+            assert first is not second
+        # second queda libre y se reutiliza en lugar de crear un tercero
+        with pool.checkout() as third:
+            assert third is second
+
+    with pool.checkout() as again:
+        assert again is first
+    assert len(created) == 2
+    assert [client.http_client for client in (first, second)] == created
+    stats = pool.stats()
+    assert (stats["clients"], stats["active_leases"], stats["shared_checkouts"]) == (2, 0, 0)
+    assert stats["checkouts"] == 4
+
+
+def test_size_bounds_clients_and_counts_shared_checkouts(make_pool):
+    pool = make_pool(size=2)
+
+    with ExitStack() as stack:
+        clients = [stack.enter_context(pool.checkout()) for _ in range(5)]
+        stats = pool.stats()
+        assert stats["clients"] == 2
+        assert stats["active_leases"] == 5
+        assert stats["busy_clients"] == 2
+        assert stats["shared_checkouts"] == 3
+        # Los préstamos compartidos se reparten entre los dos clientes
+        assert {clients.count(client) for client in set(clients)} == {2, 3}
+
+    assert pool.stats()["active_leases"] == 0
+
+
+def test_thread_binding_is_released_when_thread_is_collected(make_pool):
+    pool = make_pool(size=2)
+    seen = []
+
+    def run():
+        seen.append(pool.client_for_thread())
+        seen.append(pool.client_for_thread())
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert seen[0] is seen[1]
+    assert pool.stats()["thread_bindings"] == 1
+    assert pool.stats()["active_leases"] == 1
+
+    del thread
+    gc.collect()
+    assert pool.stats()["active_leases"] == 0
+
+
+def test_close_closes_http_clients(make_pool):
+    pool = make_pool(size=1)
+    with pool.checkout():
+        pass
+    http_clients = pool.http_clients()
+
+    pool.close()
+    assert all(client.is_closed for client in http_clients)
+    assert pool.stats()["clients"] == 0
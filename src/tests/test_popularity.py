@@ -0,0 +1,90 @@
+"""
+Pruebas de la lectura paginada de popularidad (``vw_poi_popularity`` / ``vw_city_popularity``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_popularity.py
+"""
+from database.database import SupabaseDB
+
+
+class FakeQuery:
+    """Constructor de consultas que anota las llamadas y devuelve la siguiente página"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.calls = [("table", table)]
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls.append((name, args))
+            return self
+        return call
+
+    @property
+    def not_(self):
+        self.calls.append(("not", ()))
+        return self
+
+    def execute(self):
+        self.client.requests.append(self.calls)
+        return self.client.pages.pop(0)
+
+
+class FakeClient:
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakePool:
+    def __init__(self, client):
+        self.client = client
+
+    def client_for_thread(self):
+        return self.client
+
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+def popularity_db(pages):
+    db = object.__new__(SupabaseDB)
+    db.pool = FakePool(FakeClient([FakeResponse(page) for page in pages]))
+    return db
+
+
+def test_poi_popularity_reads_every_page(monkeypatch):
+    monkeypatch.setattr("config.config.DB_PAGE_SIZE", 2)
+    db = popularity_db([
+        [{"poi_id": "p3", "visit_count": 9}, {"poi_id": "p2", "visit_count": 5}],
+        [{"poi_id": "p1", "visit_count": 5}, {"poi_id": "p0", "visit_count": 1}],
+        [{"poi_id": "p4", "visit_count": 0}],
+    ])
+
+    popularity = db.get_poi_popularity()
+
+    assert list(popularity) == ["p3", "p2", "p1", "p0", "p4"]
+    first, second, third = db.client.requests
+    assert ("table", "vw_poi_popularity") in first
+    assert ("order", ("poi_id",)) in first
+    assert ("limit", (2,)) in first
+    # Las páginas siguientes continúan desde (visit_count, poi_id) de la última fila
+    assert ("or_", ('visit_count.lt."5",and(visit_count.eq."5",poi_id.lt.p2),visit_count.is.null',)) in second
+    assert ("or_", ('visit_count.lt."1",and(visit_count.eq."1",poi_id.lt.p0),visit_count.is.null',)) in third
+
+
+def test_city_popularity_skips_pois_without_city(monkeypatch):
+    monkeypatch.setattr("config.config.DB_PAGE_SIZE", 10)
+    db = popularity_db([[{"city_id": "c1", "visit_count": 4}]])
+
+    assert db.get_city_popularity() == {"c1": {"city_id": "c1", "visit_count": 4}}
+    request = db.client.requests[0]
+    assert ("table", "vw_city_popularity") in request
+    assert request[request.index(("not", ())) + 1] == ("is_", ("city_id", "null"))
+    assert ("order", ("city_id",)) in request
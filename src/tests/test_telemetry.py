@@ -0,0 +1,208 @@
+"""
+Pruebas de la telemetría de consultas (``database/telemetry.py``)
+
+Se ejecutan desde ``src/``:
+
+    python -m pytest tests/test_telemetry.py
+"""
+import pytest
+
+from database import telemetry as telemetry_module
+from database.telemetry import HISTOGRAM_BUCKETS_MS, QueryTelemetry, _percentile
+
+
+class FakeClock:
+    """Sustituye a ``time.perf_counter`` para avanzar el tiempo a mano"""
+
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(telemetry_module.time, "perf_counter", fake)
+    return fake
+
+
+class FakeURL:
+    def __init__(self, path, query):
+        self.path = path
+        self.query = query.encode()
+
+
+class FakeRequest:
+    def __init__(self, path, query=""):
+        self.method = "GET"
+        self.url = FakeURL(path, query)
+
+
+class FakeResponse:
+    """Respuesta httpx mínima para ``QueryTelemetry._on_response``"""
+
+    def __init__(self, path, query="", content=b"[]", status_code=200):
+        self.request = FakeRequest(path, query)
+        self.content = content
+        self.status_code = status_code
+
+    def read(self):
+        return self.content
+
+
+def by_method(telemetry):
+    return {row["method"]: row for row in telemetry.snapshot()}
+
+
+def test_wrap_counts_rows_and_time(clock):
+    telemetry = QueryTelemetry(slow_threshold_ms=1000)
+
+    def get_rows():
+        clock.now += 0.02
+        return [1, 2, 3]
+
+    assert telemetry.wrap("get_rows", get_rows)() == [1, 2, 3]
+    stats = by_method(telemetry)["get_rows"]
+    assert (stats["calls"], stats["rows"], stats["errors"]) == (1, 3, 0)
+    assert stats["total_ms"] == pytest.approx(20.0)
+
+
+def test_wrap_error_path_records_and_reraises(clock):
+    telemetry = QueryTelemetry()
+
+    def broken():
+        raise ValueError("fallo")
+
+    with pytest.raises(ValueError):
+        telemetry.wrap("broken", broken)()
+    stats = by_method(telemetry)["broken"]
+    assert (stats["calls"], stats["errors"], stats["rows"]) == (1, 1, 0)
+    assert telemetry_module._frames() == []
+
+
+def test_http_error_status_counts_as_error(clock):
+    telemetry = QueryTelemetry()
+
+    def swallowed():
+        telemetry._on_response(FakeResponse("/rest/v1/pois", status_code=500))
+        return []
+
+    telemetry.wrap("swallowed", swallowed)()
+    assert by_method(telemetry)["swallowed"]["errors"] == 1
+
+
+def test_generator_is_metered_until_exhausted(clock):
+    telemetry = QueryTelemetry()
+
+    def rows():
+        for value in range(3):
+            clock.now += 0.01
+            yield value
+
+    iterator = telemetry.wrap("iter_rows", rows)()
+    assert telemetry.snapshot() == []
+
+    assert next(iterator) == 0
+    # El tiempo que el llamador pasa fuera de next() no se mide
+    clock.now += 5
+    assert list(iterator) == [1, 2]
+    stats = by_method(telemetry)["iter_rows"]
+    assert (stats["calls"], stats["rows"]) == (1, 3)
+    assert stats["total_ms"] == pytest.approx(30.0)
+
+
+def test_generator_closed_early_is_recorded(clock):
+    telemetry = QueryTelemetry()
+
+    def rows():
+        yield from range(10)
+
+    iterator = telemetry.wrap("iter_rows", rows)()
+    next(iterator)
+    iterator.close()
+    assert by_method(telemetry)["iter_rows"]["rows"] == 1
+
+
+def test_nested_calls_attribute_requests_to_every_frame(clock):
+    telemetry = QueryTelemetry()
+
+    def inner():
+        assert [frame.method for frame in telemetry_module._frames()] == ["outer", "inner"]
+        telemetry._on_response(FakeResponse("/rest/v1/cities", "select=id", b"0123456789"))
+        return [1]
+
+    wrapped_inner = telemetry.wrap("inner", inner)
+
+    def outer():
+        wrapped_inner()
+        telemetry._on_response(FakeResponse("/rest/v1/pois", content=b"01234"))
+        return [1, 2]
+
+    telemetry.wrap("outer", outer)()
+    stats = by_method(telemetry)
+    assert (stats["inner"]["requests"], stats["inner"]["bytes"]) == (1, 10)
+    assert (stats["outer"]["requests"], stats["outer"]["bytes"]) == (2, 15)
+    assert telemetry_module._frames() == []
+
+
+def test_responses_outside_instrumented_calls_are_ignored():
+    telemetry = QueryTelemetry()
+    telemetry._on_response(FakeResponse("/rest/v1/pois"))
+    assert telemetry.snapshot() == []
+
+
+def test_slow_log_threshold(clock):
+    telemetry = QueryTelemetry(slow_threshold_ms=125)
+
+    def query(duration):
+        clock.now += duration
+        telemetry._on_response(FakeResponse("/rest/v1/pois", "city_id=eq.1"))
+        return []
+
+    wrapped = telemetry.wrap("query", query)
+    wrapped(0.12)
+    assert telemetry.slow_queries() == []
+
+    wrapped(0.125)
+    wrapped(0.25)
+    slow = telemetry.slow_queries()
+    assert [entry["elapsed_ms"] for entry in slow] == [250.0, 125.0]
+    assert slow[0]["filters"] == "GET /rest/v1/pois?city_id=eq.1"
+    assert slow[0]["requests"] == 1
+
+
+def test_disabled_telemetry_records_nothing():
+    telemetry = QueryTelemetry(enabled=False)
+    assert telemetry.wrap("get_rows", lambda: [1])() == [1]
+    assert telemetry.snapshot() == []
+
+
+def test_percentile_nearest_rank():
+    values = [float(value) for value in range(1, 101)]
+    assert _percentile([], 50) == 0.0
+    assert _percentile([7.0], 99) == 7.0
+    assert _percentile(values, 50) == 50.0
+    assert _percentile(values, 95) == 95.0
+    assert _percentile(values, 99) == 99.0
+    assert _percentile(values, 100) == 100.0
+    assert _percentile([1.0, 2.0, 3.0], 0) == 1.0
+
+
+def test_histogram_bucket_edges():
+    telemetry = QueryTelemetry(slow_threshold_ms=10 ** 9)
+    frame = telemetry_module._CallFrame("m")
+    for elapsed_ms in (5, 5.01, 10, 5000, 5000.1, 0):
+        telemetry.record("m", elapsed_ms, 0, frame)
+    telemetry.record("otro", 1, 0, frame)
+
+    histogram = telemetry.histogram("m")
+    assert list(histogram) == [f"≤{bound}" for bound in HISTOGRAM_BUCKETS_MS] + [">5000"]
+    assert histogram["≤5"] == 2
+    assert histogram["≤10"] == 2
+    assert histogram["≤5000"] == 1
+    assert histogram[">5000"] == 1
+    assert sum(histogram.values()) == 6
+    assert telemetry.histogram()["≤5"] == 3
+    assert sum(telemetry.histogram("desconocido").values()) == 0
@@ -31,12 +31,14 @@ def show(db, n8n):
         st.session_state.user_data = user_data
 
     achievements = db.get_user_achievements(user_id)
-    all_users = db.get_all_users()
+    user_rank = db.get_user_rank(user_id)
 
     total_points = user_data.get("total_points") or 0
+    if user_rank:
+        total_points = user_rank["total_points"]
     level = user_data.get("level", "Explorador Novato")
     total_logros = len(achievements)
-    ranking, progress_pct, leader_points = compute_user_position(total_points, all_users, user_id)
+    ranking, progress_pct, leader_points = compute_user_position(total_points, user_rank)
 
     col1, col2, col3, col4 = st.columns(4)
     with col1:
@@ -47,7 +49,7 @@ def show(db, n8n):
         st.metric("⭐ Logros obtenidos", total_logros)
     with col4:
         ranking_text = f"#{ranking}" if ranking else "—"
-        total_users = len(all_users)
+        total_users = user_rank["total_users"] if user_rank else 0
         st.metric("🏅 Ranking global", ranking_text, help=f"Entre {total_users} usuarios registrados" if total_users else None)
 
     if leader_points > 0:
@@ -68,7 +70,7 @@ def show(db, n8n):
         show_available_achievements(db, achievements)
 
     with tab3:
-        show_gamification_stats(db, user_data, achievements, all_users)
+        show_gamification_stats(db, user_data, achievements)
 
 
 def show_user_achievements(achievements: List[Dict]):
@@ -168,7 +170,7 @@ def show_available_achievements(db, user_achievements: List[Dict]):
         st.divider()
 
 
-def show_gamification_stats(db, user_data: Dict, achievements: List[Dict], all_users: List[Dict]):
+def show_gamification_stats(db, user_data: Dict, achievements: List[Dict]):
     """Muestra estadísticas basadas en datos reales del sistema."""
 
     st.subheader("📊 Resumen de actividad")
@@ -240,13 +242,11 @@ def show_gamification_stats(db, user_data: Dict, achievements: List[Dict], all_u
     st.markdown("---")
 
     st.subheader("🏅 Ranking global")
-    if not all_users:
+    top_users = db.get_top_users(5)
+    if not top_users:
         st.info("No hay suficientes datos de otros usuarios para generar un ranking.")
         return
 
-    sorted_users = sorted(all_users, key=lambda user: user.get("total_points") or 0, reverse=True)
-    top_users = sorted_users[:5]
-
     for position, user in enumerate(top_users, start=1):
         col1, col2, col3 = st.columns([1, 3, 2])
 
@@ -264,15 +264,13 @@ def show_gamification_stats(db, user_data: Dict, achievements: List[Dict], all_u
         st.divider()
 
 
-def compute_user_position(total_points: int, all_users: List[Dict], user_id: str) -> Tuple[Optional[int], float, int]:
-    """Calcula la posición del usuario y la proporción frente al líder."""
-    if not all_users:
+def compute_user_position(total_points: int, user_rank: Optional[Dict]) -> Tuple[Optional[int], float, int]:
+    """Calcula la posición del usuario y la proporción frente al líder a partir de ``get_user_rank``."""
+    if not user_rank:
         return None, 0.0, 0
 
-    sorted_users = sorted(all_users, key=lambda user: user.get("total_points") or 0, reverse=True)
-    leader_points = sorted_users[0].get("total_points") or 0
-
-    ranking = next((index + 1 for index, user in enumerate(sorted_users) if user.get("id") == user_id), None)
+    leader_points = user_rank.get("leader_points") or 0
+    ranking = user_rank.get("rank")
 
     if leader_points == 0:
         return ranking, 0.0, leader_points
@@ -3,10 +3,16 @@ Página de Administración - CRUD Completo y Gráficos
 """
 import streamlit as st
 import pandas as pd
+from collections import Counter, defaultdict
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, timedelta
 import config.config as config
+from database import fan_out
+from database.bulk_import import read_import_file
+from database.export import EXPORT_FORMATS, PARQUET_AVAILABLE, export_rows
+import os
+import tempfile
 
 def show(db, n8n):
     """Muestra la página de administración"""
@@ -15,13 +21,15 @@ def show(db, n8n):
     st.markdown("---")
     
     # Tabs para diferentes módulos
-    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs([
+    tab1, tab2, tab3, tab4, tab5, tab6, tab7, tab8 = st.tabs([
         "📊 Dashboard", 
         "🌍 Ciudades", 
         "📍 POIs", 
         "👥 Usuarios", 
         "🎫 Reservas", 
-        "📈 Estadísticas"
+        "📈 Estadísticas",
+        "🩺 Rendimiento",
+        "📤 Exportar"
     ])
     
     with tab1:
@@ -41,6 +49,12 @@ def show(db, n8n):
     
     with tab6:
         show_statistics_admin(db)
+    
+    with tab7:
+        show_performance_admin(db)
+    
+    with tab8:
+        show_export_admin(db)
 
 
 def show_dashboard(db):
@@ -48,12 +62,16 @@ def show_dashboard(db):
     
     st.subheader("📊 Dashboard General")
     
-    # Obtener datos
-    cities = db.get_all_cities(include_inactive=True)
-    pois = db.get_all_pois(include_inactive=True)
-    users = db.get_all_users()
-    bookings = db.get_all_bookings()
-    visits = db.get_all_visits()
+    # Obtener datos (consultas independientes lanzadas en paralelo)
+    data = fan_out(db, {
+        "cities": lambda: db.get_all_cities(include_inactive=True),
+        "pois": lambda: db.get_all_pois(include_inactive=True),
+        "users": lambda: summarize_users(db.iter_all_users(projection="summary")),
+        "bookings": lambda: summarize_bookings(db.iter_all_bookings(projection="summary")),
+        "visits": lambda: summarize_visits(db.iter_all_visits(projection="summary")),
+    })
+    cities, pois = data["cities"], data["pois"]
+    users, bookings, visits = data["users"], data["bookings"], data["visits"]
     
     # Métricas principales
     col1, col2, col3, col4, col5 = st.columns(5)
@@ -63,11 +81,11 @@ def show_dashboard(db):
     with col2:
         st.metric("📍 POIs", len(pois), delta=len([p for p in pois if p.get('is_active')]))
     with col3:
-        st.metric("👥 Usuarios", len(users))
+        st.metric("👥 Usuarios", users["count"])
     with col4:
-        st.metric("🎫 Reservas", len(bookings))
+        st.metric("🎫 Reservas", bookings["count"])
     with col5:
-        st.metric("👣 Visitas", len(visits))
+        st.metric("👣 Visitas", visits["count"])
     
     st.markdown("---")
     
@@ -106,19 +124,18 @@ def show_dashboard(db):
                 st.plotly_chart(fig, use_container_width=True)
     
     # Gráfico de usuarios por suscripción
-    if users:
+    if users["count"]:
         col1, col2 = st.columns(2)
         
         with col1:
-            df_users = pd.DataFrame(users)
-            if 'subscription_tier' in df_users.columns:
-                sub_counts = df_users['subscription_tier'].value_counts()
+            sub_counts = users["tiers"].most_common()
+            if sub_counts:
                 fig = px.bar(
-                    x=sub_counts.index,
-                    y=sub_counts.values,
+                    x=[tier for tier, _ in sub_counts],
+                    y=[count for _, count in sub_counts],
                     title="Usuarios por Suscripción",
                     labels={'x': 'Tipo de Suscripción', 'y': 'Cantidad'},
-                    color=sub_counts.values,
+                    color=[count for _, count in sub_counts],
                     color_continuous_scale='blues'
                 )
                 fig.update_layout(showlegend=False)
@@ -126,10 +143,8 @@ def show_dashboard(db):
         
         with col2:
             # Gráfico de usuarios registrados por fecha
-            if 'created_at' in df_users.columns:
-                df_users['created_at'] = pd.to_datetime(df_users['created_at'])
-                df_users['date'] = df_users['created_at'].dt.date
-                daily_users = df_users.groupby('date').size().reset_index(name='count')
+            if users["daily"]:
+                daily_users = pd.DataFrame(sorted(users["daily"].items()), columns=['date', 'count'])
                 fig = px.line(
                     daily_users,
                     x='date',
@@ -141,16 +156,15 @@ def show_dashboard(db):
                 st.plotly_chart(fig, use_container_width=True)
     
     # Gráfico de reservas por estado
-    if bookings:
+    if bookings["count"]:
         col1, col2 = st.columns(2)
         
         with col1:
-            df_bookings = pd.DataFrame(bookings)
-            if 'status' in df_bookings.columns:
-                status_counts = df_bookings['status'].value_counts()
+            status_counts = bookings["statuses"].most_common()
+            if status_counts:
                 fig = px.pie(
-                    values=status_counts.values,
-                    names=status_counts.index,
+                    values=[count for _, count in status_counts],
+                    names=[status for status, _ in status_counts],
                     title="Reservas por Estado",
                     color_discrete_sequence=px.colors.qualitative.Pastel
                 )
@@ -158,11 +172,9 @@ def show_dashboard(db):
         
         with col2:
             # Ingresos por mes
-            if 'booking_date' in df_bookings.columns and 'total_price' in df_bookings.columns:
-                df_bookings['booking_date'] = pd.to_datetime(df_bookings['booking_date'])
-                df_bookings['month'] = df_bookings['booking_date'].dt.to_period('M')
-                monthly_revenue = df_bookings.groupby('month')['total_price'].sum().reset_index()
-                monthly_revenue['month'] = monthly_revenue['month'].astype(str)
+            if bookings["monthly_revenue"]:
+                monthly_revenue = pd.DataFrame(sorted(bookings["monthly_revenue"].items()),
+                                               columns=['month', 'total_price'])
                 fig = px.bar(
                     monthly_revenue,
                     x='month',
@@ -175,13 +187,51 @@ def show_dashboard(db):
                 st.plotly_chart(fig, use_container_width=True)
 
 
+def summarize_users(users):
+    """Resume un flujo de usuarios (por suscripción y por día de alta) sin materializarlo"""
+    summary = {"count": 0, "tiers": Counter(), "daily": Counter()}
+    for user in users:
+        summary["count"] += 1
+        if user.get('subscription_tier'):
+            summary["tiers"][user['subscription_tier']] += 1
+        if user.get('created_at'):
+            summary["daily"][str(user['created_at'])[:10]] += 1
+    return summary
+
+
+def summarize_bookings(bookings):
+    """Resume un flujo de reservas (estado e ingresos por mes) sin materializarlo"""
+    summary = {"count": 0, "statuses": Counter(), "monthly_revenue": defaultdict(float), "total_revenue": 0.0}
+    for booking in bookings:
+        summary["count"] += 1
+        if booking.get('status'):
+            summary["statuses"][booking['status']] += 1
+        price = float(booking.get('total_price') or 0)
+        summary["total_revenue"] += price
+        if booking.get('booking_date'):
+            summary["monthly_revenue"][str(booking['booking_date'])[:7]] += price
+    return summary
+
+
+def summarize_visits(visits):
+    """Resume un flujo de visitas (por mes y por rating) sin materializarlo"""
+    summary = {"count": 0, "monthly": Counter(), "ratings": Counter()}
+    for visit in visits:
+        summary["count"] += 1
+        if visit.get('visit_date'):
+            summary["monthly"][str(visit['visit_date'])[:7]] += 1
+        if visit.get('rating') is not None:
+            summary["ratings"][int(visit['rating'])] += 1
+    return summary
+
+
 def show_cities_admin(db):
     """Administración de ciudades con CRUD completo"""
     
     st.subheader("🌍 Administración de Ciudades")
     
     # Tabs para CRUD
-    tab_list, tab_create, tab_edit, tab_delete = st.tabs(["📋 Listar", "➕ Crear", "✏️ Editar", "🗑️ Eliminar"])
+    tab_list, tab_create, tab_edit, tab_delete, tab_import = st.tabs(["📋 Listar", "➕ Crear", "✏️ Editar", "🗑️ Eliminar", "📥 Importar"])
     
     with tab_list:
         cities = db.get_all_cities(include_inactive=True)
@@ -332,6 +382,9 @@ def show_cities_admin(db):
                             st.info("Operación cancelada")
         else:
             st.info("No hay ciudades activas para eliminar")
+    
+    with tab_import:
+        show_bulk_import(db, "cities")
 
 
 def show_pois_admin(db):
@@ -340,7 +393,7 @@ def show_pois_admin(db):
     st.subheader("📍 Administración de Puntos de Interés")
     
     # Tabs para CRUD
-    tab_list, tab_create, tab_edit, tab_delete = st.tabs(["📋 Listar", "➕ Crear", "✏️ Editar", "🗑️ Eliminar"])
+    tab_list, tab_create, tab_edit, tab_delete, tab_import = st.tabs(["📋 Listar", "➕ Crear", "✏️ Editar", "🗑️ Eliminar", "📥 Importar"])
     
     with tab_list:
         pois = db.get_all_pois(include_inactive=True)
@@ -512,6 +565,70 @@ def show_pois_admin(db):
                             st.info("Operación cancelada")
         else:
             st.info("No hay POIs activos para eliminar")
+    
+    with tab_import:
+        show_bulk_import(db, "pois")
+
+
+def show_bulk_import(db, kind):
+    """Importación masiva de ciudades o POIs desde un fichero CSV/JSON"""
+    
+    if kind == "cities":
+        st.markdown("### 📥 Importar Ciudades")
+        st.caption("Columnas: name*, country*, country_code, description, image_url, price, currency, "
+                   "latitude, longitude, timezone, language, is_active. "
+                   "Las ciudades que ya existan (mismo nombre y país) se actualizan.")
+    else:
+        st.markdown("### 📥 Importar POIs")
+        st.caption("Columnas: city_id* (o city con el nombre de la ciudad), name*, latitude*, longitude*, "
+                   "description, short_description, category, subcategory, visit_duration, difficulty_level, "
+                   "entry_price, accessibility_info, audio_guide_url, ar_content_url, is_active. "
+                   f"Categorías válidas: {', '.join(config.POI_CATEGORIES)}. "
+                   f"Dificultades: {', '.join(config.DIFFICULTY_LEVELS)}. "
+                   "Los POIs que ya existan (misma ciudad y nombre) se actualizan.")
+    
+    uploaded = st.file_uploader("Fichero CSV o JSON", type=["csv", "json"], key=f"bulk_import_{kind}")
+    if not uploaded:
+        return
+    
+    try:
+        rows = read_import_file(uploaded.name, uploaded.getvalue())
+    except Exception as e:
+        st.error(f"❌ No se pudo leer el fichero: {str(e)}")
+        return
+    
+    if not rows:
+        st.warning("⚠️ El fichero no contiene filas")
+        return
+    
+    st.write(f"**{len(rows)}** filas leídas")
+    st.dataframe(pd.DataFrame(rows).head(20), use_container_width=True, hide_index=True)
+    
+    if st.button("📥 Importar", key=f"bulk_import_run_{kind}", type="primary", use_container_width=True):
+        progress_bar = st.progress(0.0, text="Importando...")
+        
+        def on_progress(done, total):
+            progress_bar.progress(done / total if total else 1.0, text=f"Importando... {done}/{total}")
+        
+        if kind == "cities":
+            result = db.bulk_upsert_cities(rows, progress=on_progress)
+        else:
+            result = db.bulk_upsert_pois(rows, progress=on_progress)
+        progress_bar.progress(1.0, text="Importación terminada")
+        
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Guardadas", result["written"])
+        with col2:
+            st.metric("No válidas", result["invalid"])
+        with col3:
+            st.metric("Fallidas", result["failed"])
+        
+        if result["errors"]:
+            st.warning(f"⚠️ {len(result['errors'])} errores")
+            st.dataframe(pd.DataFrame(result["errors"]), use_container_width=True, hide_index=True)
+        elif result["written"]:
+            st.success(f"✅ {result['written']} filas importadas exitosamente!")
 
 
 def show_users_admin(db):
@@ -674,48 +791,222 @@ def show_statistics_admin(db):
     st.subheader("📈 Estadísticas Avanzadas")
     
     # Obtener datos
-    visits = db.get_all_visits()
-    bookings = db.get_all_bookings()
-    users = db.get_all_users()
+    data = fan_out(db, {
+        "visits": lambda: summarize_visits(db.iter_all_visits(projection="summary")),
+        "bookings": lambda: summarize_bookings(db.iter_all_bookings(projection="summary")),
+    })
+    visits, bookings = data["visits"], data["bookings"]
     
-    if visits:
+    if visits["count"]:
         col1, col2 = st.columns(2)
         
         with col1:
             # Visitas por mes
-            df_visits = pd.DataFrame(visits)
-            if 'visit_date' in df_visits.columns:
-                df_visits['visit_date'] = pd.to_datetime(df_visits['visit_date'])
-                df_visits['month'] = df_visits['visit_date'].dt.to_period('M')
-                monthly_visits = df_visits.groupby('month').size().reset_index(name='count')
-                monthly_visits['month'] = monthly_visits['month'].astype(str)
+            if visits["monthly"]:
+                monthly_visits = pd.DataFrame(sorted(visits["monthly"].items()), columns=['month', 'count'])
                 fig = px.line(monthly_visits, x='month', y='count', title="Visitas por Mes", markers=True)
                 st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             # Rating promedio de visitas
-            if 'rating' in df_visits.columns:
-                df_visits['rating'] = pd.to_numeric(df_visits['rating'], errors='coerce')
-                avg_rating = df_visits['rating'].mean()
+            if visits["ratings"]:
+                rated = sum(visits["ratings"].values())
+                avg_rating = sum(rating * count for rating, count in visits["ratings"].items()) / rated
                 st.metric("Rating Promedio", f"{avg_rating:.2f}/5.0")
                 
-                rating_dist = df_visits['rating'].value_counts().sort_index()
-                fig = px.bar(x=rating_dist.index, y=rating_dist.values, title="Distribución de Ratings")
+                rating_dist = sorted(visits["ratings"].items())
+                fig = px.bar(x=[rating for rating, _ in rating_dist], y=[count for _, count in rating_dist],
+                             title="Distribución de Ratings")
                 st.plotly_chart(fig, use_container_width=True)
     
-    if bookings:
+    if bookings["count"]:
         col1, col2 = st.columns(2)
         
         with col1:
             # Ingresos totales
-            df_bookings = pd.DataFrame(bookings)
-            total_revenue = df_bookings['total_price'].sum() if 'total_price' in df_bookings.columns else 0
-            st.metric("💰 Ingresos Totales", f"€{total_revenue:,.2f}")
+            st.metric("💰 Ingresos Totales", f"€{bookings['total_revenue']:,.2f}")
         
         with col2:
             # Reservas confirmadas vs canceladas
-            if 'status' in df_bookings.columns:
-                status_counts = df_bookings['status'].value_counts()
-                fig = px.pie(values=status_counts.values, names=status_counts.index, title="Estado de Reservas")
+            status_counts = bookings["statuses"].most_common()
+            if status_counts:
+                fig = px.pie(values=[count for _, count in status_counts],
+                             names=[status for status, _ in status_counts], title="Estado de Reservas")
                 st.plotly_chart(fig, use_container_width=True)
+    
+    # Estado del buffer de estadísticas de uso
+    with st.expander("🧮 Buffer de estadísticas de uso"):
+        buffer_stats = db.get_usage_stats_buffer_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("En cola", buffer_stats["queue_depth"] + buffer_stats["inflight"])
+        with col2:
+            st.metric("Persistidos", buffer_stats["flushed"])
+        with col3:
+            st.metric("Descartados", buffer_stats["dropped"])
+        with col4:
+            st.metric("Fallidos", buffer_stats["failed"])
 
+
+def show_performance_admin(db):
+    """Telemetría de consultas a Supabase: latencias, histograma y consultas lentas"""
+    
+    st.subheader("🩺 Rendimiento de Consultas")
+    
+    telemetry = db.get_query_telemetry()
+    cache_stats = db.get_cache_stats()
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Llamadas", sum(row["calls"] for row in telemetry))
+    with col2:
+        st.metric("Errores", sum(row["errors"] for row in telemetry))
+    with col3:
+        total_bytes = sum(row["bytes"] for row in telemetry)
+        st.metric("Datos recibidos", f"{total_bytes / 1024:,.1f} KB")
+    with col4:
+        st.metric("Aciertos de caché", f"{cache_stats['hit_ratio'] * 100:.1f}%")
+    
+    with st.expander("🗂️ Réplica del catálogo"):
+        catalog_stats = db.get_catalog_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Ciudades", catalog_stats["cities"])
+        with col2:
+            st.metric("POIs", catalog_stats["pois"])
+        with col3:
+            st.metric("Sincronizaciones", catalog_stats["delta_syncs"])
+        with col4:
+            st.metric("Filas aplicadas", catalog_stats["rows_applied"])
+        st.caption(f"Última sincronización: {catalog_stats['last_sync'] or '—'} · "
+                   f"cargas completas: {catalog_stats['full_loads']} · errores: {catalog_stats['sync_errors']} · "
+                   f"sondeo cada {config.CATALOG_POLL_INTERVAL:.0f} s (CATALOG_POLL_INTERVAL)")
+        feed_stats = db.get_change_feed_stats()
+        if not feed_stats:
+            st.caption("Invalidación por LISTEN/NOTIFY desactivada (configura DATABASE_URL e instala psycopg)")
+        else:
+            status = "🟢 conectada" if feed_stats["connected"] else "🔴 desconectada"
+            st.caption(f"Escucha de cambios en '{feed_stats['channel']}': {status} · "
+                       f"notificaciones: {feed_stats['notifications']} · reconexiones: {feed_stats['reconnects']}")
+    
+    with st.expander("🔌 Pool de conexiones"):
+        pool_stats = db.get_pool_stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Clientes", f"{pool_stats['clients']} / {pool_stats['size']}")
+        with col2:
+            st.metric("Préstamos activos", pool_stats["active_leases"])
+        with col3:
+            st.metric("Préstamos totales", pool_stats["checkouts"])
+        with col4:
+            st.metric("Préstamos compartidos", pool_stats["shared_checkouts"])
+        st.caption(f"Conexiones por cliente: {pool_stats['max_connections_per_client']} "
+                   f"(DB_POOL_MAX_CONNECTIONS), keep-alive {config.DB_POOL_KEEPALIVE_EXPIRY:.0f} s")
+    
+    if not telemetry:
+        st.info("Aún no se han registrado consultas en este proceso")
+        return
+    
+    st.markdown("### ⏱️ Latencia por método")
+    df_telemetry = pd.DataFrame(telemetry).rename(columns={
+        "method": "Método", "calls": "Llamadas", "errors": "Errores", "rows": "Filas",
+        "bytes": "Bytes", "requests": "Peticiones", "total_ms": "Total (ms)", "avg_ms": "Media (ms)",
+        "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "p99_ms": "p99 (ms)", "max_ms": "Máx (ms)"
+    })
+    st.dataframe(df_telemetry, use_container_width=True, hide_index=True)
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        top = df_telemetry.head(15).sort_values("p95 (ms)")
+        fig = px.bar(top, x="p95 (ms)", y="Método", orientation="h", title="p95 por método (top 15 por tiempo total)")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    with col2:
+        method_options = ["Todos"] + [row["method"] for row in telemetry]
+        selected_method = st.selectbox("Histograma de", method_options, key="telemetry_histogram_method")
+        histogram = db.get_latency_histogram(None if selected_method == "Todos" else selected_method)
+        fig = px.bar(x=list(histogram.keys()), y=list(histogram.values()),
+                     labels={'x': 'Latencia (ms)', 'y': 'Llamadas'}, title="Distribución de latencias recientes")
+        st.plotly_chart(fig, use_container_width=True)
+    
+    st.markdown("### 🐢 Consultas lentas")
+    slow_queries = db.get_slow_queries()
+    if slow_queries:
+        st.dataframe(pd.DataFrame(slow_queries), use_container_width=True, hide_index=True)
+    else:
+        st.success("No hay consultas por encima del umbral configurado")
+    st.caption(f"Umbral: {config.SLOW_QUERY_THRESHOLD_MS:.0f} ms (SLOW_QUERY_THRESHOLD_MS)")
+    
+    if st.button("🔄 Reiniciar métricas", key="reset_telemetry"):
+        db.reset_query_telemetry()
+        st.rerun()
+
+
+def show_export_admin(db):
+    """Exportación masiva de estadísticas de uso, visitas y reservas a CSV/Parquet"""
+    
+    st.subheader("📤 Exportación de Datos")
+    st.caption("Las filas se leen por páginas y se escriben por bloques en un fichero temporal, "
+               "sin cargar todo el rango en memoria. Para rangos muy grandes usa la línea de comandos: "
+               "python -m database.export visits --format parquet -o visitas.parquet")
+    
+    sources = {"Estadísticas de uso": "usage_stats", "Visitas": "visits", "Reservas": "bookings"}
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        source_label = st.selectbox("Datos", list(sources.keys()), key="export_source")
+        formats = [fmt for fmt in EXPORT_FORMATS if fmt != "parquet" or PARQUET_AVAILABLE]
+        fmt = st.selectbox("Formato", formats, format_func=str.upper, key="export_format")
+    with col2:
+        start = st.date_input("Desde", value=datetime.now().date() - timedelta(days=30), key="export_start")
+        end = st.date_input("Hasta", value=datetime.now().date(), key="export_end")
+    
+    if not PARQUET_AVAILABLE:
+        st.caption("Parquet no disponible: instala pyarrow")
+    
+    if st.button("📤 Generar exportación", type="primary", use_container_width=True, key="export_run"):
+        previous = st.session_state.pop("export_file", None)
+        if previous and os.path.exists(previous["path"]):
+            os.remove(previous["path"])
+        
+        source = sources[source_label]
+        status = st.empty()
+        
+        def on_progress(written):
+            status.info(f"⏳ {written:,} filas exportadas...")
+        
+        handle = tempfile.NamedTemporaryFile(delete=False, suffix=f".{fmt}")
+        try:
+            with handle:
+                total = export_rows(
+                    db, source, fmt, handle,
+                    start_date=datetime.combine(start, datetime.min.time()),
+                    end_date=datetime.combine(end, datetime.max.time()),
+                    progress=on_progress
+                )
+        except Exception as e:
+            os.remove(handle.name)
+            status.empty()
+            st.error(f"❌ Error al exportar: {str(e)}")
+            return
+        
+        status.success(f"✅ {total:,} filas exportadas")
+        st.session_state["export_file"] = {
+            "path": handle.name,
+            "name": f"{source}_{start.isoformat()}_{end.isoformat()}.{fmt}",
+            "mime": "text/csv" if fmt == "csv" else "application/octet-stream",
+        }
+    
+    export_file = st.session_state.get("export_file")
+    if export_file and os.path.exists(export_file["path"]):
+        size_mb = os.path.getsize(export_file["path"]) / (1024 * 1024)
+        with open(export_file["path"], "rb") as exported:
+            st.download_button(
+                f"⬇️ Descargar {export_file['name']} ({size_mb:,.1f} MB)",
+                data=exported,
+                file_name=export_file["name"],
+                mime=export_file["mime"],
+                use_container_width=True,
+                key="export_download"
+            )
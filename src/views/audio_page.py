@@ -5,6 +5,7 @@ import streamlit as st
 import config.config as config
 import os
 from datetime import datetime
+from database.achievements import get_session_achievements
 
 def show(db, n8n):
     """Muestra la página de audio-guías"""
@@ -16,6 +17,9 @@ def show(db, n8n):
         st.warning("⚠️ Debes iniciar sesión para generar audio-guías")
         return
     
+    # Contadores de logros cargados antes de registrar nuevas audio-guías
+    get_session_achievements(db, st.session_state.user_id)
+    
     # Tabs
     tab1, tab2 = st.tabs(["🎵 Generar Nueva", "📚 Mis Audio-Guías"])
     
@@ -214,7 +218,7 @@ def generate_audio_guide(db, n8n, poi, context, voice_id):
                         st.success("💾 Audio-guía guardada en tu biblioteca")
                 
                 # Registrar estadística
-                db.create_usage_stat({
+                db.log_usage_stat({
                     "user_id": st.session_state.user_id,
                     "action_type": "audio_guide",
                     "poi_id": poi['id'],
@@ -252,21 +256,21 @@ def show_my_audios(db, n8n):
         limit=50
     )
     
-    # Obtener POIs visitados para obtener sus audio-guías
+    # Obtener en bloque los POIs y sus audio-guías
+    poi_ids = [stat.get('poi_id') for stat in audio_stats if stat.get('poi_id')]
+    pois_by_id = db.get_pois_by_ids(poi_ids)
+    audios_by_poi = db.get_audio_guides_for_pois(list(pois_by_id))
+    
     pois_with_audio = []
     for stat in audio_stats:
-        poi_id = stat.get('poi_id')
-        if poi_id:
-            poi = db.get_poi_by_id(poi_id)
-            if poi:
-                # Obtener audio-guías del POI
-                audio_guides = db.get_audio_guides(poi_id)
-                for audio in audio_guides:
-                    pois_with_audio.append({
-                        'poi': poi,
-                        'audio': audio,
-                        'stat': stat
-                    })
+        poi = pois_by_id.get(stat.get('poi_id'))
+        if poi:
+            for audio in audios_by_poi.get(poi['id'], []):
+                pois_with_audio.append({
+                    'poi': poi,
+                    'audio': audio,
+                    'stat': stat
+                })
     
     if not pois_with_audio:
         st.info("Aún no has generado ninguna audio-guía. ¡Crea tu primera guía en la pestaña anterior!")
@@ -405,40 +409,6 @@ def show_audio_details(db, poi, audio):
 
 
 def check_audio_achievements(db, user_id):
-    """Verifica y otorga logros relacionados con audio-guías"""
-    
-    # Obtener estadísticas de audio del usuario
-    audio_stats = db.get_usage_stats(user_id=user_id, action_type="audio_guide")
-    audio_count = len(audio_stats)
-    
-    achievements = []
-    
-    # Primera audio-guía
-    if audio_count == 1:
-        achievements.append({
-            "user_id": user_id,
-            "achievement_type": "visitas",
-            "achievement_name": "Primera Audio-Guía",
-            "achievement_description": "Generaste tu primera audio-guía",
-            "points": 50,
-            "badge_icon": "🎧",
-            "badge_color": "blue"
-        })
-    
-    # 10 audio-guías
-    if audio_count == 10:
-        achievements.append({
-            "user_id": user_id,
-            "achievement_type": "coleccionista",
-            "achievement_name": "Coleccionista de Audio",
-            "achievement_description": "Generaste 10 audio-guías",
-            "points": 200,
-            "badge_icon": "🎵",
-            "badge_color": "purple"
-        })
-    
-    # Crear logros
-    for achievement in achievements:
-        result = db.create_achievement(achievement)
-        if result:
-            st.success(f"🎉 ¡Nuevo logro desbloqueado! {achievement['achievement_name']} (+{achievement['points']} puntos)")
+    """Cuenta la audio-guía generada y otorga los logros que desbloquea"""
+    for achievement in get_session_achievements(db, user_id, refresh=False).record("audio_guides"):
+        st.success(f"🎉 ¡Nuevo logro desbloqueado! {achievement['achievement_name']} (+{achievement['points']} puntos)")
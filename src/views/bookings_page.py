@@ -4,6 +4,7 @@ Página de Reservas
 import streamlit as st
 from datetime import datetime, timedelta
 import config.config as config
+from database.achievements import get_session_achievements
 
 def show(db, n8n):
     """Muestra la página de reservas"""
@@ -15,6 +16,9 @@ def show(db, n8n):
         st.warning("⚠️ Debes iniciar sesión para realizar reservas")
         return
     
+    # Contadores de logros cargados antes de registrar nuevas reservas
+    get_session_achievements(db, st.session_state.user_id)
+    
     # Tabs
     tab1, tab2 = st.tabs(["🆕 Nueva Reserva", "📋 Mis Reservas"])
     
@@ -201,7 +205,7 @@ def create_booking(db, n8n, poi, date, time, people, price, payment_method, requ
             """)
             
             # Registrar estadística
-            db.create_usage_stat({
+            db.log_usage_stat({
                 "user_id": st.session_state.user_id,
                 "action_type": "booking",
                 "poi_id": poi['id'],
@@ -374,39 +378,6 @@ def cancel_booking(db, booking):
 
 
 def check_booking_achievements(db, user_id):
-    """Verifica y otorga logros relacionados con reservas"""
-    
-    bookings = db.get_user_bookings(user_id)
-    booking_count = len(bookings)
-    
-    achievements = []
-    
-    # Primera reserva
-    if booking_count == 1:
-        achievements.append({
-            "user_id": user_id,
-            "achievement_type": "visitas",
-            "achievement_name": "Primera Reserva",
-            "achievement_description": "Realizaste tu primera reserva",
-            "points": 100,
-            "badge_icon": "🎫",
-            "badge_color": "green"
-        })
-    
-    # 5 reservas
-    if booking_count == 5:
-        achievements.append({
-            "user_id": user_id,
-            "achievement_type": "explorador",
-            "achievement_name": "Viajero Frecuente",
-            "achievement_description": "Realizaste 5 reservas",
-            "points": 250,
-            "badge_icon": "✈️",
-            "badge_color": "blue"
-        })
-    
-    # Crear logros
-    for achievement in achievements:
-        result = db.create_achievement(achievement)
-        if result:
-            st.success(f"🎉 ¡Nuevo logro! {achievement['achievement_name']} (+{achievement['points']} puntos)")
+    """Cuenta la reserva realizada y otorga los logros que desbloquea"""
+    for achievement in get_session_achievements(db, user_id, refresh=False).record("bookings"):
+        st.success(f"🎉 ¡Nuevo logro! {achievement['achievement_name']} (+{achievement['points']} puntos)")
@@ -9,6 +9,7 @@ from datetime import datetime
 import pandas as pd
 
 import config.config as config
+from database.achievements import get_session_achievements
 from .bookings_page import create_booking as bookings_create_booking
 from .audio_page import generate_audio_guide as audio_generate
 
@@ -206,6 +207,10 @@ def render_city_detail(db, n8n, city: Dict):
     st.markdown(f"## 🏙️ {city.get('name', 'Ciudad desconocida')}")
     st.caption(f"{city.get('country', 'País no disponible')} • Idioma: {city.get('language', 'N/D')}")
 
+    # Contadores de logros cargados antes de registrar reservas o audio-guías
+    if st.session_state.user_id:
+        get_session_achievements(db, st.session_state.user_id)
+
     pois = db.get_pois(city_id=city['id'])
     poi_count = len(pois)
     avg_rating = (
@@ -235,11 +240,22 @@ def render_city_detail(db, n8n, city: Dict):
         st.metric("Rating promedio", f"{avg_rating:.2f}")
 
         if city.get('latitude') and city.get('longitude'):
-            map_df = pd.DataFrame([{
-                "lat": float(city['latitude']),
-                "lon": float(city['longitude'])
-            }])
-            st.map(map_df, zoom=12)
+            city_lat, city_lon = float(city['latitude']), float(city['longitude'])
+            # Centro de la ciudad y sus POIs más cercanos (índice espacial)
+            nearby = db.nearby_pois(city_lat, city_lon, config.CITY_MAP_RADIUS_KM,
+                                    limit=config.CITY_MAP_MAX_POIS, city_id=city['id'])
+            map_df = pd.DataFrame(
+                [{"lat": city_lat, "lon": city_lon, "size": 60, "color": "#1f77b4"}]
+                + [{
+                    "lat": float(poi['latitude']),
+                    "lon": float(poi['longitude']),
+                    "size": 25,
+                    "color": "#d62728",
+                } for poi in nearby]
+            )
+            st.map(map_df, zoom=12, size="size", color="color")
+            if nearby:
+                st.caption(f"📍 {len(nearby)} POIs a menos de {config.CITY_MAP_RADIUS_KM:.0f} km del centro")
 
     st.markdown("### 📍 Puntos de interés destacados")
     if pois:
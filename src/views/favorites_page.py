@@ -109,6 +109,10 @@ def show(db, n8n):
                 if st.button("💔 Quitar", key=f"remove_{poi['id']}", use_container_width=True):
                     result = db.remove_favorite(st.session_state.user_id, poi['id'])
                     if result:
+                        # Mantener al día el conjunto de favoritos de la sesión (si ya existe)
+                        favorites_set = st.session_state.get("favorites_set")
+                        if favorites_set is not None:
+                            favorites_set.forget(poi['id'])
                         st.success("Eliminado de favoritos")
                         st.rerun()
             
@@ -5,6 +5,8 @@ import streamlit as st
 import pandas as pd
 from typing import Dict, List, Optional
 import config.config as config
+from database.achievements import get_session_achievements
+from database.favorites import FavoritesSet, get_session_favorites
 
 def show(db, n8n):
     """Muestra la página de puntos de interés"""
@@ -64,24 +66,34 @@ def show(db, n8n):
                 step=0.5,
             )
 
+    sort_options = ["Nombre A-Z", "Rating", "Duración", "Precio (menor a mayor)", "Precio (mayor a menor)", "Más recientes"]
+    if search_query and search_query.strip():
+        sort_options.insert(0, "Relevancia")
+
     sort_col, view_col = st.columns([1, 1])
     with sort_col:
-        sort_option = st.selectbox(
-            "Ordenar por",
-            ["Nombre A-Z", "Rating", "Duración", "Precio (menor a mayor)", "Precio (mayor a menor)", "Más recientes"],
-        )
+        sort_option = st.selectbox("Ordenar por", sort_options)
     with view_col:
         view_mode = st.radio("Vista", ["Lista", "Tarjetas", "Tabla"], horizontal=True, index=0)
 
-    filtered_pois = apply_poi_filters(
-        pois=pois,
-        search_query=search_query,
-        city_id=selected_city_id,
-        categories=selected_categories,
-        difficulties=selected_difficulties,
-        price_range=price_range,
-        min_rating=min_rating_selected,
-    )
+    if search_query and search_query.strip():
+        # Búsqueda de texto completo en el servidor, ya ordenada por relevancia
+        filtered_pois = db.search_pois(search_query, {
+            "city_id": selected_city_id,
+            "categories": selected_categories,
+            "difficulties": selected_difficulties,
+            "price_range": price_range if price_range != (0.0, 0.0) else None,
+            "min_rating": min_rating_selected,
+        })
+    else:
+        filtered_pois = apply_poi_filters(
+            pois=pois,
+            city_id=selected_city_id,
+            categories=selected_categories,
+            difficulties=selected_difficulties,
+            price_range=price_range,
+            min_rating=min_rating_selected,
+        )
 
     filtered_pois = sort_pois(filtered_pois, sort_option)
 
@@ -92,11 +104,15 @@ def show(db, n8n):
         st.info("No hay coincidencias con los criterios seleccionados.")
         return
 
-    favorites_ids = set()
+    favorites = None
     user_id = getattr(st.session_state, "user_id", None)
     if user_id:
-        favorites = db.get_user_favorites(user_id)
-        favorites_ids = {fav.get("poi_id") for fav in favorites if fav.get("poi_id")}
+        # IDs en la sesión: marcar un favorito es una escritura y ninguna lectura
+        favorites = get_session_favorites(db, user_id)
+        for poi_id in favorites.pop_failures():
+            st.warning(f"No se pudo guardar el cambio de favorito del POI {poi_id}")
+        # Contadores de logros cargados antes de registrar nuevas reseñas
+        get_session_achievements(db, user_id)
 
     if view_mode == "Tabla":
         df = build_pois_dataframe(filtered_pois)
@@ -110,22 +126,21 @@ def show(db, n8n):
             cols = st.columns(columns_per_row)
             for col, poi in zip(cols, row_pois):
                 with col:
-                    render_poi_card(db, n8n, poi, user_id, favorites_ids)
+                    render_poi_card(db, n8n, poi, user_id, favorites)
     else:
         for poi in filtered_pois:
-            render_poi_list_item(db, n8n, poi, user_id, favorites_ids)
+            render_poi_list_item(db, n8n, poi, user_id, favorites)
 
 
 def apply_poi_filters(
     pois: List[Dict],
-    search_query: Optional[str],
     city_id: Optional[str],
     categories: List[str],
     difficulties: List[str],
     price_range: tuple,
     min_rating: float,
 ) -> List[Dict]:
-    """Aplica los filtros seleccionados a la lista de POIs."""
+    """Aplica los filtros seleccionados a la lista de POIs (la búsqueda por texto usa db.search_pois)."""
     filtered = pois
 
     if city_id:
@@ -150,20 +165,13 @@ def apply_poi_filters(
             if poi.get("rating") is not None and float(poi["rating"]) >= min_rating
         ]
 
-    if search_query:
-        query = search_query.lower().strip()
-        filtered = [
-            poi for poi in filtered
-            if query in poi.get("name", "").lower()
-            or query in (poi.get("description") or "").lower()
-            or query in (poi.get("short_description") or "").lower()
-        ]
-
     return filtered
 
 
 def sort_pois(pois: List[Dict], sort_option: str) -> List[Dict]:
     """Ordena la lista de POIs según la opción seleccionada."""
+    if sort_option == "Relevancia":
+        return sorted(pois, key=lambda x: float(x.get("search_rank") or 0), reverse=True)
     if sort_option == "Nombre A-Z":
         return sorted(pois, key=lambda x: x.get("name", ""))
     if sort_option == "Rating":
@@ -179,7 +187,7 @@ def sort_pois(pois: List[Dict], sort_option: str) -> List[Dict]:
     return pois
 
 
-def render_poi_card(db, n8n, poi: Dict, user_id: Optional[str], favorites_ids: set):
+def render_poi_card(db, n8n, poi: Dict, user_id: Optional[str], favorites: Optional[FavoritesSet]):
     """Muestra un POI en formato tarjeta."""
     st.markdown(f"### {poi.get('name', 'Sin nombre')}")
     info_cols = st.columns([1, 1, 1])
@@ -203,8 +211,8 @@ def render_poi_card(db, n8n, poi: Dict, user_id: Optional[str], favorites_ids: s
         with st.expander("Detalles", expanded=False):
             show_poi_details(db, n8n, poi)
     with action_cols[1]:
-        if user_id:
-            render_favorite_button(db, poi, user_id, favorites_ids)
+        if favorites is not None:
+            render_favorite_button(poi, favorites)
     with action_cols[2]:
         if st.button("🎧 Generar audio-guía", key=f"audio_card_{poi['id']}", use_container_width=True):
             st.session_state.selected_poi = poi['id']
@@ -213,7 +221,7 @@ def render_poi_card(db, n8n, poi: Dict, user_id: Optional[str], favorites_ids: s
     st.divider()
 
 
-def render_poi_list_item(db, n8n, poi: Dict, user_id: Optional[str], favorites_ids: set):
+def render_poi_list_item(db, n8n, poi: Dict, user_id: Optional[str], favorites: Optional[FavoritesSet]):
     """Muestra un POI en formato lista detallada."""
     with st.container():
         col1, col2 = st.columns([3, 1])
@@ -242,8 +250,8 @@ def render_poi_list_item(db, n8n, poi: Dict, user_id: Optional[str], favorites_i
             if st.button("👁️ Ver detalles", key=f"view_{poi['id']}", use_container_width=True):
                 show_poi_details(db, n8n, poi)
 
-            if user_id:
-                render_favorite_button(db, poi, user_id, favorites_ids)
+            if favorites is not None:
+                render_favorite_button(poi, favorites)
 
             if st.button("🎧 Audio-Guía", key=f"audio_{poi['id']}", use_container_width=True):
                 st.session_state.selected_poi = poi['id']
@@ -252,18 +260,20 @@ def render_poi_list_item(db, n8n, poi: Dict, user_id: Optional[str], favorites_i
         st.divider()
 
 
-def render_favorite_button(db, poi: Dict, user_id: str, favorites_ids: set):
-    """Renderiza el botón de favoritos evitando consultas repetidas."""
-    is_favorite = poi.get("id") in favorites_ids
+def render_favorite_button(poi: Dict, favorites: FavoritesSet):
+    """Renderiza el botón de favoritos sobre el conjunto de la sesión."""
+    is_favorite = poi.get("id") in favorites
     label = "💔 Quitar" if is_favorite else "❤️ Favorito"
-    if st.button(label, key=f"fav_{poi['id']}", use_container_width=True):
-        if is_favorite:
-            db.remove_favorite(user_id, poi['id'])
-            st.success("Eliminado de favoritos")
-        else:
-            db.add_favorite(user_id, poi['id'])
-            st.success("Añadido a favoritos")
-        st.rerun()
+    st.button(label, key=f"fav_{poi['id']}", use_container_width=True,
+              on_click=toggle_favorite, args=(favorites, poi['id']))
+
+
+def toggle_favorite(favorites: FavoritesSet, poi_id: str):
+    """Callback del botón: cambia el favorito antes de volver a pintar la página."""
+    if favorites.toggle(poi_id):
+        st.toast("Añadido a favoritos", icon="❤️")
+    else:
+        st.toast("Eliminado de favoritos", icon="💔")
 
 
 def build_pois_dataframe(pois: List[Dict]) -> pd.DataFrame:
@@ -388,19 +398,24 @@ def show_review_form(db, poi):
             if result:
                 st.success("¡Gracias por tu reseña! 🎉")
                 
-                # Actualizar rating del POI
-                current_rating = poi.get('rating', 0)
-                current_reviews = poi.get('total_reviews', 0)
-                new_total = current_reviews + 1
-                new_rating = ((current_rating * current_reviews) + rating) / new_total
-                
-                db.update_poi_rating(poi['id'], new_rating, new_total)
+                # Actualizar rating del POI (media incremental en el servidor)
+                db.add_poi_rating(poi['id'], rating)
                 
                 # Registrar estadística
-                db.create_usage_stat({
+                db.log_usage_stat({
                     "user_id": st.session_state.user_id,
                     "action_type": "review",
                     "poi_id": poi['id']
                 })
                 
+                check_visit_achievements(db, st.session_state.user_id, poi)
+                
                 st.rerun()
+
+
+def check_visit_achievements(db, user_id: str, poi: Dict):
+    """Cuenta la visita con reseña y la ciudad del POI, y otorga los logros que desbloquean"""
+    tracker = get_session_achievements(db, user_id, refresh=False)
+    awarded = tracker.record("visits") + tracker.record("reviews") + tracker.record("cities", poi.get("city_id"))
+    for achievement in awarded:
+        st.toast(f"¡Nuevo logro! {achievement['achievement_name']} (+{achievement['points']} puntos)", icon="🎉")
@@ -5,7 +5,10 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 from typing import Any, Dict, List
+import numpy as np
 import config.config as config
+from geo import haversine_km
+from database.favorites import get_session_favorites
 
 def show(db, n8n):
     """Muestra la página de recomendaciones personalizadas"""
@@ -157,7 +160,7 @@ def search_recommendations(db, n8n, city_id, lat, lng, categories, max_distance,
                 # Mostrar POIs locales como alternativa
                 st.markdown("---")
                 st.subheader("📍 Lugares Disponibles en la Ciudad")
-                show_local_pois_fallback(db, city_id, lat, lng)
+                show_local_pois_fallback(db, city_id, lat, lng, max_distance, max_results)
                 return
             
             st.markdown("### 🧪 Respuesta de n8n")
@@ -173,6 +176,8 @@ def search_recommendations(db, n8n, city_id, lat, lng, categories, max_distance,
                 elif result.get('pois'):
                     recommendations = result['pois']
 
+            recommendations = filter_by_distance(recommendations, lat, lng, max_distance)
+
             if recommendations:
                 st.success(f"✅ Se encontraron {len(recommendations)} recomendaciones")
                 save_recommendations_to_db(db, recommendations, city_id, lat, lng)
@@ -180,12 +185,51 @@ def search_recommendations(db, n8n, city_id, lat, lng, categories, max_distance,
             else:
                 st.warning("⚠️ El servicio respondió pero sin recomendaciones")
                 st.info("Mostrando lugares disponibles en la base de datos local...")
-                show_local_pois_fallback(db, city_id, lat, lng)
+                show_local_pois_fallback(db, city_id, lat, lng, max_distance, max_results)
                 
         except Exception as e:
             st.error(f"❌ Error al buscar recomendaciones: {str(e)}")
             st.info("Mostrando lugares disponibles en la base de datos local...")
-            show_local_pois_fallback(db, city_id, lat, lng)
+            show_local_pois_fallback(db, city_id, lat, lng, max_distance, max_results)
+
+
+def _coordinate(rec: Dict, *fields: str):
+    """Primer campo de coordenada presente (0.0 es una coordenada válida)"""
+    for field in fields:
+        if rec.get(field) is not None:
+            return rec[field]
+    return None
+
+
+def filter_by_distance(recommendations: List[Dict], lat: float, lng: float,
+                       max_distance: float) -> List[Dict]:
+    """
+    Descarta las recomendaciones a más de ``max_distance`` km del usuario.
+
+    Las distancias se calculan de una vez para toda la lista; se añaden como
+    ``distance`` a las que no la traen. Las que no tienen coordenadas se conservan.
+    """
+    recommendations = [dict(rec) for rec in recommendations if isinstance(rec, dict)]
+    located = [
+        rec for rec in recommendations
+        if _coordinate(rec, 'latitude', 'lat') is not None
+        and _coordinate(rec, 'longitude', 'lng') is not None
+    ]
+    if not located:
+        return recommendations
+
+    distances = haversine_km(
+        lat, lng,
+        np.array([float(_coordinate(rec, 'latitude', 'lat')) for rec in located]),
+        np.array([float(_coordinate(rec, 'longitude', 'lng')) for rec in located]),
+    )
+    too_far = set()
+    for rec, distance in zip(located, distances):
+        if distance > max_distance:
+            too_far.add(id(rec))
+        elif rec.get('distance') is None and not (rec.get('metadata') or {}).get('distance_km'):
+            rec['distance'] = float(distance)
+    return [rec for rec in recommendations if id(rec) not in too_far]
 
 
 def save_recommendations_to_db(db, recommendations, city_id, lat, lng):
@@ -199,7 +243,7 @@ def save_recommendations_to_db(db, recommendations, city_id, lat, lng):
             if poi_id:
                 # Guardar como favorito o en una tabla de recomendaciones
                 # Por ahora, registrar como estadística de uso
-                db.create_usage_stat({
+                db.log_usage_stat({
                     "user_id": st.session_state.user_id,
                     "action_type": "recommendation_received",
                     "poi_id": poi_id,
@@ -326,10 +370,12 @@ def display_recommendations(db, recommendations, user_lat, user_lng):
                 if item["phone"]:
                     st.caption(f"📞 {item['phone']}")
                 if item["poi_id"] and st.session_state.user_id:
-                    if st.button("❤️ Guardar", key=f"save_{item['poi_id']}_{idx}", use_container_width=True):
-                        db.add_favorite(st.session_state.user_id, item["poi_id"])
+                    favorites = get_session_favorites(db, st.session_state.user_id)
+                    if item["poi_id"] in favorites:
+                        st.caption("❤️ En favoritos")
+                    elif st.button("❤️ Guardar", key=f"save_{item['poi_id']}_{idx}", use_container_width=True):
+                        favorites.add(item["poi_id"])
                         st.success("Guardado!")
-                        st.rerun()
 
             with st.expander("➕ Ver más detalles", expanded=False):
                 detail_cols = st.columns([2, 1])
@@ -390,54 +436,35 @@ def normalize_recommendation(rec: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def show_local_pois_fallback(db, city_id, user_lat, user_lng):
+def show_local_pois_fallback(db, city_id, user_lat, user_lng, max_distance=None, max_results=None):
     """Muestra POIs locales como alternativa cuando n8n no está disponible"""
     
     try:
-        # Obtener POIs de la ciudad
-        pois = db.get_pois(city_id=city_id)
+        # POIs de la ciudad más cercanos al usuario (índice espacial, con su distancia)
+        if max_distance:
+            pois = db.nearby_pois(user_lat, user_lng, max_distance, limit=max_results, city_id=city_id)
+        else:
+            pois = db.get_nearby_pois(user_lat, user_lng, k=max_results, city_id=city_id)
+        
+        # Los POIs sin coordenadas no entran en la búsqueda espacial: se muestran al final
+        without_location = [
+            poi for poi in db.get_pois(city_id=city_id)
+            if poi.get('latitude') is None or poi.get('longitude') is None
+        ]
         
-        if not pois:
+        if not pois and not without_location:
             st.warning("No hay lugares disponibles en la base de datos local para esta ciudad")
             return
         
-        st.info(f"📍 Mostrando {len(pois)} lugares desde la base de datos local")
+        message = f"📍 Mostrando {len(pois)} lugares desde la base de datos local"
+        if max_results and len(pois) >= max_results:
+            message += f" (los {max_results} más cercanos)"
+        if without_location:
+            message += f" y {len(without_location)} sin ubicación"
+        st.info(message)
         
-        # Calcular distancia aproximada (si tienen coordenadas)
-        import math
-        
-        def calculate_distance(lat1, lon1, lat2, lon2):
-            """Calcula distancia en km usando fórmula de Haversine"""
-            R = 6371  # Radio de la Tierra en km
-            
-            lat1_rad = math.radians(lat1)
-            lat2_rad = math.radians(lat2)
-            delta_lat = math.radians(lat2 - lat1)
-            delta_lon = math.radians(lon2 - lon1)
-            
-            a = math.sin(delta_lat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(delta_lon/2)**2
-            c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-            
-            return R * c
-        
-        # Agregar distancia a cada POI
-        for poi in pois:
-            if poi.get('latitude') and poi.get('longitude'):
-                distance = calculate_distance(
-                    user_lat, user_lng,
-                    float(poi['latitude']), float(poi['longitude'])
-                )
-                poi['distance'] = distance
-            else:
-                poi['distance'] = None
-        
-        # Ordenar por distancia
-        pois_with_distance = [p for p in pois if p.get('distance') is not None]
-        pois_without_distance = [p for p in pois if p.get('distance') is None]
-        pois_sorted = sorted(pois_with_distance, key=lambda x: x['distance']) + pois_without_distance
-        
-        # Mostrar como recomendaciones
-        display_recommendations(db, pois_sorted, user_lat, user_lng)
+        # Mostrar como recomendaciones (ordenados por distancia, los que no tienen ubicación al final)
+        display_recommendations(db, pois + without_location, user_lat, user_lng)
         
     except Exception as e:
         st.error(f"Error al cargar lugares locales: {str(e)}")
@@ -475,15 +502,21 @@ def show_saved_recommendations(db, n8n):
                     cities_dict[city_id] = []
                 cities_dict[city_id].append(stat)
         
+        # Cargar en bloque las ciudades y POIs referenciados
+        cities_by_id = db.get_cities_by_ids(cities_dict.keys())
+        pois_by_id = db.get_pois_by_ids(
+            stat.get('poi_id') for city_stats in cities_dict.values() for stat in city_stats
+        )
+        
         # Mostrar por ciudad
         for city_id, city_stats in cities_dict.items():
-            city = db.get_city(city_id)
+            city = cities_by_id.get(city_id)
             if city:
                 with st.expander(f"📍 {city['name']} ({len(city_stats)} recomendaciones)", expanded=False):
                     for stat in city_stats:
                         poi_id = stat.get('poi_id')
                         if poi_id:
-                            poi = db.get_poi(poi_id)
+                            poi = pois_by_id.get(poi_id)
                             if poi:
                                 col1, col2 = st.columns([3, 1])
                                 with col1:
@@ -4,9 +4,10 @@ Página de Generación de Reportes
 import io
 import os
 import tempfile
+from bisect import bisect_right
 from collections import Counter
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
 
 import matplotlib.pyplot as plt
 import pandas as pd
@@ -35,6 +36,11 @@ def _safe_parse_datetime(value: Any) -> Optional[datetime]:
         return value
     if not value:
         return None
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            pass
     try:
         return pd.to_datetime(value).to_pydatetime()
     except Exception:
@@ -61,32 +67,40 @@ def _build_week_windows(start_date, end_date, max_windows: int = 6) -> Tuple[Lis
     return windows, labels
 
 
-def _count_records_by_window(records: Sequence[Dict[str, Any]], date_field: str,
+def _window_position(value: Optional[datetime], starts: Sequence[datetime],
+                     windows: Sequence[Tuple[datetime, datetime]]) -> Optional[int]:
+    """Devuelve el índice de la ventana que contiene la fecha (búsqueda binaria)."""
+    if value is None:
+        return None
+    index = bisect_right(starts, value) - 1
+    if index >= 0 and value <= windows[index][1]:
+        return index
+    return None
+
+
+def _accumulate_by_window(records: Iterable[Dict[str, Any]], date_field: str,
+                          windows: Sequence[Tuple[datetime, datetime]],
+                          value_field: Optional[str] = None) -> List[float]:
+    """Acumula por ventana (conteo o suma de ``value_field``) interpretando cada fecha una sola vez."""
+    starts = [start for start, _ in windows]
+    totals = [0.0] * len(windows)
+    for record in records:
+        index = _window_position(_safe_parse_datetime(record.get(date_field)), starts, windows)
+        if index is not None:
+            totals[index] += _parse_float(record.get(value_field)) if value_field else 1
+    return totals
+
+
+def _count_records_by_window(records: Iterable[Dict[str, Any]], date_field: str,
                              windows: Sequence[Tuple[datetime, datetime]]) -> List[int]:
     """Cuenta elementos por ventana temporal."""
-    counts: List[int] = []
-    for start, end in windows:
-        total = 0
-        for record in records:
-            record_date = _safe_parse_datetime(record.get(date_field))
-            if record_date and start <= record_date <= end:
-                total += 1
-        counts.append(total)
-    return counts
+    return [int(total) for total in _accumulate_by_window(records, date_field, windows)]
 
 
-def _sum_records_by_window(records: Sequence[Dict[str, Any]], date_field: str,
+def _sum_records_by_window(records: Iterable[Dict[str, Any]], date_field: str,
                            windows: Sequence[Tuple[datetime, datetime]], value_field: str) -> List[float]:
     """Suma un campo numérico por ventana temporal."""
-    sums: List[float] = []
-    for start, end in windows:
-        total = 0.0
-        for record in records:
-            record_date = _safe_parse_datetime(record.get(date_field))
-            if record_date and start <= record_date <= end:
-                total += _parse_float(record.get(value_field))
-        sums.append(total)
-    return sums
+    return _accumulate_by_window(records, date_field, windows, value_field)
 
 
 def _extract_city_metadata(record: Dict[str, Any]) -> Tuple[Optional[str], Optional[str], Optional[str]]:
@@ -122,7 +136,7 @@ def _filter_by_date(records: Sequence[Dict[str, Any]], date_field: str,
     return filtered
 
 
-def _apply_filters(records: Sequence[Dict[str, Any]], user_id: Optional[str],
+def _apply_filters(records: Iterable[Dict[str, Any]], user_id: Optional[str],
                    city_id: Optional[str], country: Optional[str]) -> List[Dict[str, Any]]:
     """Aplica filtros de usuario y ubicación."""
     filtered: List[Dict[str, Any]] = []
@@ -156,15 +170,17 @@ def _format_currency(value: float, currency: str = "€") -> str:
 def _collect_admin_dataset(db, start_dt: datetime, end_dt: datetime,
                            user_id: Optional[str], city_id: Optional[str],
                            country: Optional[str]) -> Dict[str, List[Dict[str, Any]]]:
-    """Obtiene visitas, reservas y estadísticas con los filtros indicados."""
-    visits = db.get_visits_range(start_dt, end_dt) if hasattr(db, "get_visits_range") else []
-    bookings = db.get_bookings_range(start_dt, end_dt) if hasattr(db, "get_bookings_range") else []
-    stats = db.get_usage_stats_range(start_dt, end_dt) if hasattr(db, "get_usage_stats_range") else []
+    """Obtiene visitas, reservas y estadísticas con los filtros indicados.
+
+    Los registros se leen por páginas y se filtran a medida que llegan, de modo
+    que solo se conservan en memoria los que pertenecen al reporte.
+    """
+    visits = db.iter_visits_range(start_dt, end_dt, projection="report") if hasattr(db, "iter_visits_range") else []
+    bookings = db.iter_bookings_range(start_dt, end_dt, projection="report") if hasattr(db, "iter_bookings_range") else []
+    stats = db.iter_usage_stats_range(start_dt, end_dt, projection="report") if hasattr(db, "iter_usage_stats_range") else []
     filtered_visits = _apply_filters(visits, user_id, city_id, country)
     filtered_bookings = _apply_filters(bookings, user_id, city_id, country)
-    filtered_stats = stats
-    if user_id:
-        filtered_stats = [stat for stat in stats if stat.get("user_id") == user_id]
+    filtered_stats = [stat for stat in stats if not user_id or stat.get("user_id") == user_id]
     return {
         "visits": filtered_visits,
         "bookings": filtered_bookings,
@@ -884,7 +900,12 @@ def get_report_content(report_type, db, start_date, end_date,
                 unique_users.add(user_id)
         
         # Estadísticas por tipo de acción
-        action_counts = Counter(stat.get("action_type") for stat in stats if stat.get("action_type"))
+        # Los días ya resumidos llegan como una fila con event_count
+        action_counts = Counter()
+        for stat in stats:
+            if stat.get("action_type"):
+                action_counts[stat["action_type"]] += stat.get("event_count", 1)
+        total_actions = sum(action_counts.values())
         
         # Usuarios nuevos vs recurrentes (simplificado)
         visits_by_week = _count_records_by_window(visits, "visit_date", week_windows)
@@ -900,7 +921,7 @@ def get_report_content(report_type, db, start_date, end_date,
             {"Indicador": "Visitas totales", "Valor": len(visits), "Tendencia": "↗︎" if len(visits) > 0 else "→"},
             {"Indicador": "Reservas totales", "Valor": len(bookings), "Tendencia": "↗︎" if len(bookings) > 0 else "→"},
             {"Indicador": "Usuarios únicos", "Valor": len(unique_users), "Tendencia": "↗︎" if len(unique_users) > 0 else "→"},
-            {"Indicador": "Acciones registradas", "Valor": len(stats), "Tendencia": "↗︎" if len(stats) > 0 else "→"}
+            {"Indicador": "Acciones registradas", "Valor": total_actions, "Tendencia": "↗︎" if total_actions > 0 else "→"}
         ]
         
         table_df = pd.DataFrame(table_rows)
@@ -910,7 +931,7 @@ def get_report_content(report_type, db, start_date, end_date,
         
         summary_points = [
             f"Usuarios únicos activos en el período: {len(unique_users)}.",
-            f"Total de interacciones registradas: {len(stats)}.",
+            f"Total de interacciones registradas: {total_actions}.",
             f"Acciones más frecuentes: {', '.join(top_action_names[:2])}."
         ]
         
@@ -931,7 +952,7 @@ def get_report_content(report_type, db, start_date, end_date,
             "detail_items": detail_items,
             "metrics": [
                 {"label": "Usuarios únicos", "value": str(len(unique_users)), "delta": f"{len(visits)} visitas"},
-                {"label": "Interacciones", "value": str(len(stats)), "delta": f"{len(action_counts)} tipos"},
+                {"label": "Interacciones", "value": str(total_actions), "delta": f"{len(action_counts)} tipos"},
                 {"label": "Reservas", "value": str(len(bookings)), "delta": f"{len([b for b in bookings if b.get('status') in ('confirmed', 'completed')])} confirmadas" if bookings else "0"}
             ],
             "chart": {
@@ -3,13 +3,15 @@ Página de Estadísticas
 """
 from collections import Counter
 from datetime import datetime, timedelta, time
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, Optional, Tuple
 
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 import streamlit as st
 
+from database import fan_out
+
 def show(db, n8n):
     """Muestra la página de estadísticas"""
     
@@ -56,16 +58,23 @@ def show_trends(db, start_dt: datetime, end_dt: datetime):
 
     st.subheader("📈 Tendencias generales")
 
-    visits = db.get_visits_range(start_dt, end_dt)
-    new_users = db.get_users_range(start_dt, end_dt)
-    bookings = db.get_bookings_range(start_dt, end_dt)
-    audio_guides = db.get_audio_guides_range(start_dt, end_dt)
+    data = fan_out(db, {
+        "visits": lambda: count_by_day_and_hour(
+            db.iter_visits_range(start_dt, end_dt, projection="trend"), "visit_date"),
+        "users": lambda: aggregate_daily(
+            db.get_users_range(start_dt, end_dt, projection="trend"), "created_at"),
+        "bookings": lambda: aggregate_daily(
+            db.iter_bookings_range(start_dt, end_dt, projection="trend"), "booking_date"),
+        "audio": lambda: aggregate_daily(
+            db.get_audio_guides_range(start_dt, end_dt, projection="trend"), "created_at"),
+    })
+    visit_days, visit_hours = data["visits"]
 
     date_index = pd.date_range(start_dt.date(), end_dt.date(), freq="D")
-    visits_series = aggregate_daily(visits, "visit_date").reindex(date_index, fill_value=0)
-    users_series = aggregate_daily(new_users, "created_at").reindex(date_index, fill_value=0)
-    bookings_series = aggregate_daily(bookings, "booking_date").reindex(date_index, fill_value=0)
-    audio_series = aggregate_daily(audio_guides, "created_at").reindex(date_index, fill_value=0)
+    visits_series = daily_series(visit_days).reindex(date_index, fill_value=0)
+    users_series = data["users"].reindex(date_index, fill_value=0)
+    bookings_series = data["bookings"].reindex(date_index, fill_value=0)
+    audio_series = data["audio"].reindex(date_index, fill_value=0)
 
     summary_df = pd.DataFrame({
         "Fecha": date_index,
@@ -122,7 +131,7 @@ def show_trends(db, start_dt: datetime, end_dt: datetime):
         st.plotly_chart(fig_bookings, use_container_width=True)
 
     st.subheader("🕐 Patrón de visitas por hora")
-    hourly_counts = aggregate_hourly(visits, "visit_date")
+    hourly_counts = hourly_frame(visit_hours)
     if hourly_counts.empty:
         st.info("No hay suficientes datos de visitas en el periodo seleccionado para mostrar el patrón horario.")
     else:
@@ -146,15 +155,20 @@ def show_popularity(db):
         st.info("No hay puntos de interés registrados en Supabase.")
         return
 
-    visits = db.get_all_visits()
-    visit_counter = Counter([visit.get("poi_id") for visit in visits if visit.get("poi_id")])
+    # Contadores precalculados en Supabase (vw_poi_popularity / vw_city_popularity)
+    data = fan_out(db, {
+        "pois": db.get_poi_popularity,
+        "cities": db.get_city_popularity,
+    })
+    poi_popularity, city_popularity = data["pois"], data["cities"]
 
     poi_rows = []
     for poi in pois:
-        poi_id = poi.get("id")
+        popularity = poi_popularity.get(poi.get("id"), {})
         poi_rows.append({
             "POI": poi.get("name", "Sin nombre"),
-            "Visitas": visit_counter.get(poi_id, 0),
+            "Visitas": int(popularity.get("visit_count") or 0),
+            "Reservas": int(popularity.get("booking_count") or 0),
             "Rating": float(poi.get("rating") or 0),
             "Categoría": poi.get("category", "Sin categoría"),
             "Ciudad": poi.get("cities", {}).get("name") if isinstance(poi.get("cities"), dict) else None,
@@ -215,22 +229,18 @@ def show_popularity(db):
         st.info("No hay ciudades registradas en Supabase.")
         return
 
-    city_visit_counter = Counter(
-        visit.get("points_of_interest", {}).get("city_id")
-        for visit in visits
-        if isinstance(visit.get("points_of_interest"), dict)
-    )
-
     city_stats = []
     poi_city_counter = Counter([poi.get("city_id") for poi in pois if poi.get("city_id")])
 
     for city in cities:
         city_id = city.get("id")
+        popularity = city_popularity.get(city_id, {})
         city_stats.append({
             "Ciudad": city.get("name"),
             "País": city.get("country"),
             "POIs": poi_city_counter.get(city_id, 0),
-            "Visitas": city_visit_counter.get(city_id, 0),
+            "Visitas": int(popularity.get("visit_count") or 0),
+            "Reservas": int(popularity.get("booking_count") or 0),
             "Precio medio (€)": float(city.get("price") or 0),
         })
 
@@ -465,35 +475,48 @@ def show_user_activity(db, start_dt: datetime, end_dt: datetime):
                 st.divider()
 
 
-def aggregate_daily(records: List[Dict], field: str) -> pd.Series:
-    """Agrupa registros por día según el campo de fecha especificado."""
-    if not records:
-        return pd.Series(dtype="int64")
-    df = pd.DataFrame(records)
-    if field not in df:
-        return pd.Series(dtype="int64")
-    df[field] = pd.to_datetime(df[field], errors="coerce")
-    df = df.dropna(subset=[field])
-    if df.empty:
+def count_by_day_and_hour(records: Iterable[Dict], field: str) -> Tuple[Counter, Counter]:
+    """Cuenta registros por día y por hora en una sola pasada, sin materializarlos."""
+    daily: Counter = Counter()
+    hourly: Counter = Counter()
+    for record in records:
+        value = parse_iso_datetime(record.get(field))
+        if value is None:
+            continue
+        daily[value.date()] += 1
+        hourly[value.hour] += 1
+    return daily, hourly
+
+
+def daily_series(daily: Counter) -> pd.Series:
+    """Convierte un contador por día en una serie indexada por fecha."""
+    if not daily:
         return pd.Series(dtype="int64")
-    df["date"] = df[field].dt.normalize()
-    return df.groupby("date").size()
+    return pd.Series(
+        list(daily.values()),
+        index=pd.to_datetime(list(daily.keys())),
+        dtype="int64",
+    ).sort_index()
 
 
-def aggregate_hourly(records: List[Dict], field: str) -> pd.DataFrame:
-    """Cuenta registros por hora del día."""
-    if not records:
-        return pd.DataFrame(columns=["Hora", "Visitas"])
-    df = pd.DataFrame(records)
-    if field not in df:
-        return pd.DataFrame(columns=["Hora", "Visitas"])
-    df[field] = pd.to_datetime(df[field], errors="coerce")
-    df = df.dropna(subset=[field])
-    if df.empty:
+def hourly_frame(hourly: Counter) -> pd.DataFrame:
+    """Convierte un contador por hora en el DataFrame usado por los gráficos."""
+    if not hourly:
         return pd.DataFrame(columns=["Hora", "Visitas"])
-    df["Hora"] = df[field].dt.hour
-    hourly = df.groupby("Hora").size().reset_index(name="Visitas")
-    return hourly
+    hours = sorted(hourly)
+    return pd.DataFrame({"Hora": hours, "Visitas": [hourly[hour] for hour in hours]})
+
+
+def aggregate_daily(records: Iterable[Dict], field: str) -> pd.Series:
+    """Agrupa registros por día según el campo de fecha especificado."""
+    daily, _ = count_by_day_and_hour(records, field)
+    return daily_series(daily)
+
+
+def aggregate_hourly(records: Iterable[Dict], field: str) -> pd.DataFrame:
+    """Cuenta registros por hora del día."""
+    _, hourly = count_by_day_and_hour(records, field)
+    return hourly_frame(hourly)
 
 
 def parse_iso_datetime(value: Optional[str]) -> Optional[datetime]: